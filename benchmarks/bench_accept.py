@@ -0,0 +1,67 @@
+#######################################################################################################################
+# Author: Maurice Snoeren                                                                                             #
+# Version: 0.1 beta (use at your own risk)                                                                            #
+#                                                                                                                     #
+# Benchmark of the number of connections per second that a node accepts. Clients connect at the same time, send       #
+# their handshake and wait for the id of the node. Versioned clients send their id and their options, like a node     #
+# of version 2 after HANDSHAKE_PROBE. Legacy clients only send their id, so the node waits LEGACY_HANDSHAKE_GRACE     #
+# for their options before it replies. The benchmark is repeated with clients that connect and never send their       #
+# id. Before, the node exchanged the id's on the thread that accepts the connections, so each silent client           #
+# stopped all the other clients for 10 seconds. The node uses the loopback network on port 10000.                     #
+# Usage: python bench_accept.py [number of clients]                                                                   #
+#######################################################################################################################
+
+import sys
+import time
+import socket
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, '..') # Import the files where the modules are located
+
+from p2pnetwork import protocol
+from p2pnetwork.node import Node
+
+CLIENT_THREADS = 32
+SILENT_CLIENTS = [0, 4]
+OPTIONS = protocol.encode_options({"version": protocol.HANDSHAKE_VERSION, "framing": "length"})
+
+
+def connect(i, versioned):
+    """Connects with the node as client i and returns the connection when the node has sent its id."""
+    sock = socket.create_connection(("127.0.0.1", 10000), timeout=30.0)
+    sock.send(("client" + str(i) + ":" + str(20000 + i)).encode('utf-8'))
+    if versioned:
+        sock.send(OPTIONS.encode('utf-8'))
+
+    if sock.recv(4096) == b'':
+        raise ConnectionError("The node has closed the connection")
+
+    return sock
+
+
+clients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+print("Accepting %d clients" % clients)
+print("%-8s %-10s %-8s %12s %12s" % ("mode", "clients", "silent", "seconds", "conn/s"))
+
+for reactor in [False, True]:
+    for versioned in [True, False]:
+        for silent_clients in SILENT_CLIENTS:
+            node = Node("127.0.0.1", 10000, id="node", max_connections=clients + silent_clients, reactor=reactor)
+            node.start()
+            time.sleep(0.5)
+
+            silent = [socket.create_connection(("127.0.0.1", 10000)) for i in range(0, silent_clients)]
+            time.sleep(0.1)
+
+            t = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=CLIENT_THREADS) as executor:
+                sockets = list(executor.map(lambda i: connect(i, versioned), range(0, clients)))
+            seconds = time.perf_counter() - t
+
+            print("%-8s %-10s %-8d %12.3f %12.0f" % ("reactor" if reactor else "thread", "versioned" if versioned else "legacy", silent_clients, seconds, clients / seconds))
+
+            for sock in sockets + silent:
+                sock.close()
+
+            node.stop()
+            node.join()
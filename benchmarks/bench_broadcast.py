@@ -0,0 +1,63 @@
+#######################################################################################################################
+# Author: Maurice Snoeren                                                                                             #
+# Version: 0.1 beta (use at your own risk)                                                                            #
+#                                                                                                                     #
+# Benchmark of the cost of a broadcast against the fan-out (number of connected nodes). Before, the data is sent to  #
+# each node with send_to_node, which serializes and compresses the data for each node. After, send_to_nodes creates  #
+# the packet once and sends the same bytes to each node. The sockets discard the data, so only the cost of creating  #
+# and handing over the packets is measured. Usage: python bench_broadcast.py [size in MB]                            #
+#######################################################################################################################
+
+import sys
+import time
+sys.path.insert(0, '..') # Import the files where the modules are located
+
+from p2pnetwork.node import Node
+from p2pnetwork.nodeconnection import NodeConnection
+
+FAN_OUTS = [1, 2, 5, 10, 20, 50]
+COMPRESSIONS = ['none', 'zlib', 'lzma']
+
+
+class NullSocket:
+    """Socket that discards all the data that is sent."""
+
+    def settimeout(self, timeout):
+        pass
+
+    def sendall(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+size = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+data = {"type": "state", "values": []}
+while len(str(data)) < size * 1024 * 1024:
+    data["values"].extend({"id": i, "name": "node " + str(i), "value": i * 3.14} for i in range(1000))
+
+node = Node("127.0.0.1", 0)
+node.sock.close()
+
+print("Broadcast of a %.1f MB dict, seconds per broadcast" % size)
+print("%-8s %-6s %10s %10s %8s" % ("fan-out", "codec", "before", "after", "speedup"))
+
+for compression in COMPRESSIONS:
+    for fan_out in FAN_OUTS:
+        node.nodes_outbound.clear()
+        for i in range(fan_out):
+            connection = NodeConnection(node, NullSocket(), "node" + str(i), "127.0.0.1", 10000 + i)
+            connection.framing = 'length'
+            node.nodes_outbound.add(connection)
+
+        t = time.perf_counter()
+        for n in node.nodes_outbound:
+            node.send_to_node(n, data, compression)
+        before = time.perf_counter() - t
+
+        t = time.perf_counter()
+        node.send_to_nodes(data, compression=compression)
+        after = time.perf_counter() - t
+
+        print("%-8d %-6s %10.4f %10.4f %7.1fx" % (fan_out, compression, before, after, before / after))
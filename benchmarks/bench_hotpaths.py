@@ -0,0 +1,183 @@
+#######################################################################################################################
+# Author: Maurice Snoeren                                                                                             #
+# Version: 0.1 beta (use at your own risk)                                                                            #
+#                                                                                                                     #
+# Microbenchmarks of the hot paths of a node connection: compress, decompress, parse_packet (EOT framing),          #
+# parse_frame (length framing), send (creating the packet and handing it to the socket), the EOT splitting loop and  #
+# the frame decoder. Each path is measured for messages from 16 B to 64 MB and for every codec. The throughput      #
+# (MB/s) and the allocations (peak bytes allocated per message, measured with tracemalloc) are compared against a    #
+# baseline that has been stored on the same machine with --save and the benchmark exits with 1 when a path is       #
+# slower or allocates more than the tolerance. The benchmark runs offline, the sockets discard the data.             #
+# Usage: python bench_hotpaths.py [--max-size bytes] [--tolerance 0.25] [--baseline file] [--save]                  #
+#######################################################################################################################
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import tracemalloc
+sys.path.insert(0, '..') # Import the files where the modules are located
+
+from p2pnetwork import protocol
+from p2pnetwork.node import Node
+from p2pnetwork.nodeconnection import NodeConnection
+
+SIZES = [16, 256, 4096, 65536, 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024]
+CODECS = ['none', 'zlib', 'bzip2', 'lzma', 'zlib-stream']
+LEGACY_CODECS = ['none', 'zlib', 'bzip2', 'lzma'] # zlib-stream requires length framing
+STREAM_SIZE = 1024 * 1024 # The splitting loops process a stream of at least this size
+MIN_TIME = 0.2 # Seconds that each path is repeated at least
+ROUNDS = 3 # The fastest round is used, so other load on the machine does not show up as a slower path
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_hotpaths.json")
+
+
+class NullSocket:
+    """Socket that discards all the data that is sent."""
+
+    def settimeout(self, timeout):
+        pass
+
+    def sendmsg(self, buffers):
+        return sum(len(buffer) for buffer in buffers)
+
+    def sendall(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+def create_message(size):
+    """Returns a text message of the given size, words that compress like real data and never contain EOT."""
+    rng = random.Random(size)
+    words = ["node", "state", "value", "heartbeat", "peer", "message", "0.25", "1024", "true", "id"]
+    block = " ".join(rng.choice(words) + str(rng.randint(0, 999)) for i in range(min(size, 65536) // 6 + 1))
+    return (block * (size // len(block) + 1))[0:size]
+
+
+def create_connection(framing):
+    """Returns a node connection with the given framing that discards the data it sends."""
+    connection = NodeConnection(node, NullSocket(), "bench", "127.0.0.1", 10000)
+    connection.framing = framing
+    return connection
+
+
+def measure(setup, run):
+    """Measures the path run, which is executed with the arguments returned by setup. The setup is not measured. The
+       path is repeated for at least MIN_TIME seconds in each of the ROUNDS. Returns the seconds of one execution in
+       the fastest round and the peak bytes that one execution allocates."""
+    fastest = None
+    for i in range(0, ROUNDS):
+        iterations = 0
+        seconds = 0.0
+        while seconds < MIN_TIME or iterations == 0:
+            args = setup()
+            t = time.perf_counter()
+            run(*args)
+            seconds += time.perf_counter() - t
+            iterations += 1
+
+        if fastest is None or seconds / iterations < fastest:
+            fastest = seconds / iterations
+
+    args = setup()
+    tracemalloc.start() # Starts with a peak of zero, tracemalloc.reset_peak requires Python 3.9
+    (current, peak) = tracemalloc.get_traced_memory()
+    result = run(*args)
+    (after, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return (fastest, peak - current)
+
+
+def paths(message, codec):
+    """Returns the paths (name, setup, run) that are measured for the message and the codec."""
+    data = message.encode('utf-8')
+    result = []
+
+    if codec != 'none':
+        result.append(("compress", lambda: (create_connection('length'), data), lambda c, d: c.compress(d, codec)))
+        compressed = create_connection('length').compress(data, codec)
+        result.append(("decompress", lambda: (create_connection('length'), compressed), lambda c, d: c.decompress(d)))
+
+    if codec in LEGACY_CODECS:
+        packet = create_connection('eot').create_packet(message, compression=codec)[0:-1]
+        result.append(("parse_packet", lambda: (create_connection('eot'), packet), lambda c, p: c.parse_packet(p)))
+
+    (flags, type, payload) = create_connection('length').create_payload(message, compression=codec)
+    result.append(("parse_frame", lambda: (create_connection('length'), memoryview(payload)), lambda c, p: c.parse_frame(flags, type, p)))
+    result.append(("send", lambda: (create_connection('length'), message), lambda c, m: c.send_buffers(c.create_buffers(m, compression=codec))))
+
+    if codec == 'none':
+        count = max(1, STREAM_SIZE // len(data))
+        eot_stream = (data + b'\x04') * count
+        length_stream = protocol.create_frame(data, 0, protocol.TYPE_STR) * count
+        result.append(("split_eot", lambda: (create_connection('eot'), eot_stream), lambda c, s: c.receive_data(s)))
+        result.append(("split_frames", lambda: (protocol.FrameDecoder(), length_stream), lambda d, s: sum(1 for frame in d.feed(s))))
+
+    return result
+
+
+parser = argparse.ArgumentParser(description="Microbenchmarks of the hot paths of a node connection.")
+parser.add_argument("--max-size", type=int, default=SIZES[-1], help="largest message size in bytes")
+parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+parser.add_argument("--baseline", default=BASELINE, help="file with the stored baseline")
+parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+args = parser.parse_args()
+
+node = Node("127.0.0.1", 0)
+node.sock.close()
+node.callback = None
+
+# The baseline depends on the machine, so it is not shipped and has to be stored on this machine first
+baseline = {}
+if os.path.exists(args.baseline):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+elif not args.save:
+    print("There is no baseline " + args.baseline + " for this machine, store one first with --save")
+    sys.exit(2)
+
+results = {}
+regressions = []
+
+print("%-14s %-12s %10s %12s %14s %10s  %s" % ("path", "codec", "size", "MB/s", "alloc/msg", "baseline", "result"))
+for size in [s for s in SIZES if s <= args.max_size]:
+    message = create_message(size)
+    for codec in CODECS:
+        for (name, setup, run) in paths(message, codec):
+            (seconds, allocated) = measure(setup, run)
+            processed = size * max(1, STREAM_SIZE // size) if name.startswith("split") else size
+            throughput = processed / seconds / 1e6
+            key = name + "/" + codec + "/" + str(size)
+            results[key] = {"throughput": throughput, "allocated": allocated}
+
+            status = "-"
+            compare = "-"
+            if key in baseline:
+                base = baseline[key]
+                compare = "%.0f%%" % (100.0 * throughput / base["throughput"])
+                status = "ok"
+                if throughput < base["throughput"] * (1 - args.tolerance):
+                    status = "SLOWER"
+                if allocated > base["allocated"] * (1 + args.tolerance) + 4096:
+                    status = "MORE ALLOCATIONS" if status == "ok" else status + ", MORE ALLOCATIONS"
+                if status != "ok":
+                    regressions.append(key + ": " + status)
+
+            print("%-14s %-12s %10d %12.1f %14d %10s  %s" % (name, codec, size, throughput, allocated, compare, status))
+            sys.stdout.flush()
+
+if args.save:
+    with open(args.baseline, "w") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    print("The baseline has been stored in " + args.baseline)
+
+if regressions and not args.save:
+    print("Regressions compared to the baseline:")
+    for regression in regressions:
+        print("- " + regression)
+    sys.exit(1)
@@ -0,0 +1,203 @@
+#######################################################################################################################
+# Author: Maurice Snoeren                                                                                             #
+# Version: 0.1 beta (use at your own risk)                                                                            #
+#                                                                                                                     #
+# Load generator that runs N nodes on the loopback network in one of the topologies star, ring, mesh (full mesh) or  #
+# kregular (random k-regular graph). The nodes send messages to their neighbours at the given total rate, with the   #
+# given mix of message sizes. It reports the messages per second that are delivered, the p50, p99 and p999 delivery  #
+# latency, the CPU time per message and the memory (RSS) per node. The nodes use the ports from --port onwards.      #
+# With --transport unix the nodes connect with their Unix domain sockets and with --transport inprocess the nodes    #
+# hand the messages over in the process, without the network.                                                         #
+# Usage: python bench_load.py [--nodes 10] [--topology ring] [--degree 4] [--rate 1000] [--duration 10]             #
+#                             [--sizes 64:0.9,4096:0.1] [--compression none] [--reactor] [--transport tcp]         #
+#                             [--seed 1]                                                                             #
+#######################################################################################################################
+
+import sys
+import os
+import time
+import struct
+import random
+import argparse
+import resource
+import tempfile
+sys.path.insert(0, '..') # Import the files where the modules are located
+
+from p2pnetwork.node import Node
+from p2pnetwork.tracing import Histogram
+from p2pnetwork.transport import InProcessTransport
+
+TIMESTAMP = struct.Struct('!Q') # Each message starts with the time (nanoseconds, see now_ns) it has been sent
+
+
+def now_ns():
+    """Returns the time in nanoseconds, time.perf_counter_ns requires Python 3.7."""
+    return int(time.perf_counter() * 1000000000)
+
+
+def star(n, degree, rng):
+    """Returns the edges of a star: node 0 is connected with all the other nodes."""
+    return [(0, i) for i in range(1, n)]
+
+
+def ring(n, degree, rng):
+    """Returns the edges of a ring: each node is connected with the next node."""
+    return [(i, (i + 1) % n) for i in range(0, n)] if n > 2 else [(0, 1)]
+
+
+def mesh(n, degree, rng):
+    """Returns the edges of a full mesh: each node is connected with all the other nodes."""
+    return [(i, j) for i in range(0, n) for j in range(i + 1, n)]
+
+
+def kregular(n, degree, rng):
+    """Returns the edges of a random graph where each node is connected with degree other nodes. The ends of the
+       edges are paired at random until there are no loops and no double edges."""
+    if n * degree % 2 != 0 or degree >= n:
+        raise ValueError("A k-regular graph requires n * k to be even and k < n")
+
+    for trial in range(0, 1000):
+        ends = [i for i in range(0, n) for k in range(0, degree)]
+        rng.shuffle(ends)
+        edges = set()
+        for i in range(0, len(ends), 2):
+            (a, b) = sorted((ends[i], ends[i + 1]))
+            if a == b or (a, b) in edges:
+                break
+            edges.add((a, b))
+
+        else:
+            return sorted(edges)
+
+    raise ValueError("Could not create a random k-regular graph, try another seed")
+
+
+TOPOLOGIES = {"star": star, "ring": ring, "mesh": mesh, "kregular": kregular}
+TRANSPORTS = ["tcp", "unix", "inprocess"]
+
+
+def parse_sizes(text):
+    """Returns the message sizes and their weights of the mix, for example 64:0.9,4096:0.1."""
+    sizes = []
+    weights = []
+    for item in text.split(","):
+        (size, weight) = item.split(":") if ":" in item else (item, "1")
+        sizes.append(max(TIMESTAMP.size, int(size)))
+        weights.append(float(weight))
+
+    return (sizes, weights)
+
+
+def rss():
+    """Returns the current memory (RSS) of the process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # Peak instead of current on this platform
+
+
+parser = argparse.ArgumentParser(description="Load generator for nodes on the loopback network.")
+parser.add_argument("--nodes", type=int, default=10, help="number of nodes")
+parser.add_argument("--topology", choices=sorted(TOPOLOGIES.keys()), default="ring", help="how the nodes are connected")
+parser.add_argument("--degree", type=int, default=4, help="neighbours of each node with the kregular topology")
+parser.add_argument("--rate", type=float, default=1000.0, help="messages per second that are sent by all the nodes together")
+parser.add_argument("--duration", type=float, default=10.0, help="seconds that the messages are sent")
+parser.add_argument("--sizes", default="64:0.9,4096:0.1", help="message sizes in bytes with their weights")
+parser.add_argument("--compression", default="none", help="compression of the messages")
+parser.add_argument("--reactor", action="store_true", help="use the reactor instead of a thread for each connection")
+parser.add_argument("--transport", choices=TRANSPORTS, default="tcp", help="transport between the nodes")
+parser.add_argument("--port", type=int, default=10000, help="port of the first node")
+parser.add_argument("--seed", type=int, default=1, help="seed of the random topology and the message mix")
+args = parser.parse_args()
+
+rng = random.Random(args.seed)
+edges = TOPOLOGIES[args.topology](args.nodes, args.degree, rng)
+(sizes, weights) = parse_sizes(args.sizes)
+padding = dict((size, b'\x00' * (size - TIMESTAMP.size)) for size in sizes)
+latency = Histogram()
+
+
+def node_callback(event, main_node, connected_node, data):
+    if event == "node_message":
+        latency.record(now_ns() - TIMESTAMP.unpack_from(data)[0])
+
+
+rss_start = rss()
+transport = InProcessTransport() if args.transport == "inprocess" else None
+directory = tempfile.mkdtemp() # The Unix domain sockets of the nodes
+
+
+def address(i):
+    """Returns the (host, port) that is used to connect with node i, the port is None for a Unix domain socket."""
+    if args.transport == "unix":
+        return (os.path.join(directory, "node" + str(i) + ".sock"), None)
+
+    return ("127.0.0.1", args.port + i)
+
+
+nodes = [Node("127.0.0.1", args.port + i, id="node" + str(i), callback=node_callback, max_connections=args.nodes, reactor=args.reactor, transport=transport,
+              unix_path=address(i)[0] if args.transport == "unix" else None) for i in range(0, args.nodes)]
+for node in nodes:
+    node.start()
+
+for i in range(0, args.nodes):
+    results = nodes[i].connect_many([address(j) for (a, j) in edges if a == i], timeout=10.0)
+    if not all(results.values()):
+        print("Could not connect node " + str(i) + " with " + str([peer for (peer, connected) in results.items() if not connected]))
+
+time.sleep(1.0)
+rss_connected = rss()
+degrees = [len(node.all_nodes) for node in nodes]
+
+print("%d nodes, topology %s, %d connections, degree %d - %d, rate %.0f msg/s, sizes %s, compression %s, %s, %s" % (
+    args.nodes, args.topology, len(edges), min(degrees), max(degrees), args.rate, args.sizes, args.compression,
+    "reactor" if args.reactor else "threads", args.transport))
+
+# Open loop: the messages are sent on schedule, also when the nodes fall behind
+sent = 0
+expected = 0
+cpu_start = time.process_time()
+start = time.perf_counter()
+while True:
+    due = start + sent / args.rate
+    now = time.perf_counter()
+    if due - start >= args.duration:
+        break
+
+    if due > now:
+        time.sleep(due - now)
+
+    node = nodes[sent % args.nodes]
+    size = rng.choices(sizes, weights)[0]
+    node.send_to_nodes(TIMESTAMP.pack(now_ns()) + padding[size], compression=args.compression)
+    expected += len(node.all_nodes)
+    sent += 1
+
+sending = time.perf_counter() - start
+deadline = time.perf_counter() + 10.0 # Wait for the messages that are still on their way
+while latency.count < expected and time.perf_counter() < deadline:
+    time.sleep(0.01)
+
+elapsed = time.perf_counter() - start
+cpu = time.process_time() - cpu_start
+rss_end = rss()
+
+for node in nodes:
+    node.stop()
+for node in nodes:
+    node.join()
+os.rmdir(directory)
+
+snapshot = latency.snapshot()
+delivered = snapshot["count"]
+print("sent                 %12d messages in %.2f s (%.0f msg/s)" % (sent, sending, sent / sending))
+print("delivered            %12d of %d messages (%.0f msg/s)" % (delivered, expected, delivered / elapsed))
+print("latency p50          %12.3f ms" % (snapshot["p50"] * 1000))
+print("latency p99          %12.3f ms" % (snapshot["p99"] * 1000))
+print("latency p999         %12.3f ms" % (snapshot["p999"] * 1000))
+print("latency max          %12.3f ms" % (snapshot["max"] * 1000))
+print("cpu per message      %12.1f us" % (cpu / max(1, delivered) * 1e6))
+print("rss per node         %12.0f KB (connected), %.0f KB (after the load)" % (
+    (rss_connected - rss_start) / args.nodes / 1024, (rss_end - rss_start) / args.nodes / 1024))
@@ -0,0 +1,102 @@
+#######################################################################################################################
+# Author: Maurice Snoeren                                                                                             #
+# Version: 0.1 beta (use at your own risk)                                                                            #
+#                                                                                                                     #
+# Benchmark of the receive path of a node connection. It reports the bytes that are copied in user space for each    #
+# message, before (bytes buffer that is concatenated and sliced) and after (ReceiveBuffer with recv_into). The copy  #
+# from the kernel into the buffer happens in both cases and is not counted. The legacy receive path is quadratic in  #
+# the size of the message, so for large messages its copies are calculated instead of measured.                      #
+#######################################################################################################################
+
+import sys
+import time
+sys.path.insert(0, '..') # Import the files where the modules are located
+
+from p2pnetwork import protocol
+from p2pnetwork.receivebuffer import ReceiveBuffer
+
+CHUNK_SIZE = 4096 # Size of the chunks that the socket returns
+SIZES = [("1 KB", 1024), ("1 MB", 1024 * 1024), ("64 MB", 64 * 1024 * 1024)]
+
+
+class FakeSocket:
+    """Returns the stream in chunks of at most CHUNK_SIZE bytes, like a socket on a busy connection."""
+
+    def __init__(self, stream):
+        self.stream = memoryview(stream)
+        self.pos = 0
+
+    def recv_into(self, view):
+        size = min(len(view), CHUNK_SIZE, len(self.stream) - self.pos)
+        view[0:size] = self.stream[self.pos:self.pos + size]
+        self.pos += size
+        return size
+
+
+def legacy_copies(size):
+    """Calculates the bytes copied by the legacy receive path for one message with EOT framing: each chunk creates a
+       new buffer (buffer += chunk), the packet is sliced out and the remainder is sliced off."""
+    copied = 0
+    buffer = 0
+    for received in range(0, size + 1, CHUNK_SIZE):
+        buffer += min(CHUNK_SIZE, size + 1 - received)
+        copied += buffer
+
+    return copied + size + (buffer - size - 1) # packet = buffer[:eot] and buffer = buffer[eot+1:]
+
+
+def legacy_receive(stream):
+    """The legacy receive path with EOT framing, only used to time the small messages."""
+    buffer = b''
+    for i in range(0, len(stream), CHUNK_SIZE):
+        buffer += stream[i:i + CHUNK_SIZE]
+        eot_pos = buffer.find(b'\x04')
+        while eot_pos > 0:
+            packet = buffer[:eot_pos]
+            buffer = buffer[eot_pos + 1:]
+            eot_pos = buffer.find(b'\x04')
+
+
+def receive(stream, framing):
+    """Receives the stream with the ReceiveBuffer and returns the bytes copied in user space, including the copy
+       of the message itself that is handed to the application."""
+    buffer = ReceiveBuffer()
+    decoder = protocol.FrameDecoder(buffer)
+    sock = FakeSocket(stream)
+    copied = 0
+
+    while buffer.recv_into(sock) > 0:
+        if framing == 'length':
+            for (flags, type, payload) in decoder.frames():
+                copied += len(bytes(payload))
+
+        else:
+            eot_pos = buffer.find(b'\x04')
+            while eot_pos >= 0:
+                copied += len(bytes(buffer.consume(eot_pos)))
+                buffer.consume(1)
+                eot_pos = buffer.find(b'\x04')
+
+    return copied + buffer.bytes_copied
+
+
+print("Bytes copied per message in user space (chunks of " + str(CHUNK_SIZE) + " bytes)")
+print("%-8s %18s %16s %16s %12s %12s" % ("message", "before (eot)", "after (eot)", "after (length)", "before (s)", "after (s)"))
+
+for (name, size) in SIZES:
+    message = b'a' * size
+    eot_stream = message + b'\x04'
+    length_stream = protocol.create_frame(message, 0, protocol.TYPE_BYTES)
+
+    before_time = "-"
+    if size <= 1024 * 1024:
+        t = time.time()
+        legacy_receive(eot_stream)
+        before_time = "%.4f" % (time.time() - t)
+
+    t = time.time()
+    after_eot = receive(eot_stream, 'eot')
+    after_length = receive(length_stream, 'length')
+    after_time = "%.4f" % ((time.time() - t) / 2)
+
+    print("%-8s %18d %16d %16d %12s %12s" % (name, legacy_copies(size), after_eot, after_length, before_time, after_time))
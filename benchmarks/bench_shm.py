@@ -0,0 +1,111 @@
+#######################################################################################################################
+# Author: Maurice Snoeren                                                                                             #
+# Version: 0.1 beta (use at your own risk)                                                                            #
+#                                                                                                                     #
+# Benchmark of sending large messages between two node processes on the same host over TCP/IP (loopback network), #
+# a Unix domain socket and the ring buffers in shared memory. A node in another process echoes a small message for  #
+# each message it receives. It reports the throughput (MB/s) with at most 4 messages on their way and the median    #
+# round trip of one message. The nodes use the loopback network on port 10000 and 10001.                             #
+# Usage: python bench_shm.py [ring buffer size in MB]                                                                #
+#######################################################################################################################
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import multiprocessing
+sys.path.insert(0, '..') # Import the files where the modules are located
+
+from p2pnetwork.node import Node
+
+SIZES = [1024, 65536, 262144, 1048576, 8388608]
+MODES = ["tcp", "unix", "shm"]
+WINDOW = 4            # Messages on their way
+TOTAL = 256 * 1048576 # Bytes that are sent to measure the throughput
+ROUND_TRIPS = 20
+
+
+class EchoNode (Node):
+    """Node that sends a small message back for each message that it receives."""
+
+    def node_message(self, node, data):
+        node.send(b'\x01')
+
+
+def run_echo_node(path, shm_size, stop):
+    """Runs the echo node in the other process until stop is set."""
+    node = EchoNode("127.0.0.1", 10000, id="echo", reactor=True, unix_path=path)
+    node.shm_size = shm_size
+    node.start()
+    stop.wait()
+    node.stop()
+    node.join()
+
+
+class SenderNode (Node):
+    """Node that counts the messages that have been echoed."""
+
+    def __init__(self, *args, **kwargs):
+        super(SenderNode, self).__init__(*args, **kwargs)
+        self.echoed = threading.Semaphore(0)
+
+    def node_message(self, node, data):
+        self.echoed.release()
+
+
+ring_size = int(float(sys.argv[1]) * 1048576) if len(sys.argv) > 1 else 64 * 1048576
+path = os.path.join(tempfile.mkdtemp(), "echo.sock")
+
+print("Ring buffer of %.0f MB, %d messages on their way" % (ring_size / 1048576, WINDOW))
+print("%-6s %10s %12s %14s" % ("mode", "size", "MB/s", "round trip us"))
+
+for mode in MODES:
+    stop = multiprocessing.Event()
+    process = multiprocessing.Process(target=run_echo_node, args=(path, ring_size if mode == "shm" else 0, stop))
+    process.start()
+    time.sleep(1.0)
+
+    node = SenderNode("127.0.0.1", 10001, id="sender", reactor=True)
+    node.shm_size = ring_size if mode == "shm" else 0
+    node.send_queue_size = WINDOW + 1
+    node.start()
+
+    if mode == "tcp":
+        node.connect_with_node("127.0.0.1", 10000)
+    else:
+        node.connect_with_node(path)
+
+    connection = node.nodes_outbound[0]
+    if mode == "shm" and connection.ring_out is None:
+        print("shm: the ring buffers could not be shared")
+
+    for size in SIZES:
+        data = os.urandom(size)
+
+        count = max(2 * WINDOW, TOTAL // size)
+        t = time.perf_counter()
+        for i in range(0, count):
+            if i >= WINDOW:
+                node.echoed.acquire()
+            connection.send(data)
+        for i in range(0, min(WINDOW, count)):
+            node.echoed.acquire()
+        throughput = count * size / (time.perf_counter() - t) / 1048576
+
+        round_trips = []
+        for i in range(0, ROUND_TRIPS):
+            t = time.perf_counter()
+            connection.send(data)
+            node.echoed.acquire()
+            round_trips.append(time.perf_counter() - t)
+        round_trips.sort()
+
+        print("%-6s %10d %12.1f %14.1f" % (mode, size, throughput, round_trips[len(round_trips) // 2] * 1e6))
+
+    node.stop()
+    node.join()
+    stop.set()
+    process.join()
+
+os.rmdir(os.path.dirname(path))
@@ -10,7 +10,8 @@ __author__ = 'Maurice Snoeren'
 __license__ = "GNU 3.0"
 __main__ = "p2pnetwork"
 
-__all__ = ["node", "Node", "nodeconnection", "NodeConnection"]
+__all__ = ["node", "Node", "nodeconnection", "NodeConnection", "asyncnode", "AsyncNode", "AsyncNodeConnection"]
 
 from .node import Node
-from .nodeconection import NodeConnection
+from .nodeconnection import NodeConnection
+from .asyncnode import AsyncNode, AsyncNodeConnection
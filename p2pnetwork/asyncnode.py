@@ -0,0 +1,694 @@
+import asyncio
+import threading
+import time
+
+from p2pnetwork import protocol
+from p2pnetwork import serializer
+from p2pnetwork.compression import CompressionPolicy
+from p2pnetwork.gossip import SeenCache
+from p2pnetwork.peers import PeerSet
+from p2pnetwork.reconnect import backoff
+from p2pnetwork.node import Node
+from p2pnetwork.nodeconnection import NodeConnection
+from p2pnetwork.receivebuffer import ReceiveBuffer
+from p2pnetwork.stats import Stats
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The AsyncNode and AsyncNodeConnection implement the same node as Node and NodeConnection, but all the
+connections are handled by one asyncio event loop instead of one thread for each connection. The wire format
+and the events are exactly the same, so an AsyncNode is able to connect with a Node and the other way around.
+"""
+
+class AsyncNodeConnection:
+    """The class AsyncNodeConnection is used by the class AsyncNode and represent the TCP/IP stream connection with
+       another node. It is the asyncio counterpart of NodeConnection and uses the same packet format. Instead of a
+       thread, the connection runs as a task on the event loop of the main node.
+        main_node: The AsyncNode class that received a connection.
+        reader: The asyncio StreamReader that is associated with the client connection.
+        writer: The asyncio StreamWriter that is associated with the client connection.
+        id: The id of the connected node (at the other side of the TCP/IP connection).
+        host: The host/ip of the main node.
+        port: The port of the server of the main node."""
+
+    def __init__(self, main_node, reader, writer, id, host, port):
+        """Instantiates a new AsyncNodeConnection. Do not forget to start the connection, which creates the task
+           that handles the incoming data.
+            main_node: The AsyncNode class that received a connection.
+            reader: The asyncio StreamReader that is associated with the client connection.
+            writer: The asyncio StreamWriter that is associated with the client connection.
+            id: The id of the connected node (at the other side of the TCP/IP connection).
+            host: The host/ip of the main node.
+            port: The port of the server of the main node."""
+
+        self.host = host
+        self.port = port
+        self.main_node = main_node
+        self.reader = reader
+        self.writer = writer
+        self.terminate_flag = asyncio.Event()
+
+        # The task that runs the main loop of the connection
+        self.task = None
+
+        # The id of the connected node
+        self.id = str(id)  # Make sure the ID is a string
+
+        # End of transmission character for the network streaming messages.
+        self.EOT_CHAR = 0x04.to_bytes(1, 'big')
+
+        # Indication that the message has been compressed
+        self.COMPR_CHAR = 0x02.to_bytes(1, 'big')
+
+        # Datastore to store additional information concerning the node.
+        self.info = {}
+
+        # Hold the stream that comes in!
+        self.receive_buffer = ReceiveBuffer()
+
+        # The framing that is used on this connection, negotiated by the main node
+        self.framing = 'eot'
+        self.frame_decoder = protocol.FrameDecoder(self.receive_buffer, main_node.max_frame_size)
+
+        # The serializers that are supported by both nodes, negotiated by the main node
+        self.serializers = list(serializer.LEGACY)
+
+        # The other capabilities that are negotiated by the main node, see NodeConnection
+        self.version = 1
+        self.codecs = list(main_node.codecs)
+        self.max_frame_size = protocol.MAX_FRAME_SIZE
+        self.batching = True
+
+        # Shared memory is not offered by the AsyncNode, see Node.shm_size
+        self.ring_in = None
+
+        # The zlib streams of zlib-stream compression, which live as long as the connection, so later messages are
+        # compressed with the history of the earlier messages. They are created when they are used the first time.
+        self.compressor = None
+        self.decompressor = None
+
+        # The statistics of this connection, which are added to the statistics of the main node
+        self.stats = Stats(main_node.stats)
+
+        self.main_node.debug_print(
+            "AsyncNodeConnection: Started with client (" + self.id + ") '" + self.host + ":" + str(self.port) + "'")
+
+    # The packet format is shared with NodeConnection, so both classes are able to talk to each other.
+    compress = NodeConnection.compress
+    decompress = NodeConnection.decompress
+    compress_stream = NodeConnection.compress_stream
+    decompress_stream = NodeConnection.decompress_stream
+    choose_codec = NodeConnection.choose_codec
+    choose_serializer = NodeConnection.choose_serializer
+    create_packet = NodeConnection.create_packet
+    create_buffers = NodeConnection.create_buffers
+    create_payload = NodeConnection.create_payload
+    payload_buffers = NodeConnection.payload_buffers
+    parse_packet = NodeConnection.parse_packet
+    parse_frame = NodeConnection.parse_frame
+    receive_data = NodeConnection.receive_data
+    process_buffer = NodeConnection.process_buffer
+    process_frame = NodeConnection.process_frame
+    process_ring = NodeConnection.process_ring
+    get_stats = NodeConnection.get_stats
+    set_info = NodeConnection.set_info
+    get_info = NodeConnection.get_info
+
+    def start(self):
+        """Creates the task on the event loop that handles the incoming data of this connection."""
+        self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    def send(self, data, encoding_type='utf-8', compression='none', packets=None):
+        """Send the data to the connected node. The data can be pure text (str), dict object (send as json) and bytes
+           object. The data is written to the buffer of the stream and send by the event loop, so this method does not
+           block. Use drain of the main node to wait until the data has been written. When the stream is corrupted the
+           node connection is closed. The packets are shared with other connections, see create_packet."""
+        try:
+            buffers = self.create_buffers(data, encoding_type, compression, packets)
+            if buffers != None:
+                self.write(buffers)
+
+        except Exception as e:
+            self.main_node.debug_print("asyncnodeconnection send: Error sending data to node: " + str(e))
+            self.stats.add("send_errors")
+            self.stop()  # Stopping node due to failure
+
+    def send_gossip(self, message_id, ttl, flags, type, payload):
+        """Sends the payload of a gossip message to the connected node, see NodeConnection.send_gossip."""
+        if self.framing != 'length':
+            return
+
+        if len(payload) + protocol.GOSSIP_HEADER.size > self.max_frame_size:
+            self.main_node.debug_print("send_gossip: The message is larger than the maximum frame size of the node")
+            return
+
+        try:
+            self.write(protocol.create_gossip_buffers(message_id, ttl, payload, flags, type))
+
+        except Exception as e:
+            self.main_node.debug_print("asyncnodeconnection send_gossip: Error sending data to node: " + str(e))
+            self.stats.add("send_errors")
+            self.stop()  # Stopping node due to failure
+
+    def write(self, buffers):
+        """Writes the buffers of a packet to the stream, which are sent by the event loop."""
+        self.writer.writelines(buffers)
+        self.stats.update({"messages_sent": 1, "bytes_sent": sum(len(buffer) for buffer in buffers)})
+
+    def get_queue_depth(self):
+        """Returns the number of bytes that are waiting in the buffer of the stream to be sent to the connected node."""
+        if self.writer.transport is None or self.writer.transport.is_closing():
+            return 0
+
+        return self.writer.transport.get_write_buffer_size()
+
+    def may_drop(self, size):
+        """Returns whether the packet of a payload of size bytes, before it is compressed, may be dropped instead of
+           written, see NodeConnection.may_drop. The stream has no send queue, so only the frame may become larger than
+           the max_frame_size of the connected node."""
+        return self.framing == 'length' and size + (size >> 10) + 64 > self.max_frame_size # Deflate may grow the data
+
+    async def drain(self):
+        """Wait until the data that has been send is written to the stream."""
+        try:
+            await self.writer.drain()
+
+        except Exception as e:
+            self.main_node.debug_print("asyncnodeconnection drain: Error sending data to node: " + str(e))
+            self.stop()
+
+    def stop(self):
+        """Terminates the connection. Closing the stream wakes up the task that waits for data, so it stops."""
+        self.terminate_flag.set()
+        self.writer.close()
+
+    async def run(self):
+        """The main loop of the task to handle the connection with the node. Within the main loop the task waits to
+           receive data from the node. If data is received the method node_message will be invoked of the main node
+           to be processed. When processing the data raises an exception, for example in node_message, the connection
+           is closed and node_disconnected is invoked."""
+        chunk = b'' # Data that has been received together with the handshake is in the receive buffer
+
+        while not self.terminate_flag.is_set():
+            try:
+                self.receive_data(chunk)
+
+            except (protocol.FrameError, MemoryError) as e:
+                self.main_node.debug_print("AsyncNodeConnection: " + str(e))
+                break
+
+            except Exception as e: # Do not let the task stop without closing the connection
+                self.main_node.debug_print("AsyncNodeConnection: Exception while processing the data: " + str(e))
+                self.stats.add("receive_errors")
+                break
+
+            try:
+                chunk = await self.reader.read(4096)
+
+            except Exception as e:
+                self.main_node.debug_print('Unexpected error')
+                self.main_node.debug_print(e)
+                break
+
+            if chunk == b'':  # The stream has been closed
+                break
+
+        self.terminate_flag.set()
+        self.writer.close()
+        try:
+            if hasattr(self.writer, "wait_closed"): # Python 3.7 and later
+                await self.writer.wait_closed()
+
+        except Exception as e:
+            self.main_node.debug_print("AsyncNodeConnection: " + str(e))
+
+        self.main_node.node_disconnected(self)
+        self.main_node.debug_print("AsyncNodeConnection: Stopped")
+
+    def __str__(self):
+        return 'AsyncNodeConnection: {}:{} <-> {}:{} ({})'.format(self.main_node.host, self.main_node.port, self.host,
+                                                                  self.port, self.id)
+
+    def __repr__(self):
+        return '<AsyncNodeConnection: Node {}:{} <-> Connection {}:{}>'.format(self.main_node.host, self.main_node.port,
+                                                                               self.host, self.port)
+
+    def __hash__(self):
+        return hash(self.main_node.id + self.id)
+
+    def __eq__(self, other):
+        return self.main_node == other.main_node and self.id == other.id
+
+
+class AsyncNode:
+    """Implements a node that is able to connect to other nodes and is able to accept connections from other nodes,
+    like Node, but using one asyncio event loop for all the connections. This makes it possible to serve thousands
+    of nodes without creating a thread for each of them. The events are the same as the events of Node, so you
+    implement your node by extending this class or by providing a callback. The event methods are invoked on the
+    event loop, so they should not block. All methods need to be called from the event loop of the node; use
+    asyncio.run_coroutine_threadsafe when you need to call them from another thread.
+      host: The host name or ip address that is used to bind the TCP/IP server to.
+      port: The port number that is used to bind the TCP/IP server to.
+      id: (optional) This id will be associated with the node. When not given a unique ID will be created.
+      callback: (optional) The callback that is invoked when events happen inside the network.
+      max_connections: (optional) limiting the maximum nodes that are able to connect to this node."""
+
+    def __init__(self, host, port, id=None, callback=None, max_connections=1):
+        """Create instance of an AsyncNode. The TCP/IP server is started by the coroutine start.
+            host: The host name or ip address that is used to bind the TCP/IP server to.
+            port: The port number that is used to bind the TCP/IP server to.
+            id: (optional) This id will be associated with the node. When not given a unique ID will be created.
+            callback: (optional) The callback that is invoked when events happen inside the network.
+            max_connections: (optional) limiting the maximum nodes that are able to connect to this node."""
+
+        # Server details, host (or ip) to bind to and the port
+        self.host = host
+        self.port = port
+
+        # Events are send back to the given callback
+        self.callback = callback
+
+        # Nodes that have established a connection with this node
+        self.nodes_inbound = PeerSet()  # Nodes that are connect with us N->(US)
+
+        # Nodes that this nodes is connected to
+        self.nodes_outbound = PeerSet()  # Nodes that we are connected to (US)->N
+
+        # A list of nodes that should be reconnected to whenever the connection was lost
+        self.reconnect_to_nodes = []
+
+        # Create a unique ID for each node if the ID is not given.
+        if id == None:
+            self.id = self.generate_id()
+
+        else:
+            self.id = str(id) # Make sure the ID is a string!
+
+        # The asyncio server and the task that checks the reconnections, created by start
+        self.server = None
+        self.reconnect_task = None
+
+        # Seconds between the checks whether nodes need to be reconnected
+        self.reconnect_interval = 1.0
+
+        # Backoff after a failed reconnection: seconds to wait after the first failed trial, the maximum seconds to
+        # wait and the random part of the delay, see reconnect.backoff
+        self.reconnect_delay = 1.0
+        self.reconnect_max_delay = 60.0
+        self.reconnect_jitter = 0.5
+
+        # Message counters to make sure everyone is able to track the total messages, see get_stats
+        self.stats = Stats()
+
+        # The tracer that measures the latency of the stages, see Node.enable_tracing
+        self.tracer = None
+
+        # Connection limit of inbound nodes (nodes that connect to us)
+        self.max_connections = max_connections
+        self.inbound_pending = 0 # Nodes that are exchanging their id's, they count as connections
+
+        # The number of connections that wait to be accepted and the seconds the exchange of the id's may take
+        self.backlog = 128
+        self.handshake_timeout = 10.0
+
+        # The framing that this node prefers: 'length' or 'eot'
+        self.framing = 'length'
+
+        # The serializers that this node supports, the preferred first. With each node the serializers that both
+        # nodes support are used.
+        self.serializers = serializer.names()
+
+        # The codecs that this node supports, the largest frame that this node accepts and whether the other nodes
+        # may delay their messages to batch them, see Node
+        self.codecs = ['zlib', 'bzip2', 'lzma', 'zlib-stream']
+        self.max_frame_size = protocol.DEFAULT_MAX_FRAME_SIZE
+        self.batching = True
+
+        # An AsyncNode does not listen on a Unix domain socket, the paths that other nodes send are kept, see Node
+        self.unix_path = None
+        self.unix_paths = {}
+
+        # The addresses of the legacy nodes that have replied after our options had been sent, see Node.legacy_nodes
+        self.legacy_nodes = set()
+
+        # An AsyncNode does not have a datagram channel, the messages that are sent with unreliable=True are sent over
+        # the connection, see Node.send_to_node
+        self.udp_sock = None
+
+        # The policy that chooses the compression of the messages that are sent with compression='auto'
+        self.compression_policy = CompressionPolicy()
+
+        # Gossip: the default TTL (hops), the id's of the gossip messages that have been seen and the counters
+        self.gossip_ttl = 8
+        self.gossip_cache = SeenCache()
+        self.gossip_counters = {"sent": 0, "received": 0, "delivered": 0, "redundant": 0, "forwarded": 0}
+        self.gossip_lock = threading.Lock()
+
+        # Debugging on or off!
+        self.debug = False
+
+    # The helper methods and the events are shared with Node, so extending an AsyncNode works exactly the same.
+    all_nodes = Node.all_nodes
+    message_count_send = Node.message_count_send
+    message_count_recv = Node.message_count_recv
+    message_count_rerr = Node.message_count_rerr
+    get_stats = Node.get_stats
+    enable_tracing = Node.enable_tracing
+    disable_tracing = Node.disable_tracing
+    get_latencies = Node.get_latencies
+    get_queue_depths = Node.get_queue_depths
+    get_node = Node.get_node
+    debug_print = Node.debug_print
+    generate_id = Node.generate_id
+    print_connections = Node.print_connections
+    outbound_node_connected = Node.outbound_node_connected
+    inbound_node_connected = Node.inbound_node_connected
+    node_disconnected = Node.node_disconnected
+    inbound_node_disconnected = Node.inbound_node_disconnected
+    outbound_node_disconnected = Node.outbound_node_disconnected
+    node_message = Node.node_message
+    node_disconnect_with_outbound_node = Node.node_disconnect_with_outbound_node
+    node_request_to_stop = Node.node_request_to_stop
+    node_reconnection_error = Node.node_reconnection_error
+    negotiate = Node.negotiate
+    add_unix_path = Node.add_unix_path
+    is_local_host = Node.is_local_host
+    negotiate_framing = Node.negotiate_framing
+    negotiate_serializers = Node.negotiate_serializers
+    negotiate_codecs = Node.negotiate_codecs
+    negotiate_max_frame_size = Node.negotiate_max_frame_size
+    handshake_options = Node.handshake_options
+    gossip = Node.gossip
+    forward_gossip = Node.forward_gossip
+    can_forward = Node.can_forward
+    gossip_received = Node.gossip_received
+    count_gossip = Node.count_gossip
+    node_gossip_message = Node.node_gossip_message
+
+    async def start(self):
+        """Starts the TCP/IP server of the node, so other nodes are able to connect with this node."""
+        print("Initialisation of the AsyncNode on port: " + str(self.port) + " on node (" + self.id + ")")
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port, reuse_address=True, backlog=self.backlog)
+        self.reconnect_task = asyncio.ensure_future(self.run_reconnect())
+
+    async def stop(self):
+        """Stop this node and terminate all the connected nodes. The coroutine returns when all the connections
+           have been closed."""
+        self.node_request_to_stop()
+        print("Node stopping...")
+
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+        nodes = list(self.all_nodes)
+        for n in nodes:
+            n.stop()
+
+        await asyncio.gather(*[n.task for n in nodes if n.task is not None], return_exceptions=True)
+        print("Node stopped")
+
+    def send_to_nodes(self, data, exclude=[], compression='none', unreliable=False):
+        """ Send a message to all the nodes that are connected with this node. data is a python variable which is
+            converted to JSON that is send over to the other node. exclude list gives all the nodes to which this
+            data should not be sent. The data is serialized and compressed once for all the nodes that use the same
+            format and the same packet is sent to each of these nodes."""
+        packets = {} # The packets that are shared by the nodes, see NodeConnection.create_packet
+        for n in self.all_nodes:
+            if n in exclude:
+                self.debug_print("AsyncNode send_to_nodes: Excluding node in sending the message")
+            else:
+                self.send_to_node(n, data, compression, packets, unreliable)
+
+    def send_to_node(self, n, data, compression='none', packets=None, unreliable=False):
+        """ Send the data to the node n if it exists. The packets are used to share the packets with other nodes.
+            An AsyncNode does not have a datagram channel, so the data is sent over the connection when unreliable
+            is True as well."""
+        if n in self.nodes_inbound or n in self.nodes_outbound:
+            n.send(data, compression=compression, packets=packets)
+
+        else:
+            self.debug_print("AsyncNode send_to_node: Could not send the data, node is not found!")
+
+    async def drain(self):
+        """Wait until the data that has been send to the nodes is written to the streams. Use this to apply flow
+           control when sending a lot of data."""
+        await asyncio.gather(*[n.drain() for n in self.all_nodes])
+
+    async def connect_with_node(self, host, port, reconnect=False, timeout=None):
+        """ Make a connection with another node that is running on host with port. When the connection is made
+            with the node, it exchanges the id's of the node. First we send our id and then we receive the id of the
+            node we are connected to. When the connection is made the method outbound_node_connected is invoked.
+            If reconnect is True, the node will try to reconnect to the node whenever the node connection was
+            closed. When timeout (seconds) is given, the connection and the exchange of the id's fail when they take
+            longer. The coroutine returns True when the node is connected with the specific host."""
+
+        if host == self.host and port == self.port:
+            print("connect_with_node: Cannot connect with yourself!!")
+            return False
+
+        # Check if node is already connected with this node!
+        node = self.nodes_outbound.find(host, port)
+        if node is not None:
+            print("connect_with_node: Already connected with this node (" + node.id + ").")
+            return True
+
+        writer = None
+        try:
+            self.debug_print("connecting to %s port %s" % (host, port))
+            loop = asyncio.get_event_loop()
+            started = loop.time()
+            deadline = started + (timeout if timeout is not None else 10.0)
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            probe = min(protocol.probe_time(loop.time() - started), max(0.001, deadline - loop.time()))
+
+            # Basic information exchange (not secure) of the id's of the nodes!
+            address = PeerSet.address(host, port)
+            legacy = address in self.legacy_nodes # Wait for the id of the legacy node without sending the options
+            writer.write((self.id + ":" + str(self.port)).encode('utf-8')) # Send my id and port to the connected node!
+            try: # A legacy node replies directly with its id
+                reply = await asyncio.wait_for(reader.read(4096), max(0.001, deadline - loop.time()) if legacy else probe)
+                if reply == b'':
+                    raise ConnectionError("The connection has been closed during the handshake")
+                (handshake, received) = (reply.decode('utf-8'), b'')
+
+            except asyncio.TimeoutError: # The node waits for our options, see protocol.HANDSHAKE_PROBE
+                if legacy:
+                    raise
+
+                writer.write(self.handshake_options().encode('utf-8'))
+                (handshake, received) = await self.read_handshake(reader, deadline)
+                if protocol.OPTIONS_SEPARATOR not in handshake:
+                    # A legacy node that replied late has received our options as part of our id and port or its
+                    # stream, so connect again without sending the options
+                    self.debug_print("connect_with_node: " + host + ":" + str(port) + " is a legacy node, connecting again")
+                    self.legacy_nodes.add(address)
+                    writer.close()
+                    return await self.connect_with_node(host, port, reconnect, max(0.001, deadline - loop.time()))
+
+            (connected_node_id, options) = protocol.split_options(handshake)
+
+            # Cannot connect with yourself
+            if self.id == connected_node_id:
+                print("connect_with_node: You cannot connect with yourself?!")
+                if self.negotiate_framing(options) == 'eot': # With length framing the text is not a valid frame
+                    writer.write("CLOSING: Already having a connection together".encode('utf-8'))
+                writer.close()
+                return True
+
+            # Cannot connect with nodes that are already connected with us!
+            node = self.nodes_inbound.get(connected_node_id, host)
+            if node is not None:
+                print("connect_with_node: This node (" + node.id + ") is already connected with us.")
+                if self.negotiate_framing(options) == 'eot': # With length framing the text is not a valid frame
+                    writer.write("CLOSING: Already having a connection together".encode('utf-8'))
+                writer.close()
+                return True
+
+            thread_client = self.create_new_connection(reader, writer, connected_node_id, host, port)
+            self.negotiate(thread_client, options)
+            thread_client.receive_buffer.write(received) # Data that has been sent directly after the handshake
+            self.stats.add("connects")
+            thread_client.start()
+
+            self.nodes_outbound.add(thread_client)
+            self.outbound_node_connected(thread_client)
+
+            # If reconnection to this host is required, it will be added to the list!
+            if reconnect:
+                self.debug_print("connect_with_node: Reconnection check is enabled on node " + host + ":" + str(port))
+                if not any(n["host"] == host and n["port"] == port for n in self.reconnect_to_nodes):
+                    self.reconnect_to_nodes.append({
+                        "host": host, "port": port, "trials": 0, "due": 0.0
+                    })
+
+            return True
+
+        except Exception as e:
+            self.debug_print("AsyncNode.connect_with_node: Could not connect with node. (" + str(e) + ")")
+            if writer is not None:
+                writer.close()
+            return False
+
+    async def connect_many(self, peers, timeout=10.0, concurrency=16, reconnect=False):
+        """ Make a connection with each of the peers, a list of (host, port), at the same time. At most concurrency
+            connections are made at the same moment and each connection fails when it takes longer than timeout
+            seconds. The method outbound_node_connected is invoked as soon as a node is connected. The coroutine
+            returns a dict with for each (host, port) True when the node is connected and False otherwise."""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def connect(host, port):
+            async with semaphore:
+                return await self.connect_with_node(host, port, reconnect, timeout)
+
+        addresses = {} # Connect only once with the same host and port
+        for (host, port) in peers:
+            addresses.setdefault(PeerSet.address(host, port), (host, port))
+
+        peers = list(addresses.values())
+        results = await asyncio.gather(*[connect(host, port) for (host, port) in peers])
+
+        return dict(zip(peers, results))
+
+    def disconnect_with_node(self, node):
+        """Disconnect the TCP/IP connection with the specified node. The node will be deleted from the
+           nodes_outbound list when the connection has been closed. Before closing, the method
+           node_disconnect_with_outbound_node is invoked."""
+        if node in self.nodes_outbound:
+            self.node_disconnect_with_outbound_node(node)
+            node.stop()
+
+        else:
+            self.debug_print("AsyncNode disconnect_with_node: cannot disconnect with a node with which we are not connected.")
+
+    # This method can be overrided when a different nodeconnection is required!
+    def create_new_connection(self, reader, writer, id, host, port):
+        """When a new connection is made, with a node or a node is connecting with us, this method is used
+           to create the actual new connection. The reason for this method is to be able to override the
+           connection class if required. In this case a AsyncNodeConnection will be instantiated to represent
+           the node connection."""
+        return AsyncNodeConnection(self, reader, writer, id, host, port)
+
+    async def read_handshake(self, reader, deadline):
+        """Receives the handshake of the other node from the stream before the deadline (time of the event loop), see
+           protocol.read_handshake and protocol.HandshakeReader. Returns the text of the handshake and the data that
+           has been received after it."""
+        handshake_reader = protocol.HandshakeReader()
+        deadline = time.monotonic() + (deadline - asyncio.get_event_loop().time()) # The reader uses time.monotonic
+        while True:
+            wait = max(0.001, deadline - time.monotonic())
+            if handshake_reader.grace is not None:
+                wait = min(wait, max(0.001, handshake_reader.grace - time.monotonic()))
+
+            try:
+                chunk = await asyncio.wait_for(reader.read(4096), wait)
+
+            except asyncio.TimeoutError:
+                handshake = handshake_reader.expire(deadline=deadline)
+                if handshake is not None: # The id of a legacy node has been received before the deadline
+                    return handshake
+                if time.monotonic() >= deadline:
+                    raise
+                continue
+
+            handshake = handshake_reader.feed(chunk) if chunk != b'' else handshake_reader.close()
+            if handshake is not None:
+                return handshake
+
+    async def handle_connection(self, reader, writer):
+        """Invoked by the asyncio server when a node connects with us. It will exchange the node id's. First we
+           receive the id of the connected node and secondly we will send our node id to the connected node. When
+           connected the method inbound_node_connected is invoked."""
+        client_address = writer.get_extra_info('peername')
+
+        self.debug_print("Total inbound connections:" + str(len(self.nodes_inbound)))
+        # When the maximum connections is reached, it disconnects the connection
+        if len(self.nodes_inbound) + self.inbound_pending >= self.max_connections:
+            self.debug_print("New connection is closed. You have reached the maximum connection limit!")
+            writer.close()
+            return
+
+        self.inbound_pending += 1
+        try:
+            # Basic information exchange (not secure) of the id's of the nodes!
+            connected_node_port = client_address[1] # backward compatibilty
+            (handshake, received) = await self.read_handshake(reader, asyncio.get_event_loop().time() + self.handshake_timeout)
+            (connected_node_id, options) = protocol.split_options(handshake)
+            if ":" in connected_node_id:
+                # When a node is connected, it sends its id!
+                (connected_node_id, connected_node_port) = connected_node_id.split(':')
+
+            # Options are only send back to nodes that send options, legacy nodes only expect our id
+            reply_options = ""
+            if options:
+                reply_options = self.handshake_options(options)
+            writer.write((self.id + reply_options).encode('utf-8')) # Send my id to the connected node!
+
+            thread_client = self.create_new_connection(reader, writer, connected_node_id, client_address[0], connected_node_port)
+            self.negotiate(thread_client, options)
+
+        except Exception as e:
+            self.debug_print("AsyncNode: Could not exchange the id with the connected node (" + str(e) + ")")
+            writer.close()
+            return
+
+        finally:
+            self.inbound_pending -= 1
+
+        thread_client.receive_buffer.write(received) # Data that has been sent directly after the handshake
+        self.stats.add("connects")
+        thread_client.start()
+
+        self.nodes_inbound.add(thread_client)
+        self.inbound_node_connected(thread_client)
+
+    async def reconnect_nodes(self):
+        """This method checks whether nodes that have the reconnection status are still connected. If not
+           connected these nodes are connected again. The nodes are reconnected at the same time. After a failed
+           trial the node waits before the next trial, twice as long after each failed trial (exponential backoff)."""
+        loop = asyncio.get_event_loop()
+        reconnecting = []
+
+        for node_to_check in list(self.reconnect_to_nodes):
+            if node_to_check.get("due", 0.0) > loop.time(): # Waiting after a failed trial
+                continue
+
+            found_node = False
+            self.debug_print("reconnect_nodes: Checking node " + node_to_check["host"] + ":" + str(node_to_check["port"]))
+
+            if self.nodes_outbound.find(node_to_check["host"], node_to_check["port"]) is not None:
+                found_node = True
+                node_to_check["trials"] = 0 # Reset the trials
+                self.debug_print("reconnect_nodes: Node " + node_to_check["host"] + ":" + str(node_to_check["port"]) + " still running!")
+
+            if not found_node: # Reconnect with node
+                node_to_check["trials"] += 1
+                if self.node_reconnection_error(node_to_check["host"], node_to_check["port"], node_to_check["trials"]):
+                    node_to_check["due"] = loop.time() + backoff(node_to_check["trials"], self.reconnect_delay, self.reconnect_max_delay, self.reconnect_jitter)
+                    reconnecting.append(self.connect_with_node(node_to_check["host"], node_to_check["port"])) # Perform the actual connection
+
+                else:
+                    self.debug_print("reconnect_nodes: Removing node (" + node_to_check["host"] + ":" + str(node_to_check["port"]) + ") from the reconnection list!")
+                    self.reconnect_to_nodes.remove(node_to_check)
+
+        await asyncio.gather(*reconnecting)
+
+    async def run_reconnect(self):
+        """The task that periodically checks whether nodes need to be reconnected."""
+        while True:
+            await asyncio.sleep(self.reconnect_interval)
+            await self.reconnect_nodes()
+
+    def __str__(self):
+        return 'AsyncNode: {}:{}'.format(self.host, self.port)
+
+    def __repr__(self):
+        return '<AsyncNode {}:{} id: {}>'.format(self.host, self.port, self.id)
@@ -0,0 +1,159 @@
+import threading
+import time
+
+from p2pnetwork import protocol
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The CompressionPolicy decides which compression is used when a message is sent with compression='auto'. Compression
+is only worth it when the time that is saved on the network is more than the time that is needed to compress and
+decompress the data. The policy measures the ratio and the CPU time of each codec for each peer and message class and
+the throughput of the connection with each peer, and chooses the compression with the lowest end-to-end time.
+"""
+
+class CompressionPolicy:
+    """The policy that is used by the node to choose the compression of a message when compression='auto' is used.
+       Payloads smaller than the threshold are never compressed. For the other payloads the codecs are measured on a
+       sample of the payload, when a peer and message class is seen for the first time and again every
+       explore_interval messages. The estimated end-to-end time of a codec is the CPU time to compress and decompress
+       the payload plus the time to send the compressed payload given the observed throughput of the connection.
+        threshold: (optional) Payloads smaller than this number of bytes are not compressed.
+        codecs: (optional) The codecs that are considered next to no compression.
+        throughput: (optional) The throughput in bytes per second that is assumed until it has been measured."""
+
+    def __init__(self, threshold=1024, codecs=('zlib', 'bzip2', 'lzma'), throughput=12500000.0):
+        """Creates the compression policy.
+            threshold: (optional) Payloads smaller than this number of bytes are not compressed.
+            codecs: (optional) The codecs that are considered next to no compression.
+            throughput: (optional) The throughput in bytes per second that is assumed until it has been measured."""
+        self.threshold = threshold
+        self.codecs = codecs
+        self.throughput = throughput
+
+        # Number of bytes of the payload that is used to measure the codecs
+        self.sample_size = 65536
+
+        # Number of messages of a peer and message class after which the codecs are measured again
+        self.explore_interval = 100
+
+        # Weight of a new measurement in the moving averages
+        self.alpha = 0.2
+
+        # Measurements of the codecs by (peer id, message class): {"count": messages, codec: {"ratio", "cpu"}}
+        # where the cpu is the CPU time in seconds per byte of the payload.
+        self.stats = {}
+
+        # Observed throughput in bytes per second by peer id
+        self.throughputs = {}
+
+        self.lock = threading.Lock()
+
+    def message_class(self, type, size):
+        """Returns the class of a message, which is the type of the payload and the power of two of its size."""
+        return (type, size.bit_length())
+
+    def choose(self, connection, type, data):
+        """Returns the compression (zlib, bzip2, lzma or none) with the lowest estimated end-to-end time to send the
+           data to the given connection. The type is the type of the payload as given by the protocol module."""
+        if len(data) < self.threshold:
+            return 'none'
+
+        key = (connection.id, self.message_class(type, len(data)))
+
+        with self.lock:
+            entry = self.stats.setdefault(key, {"count": 0})
+            measure = entry["count"] % self.explore_interval == 0
+            entry["count"] += 1
+
+        if measure:
+            self.measure(key, data[0:self.sample_size])
+
+        with self.lock:
+            best = 'none'
+            best_time = self.estimate(connection, key, 'none', len(data))
+            for compression in self.codecs:
+                estimate = self.estimate(connection, key, compression, len(data))
+                if estimate < best_time:
+                    best = compression
+                    best_time = estimate
+
+        return best
+
+    def measure(self, key, sample):
+        """Measures the ratio and the CPU time to compress and decompress the sample with each codec."""
+        for compression in self.codecs:
+            start = time.thread_time()
+            compressed = protocol.compress(sample, compression)
+            protocol.decompress(compressed)
+            cpu = time.thread_time() - start
+
+            self.update(key, compression, len(sample), len(compressed), cpu)
+
+    def record(self, connection, type, size, compression, compressed_size):
+        """Adds the ratio that has been achieved when a message has been compressed with compression='auto'. The
+           compressed size is the size of the binary compressed payload."""
+        self.update((connection.id, self.message_class(type, size)), compression, size, compressed_size)
+
+    def update(self, key, compression, size, compressed_size, cpu=None):
+        """Adds a measurement of a codec to the moving averages of the given (peer id, message class). When the CPU
+           time is not given, only the ratio is updated."""
+        with self.lock:
+            entry = self.stats.setdefault(key, {"count": 0})
+            ratio = compressed_size / size
+
+            if compression not in entry:
+                if cpu == None:
+                    return # The codec has not been measured yet
+
+                entry[compression] = {"ratio": ratio, "cpu": cpu / size}
+
+            else:
+                entry[compression]["ratio"] += self.alpha * (ratio - entry[compression]["ratio"])
+                if cpu != None:
+                    entry[compression]["cpu"] += self.alpha * (cpu / size - entry[compression]["cpu"])
+
+    def update_throughput(self, connection, size, seconds):
+        """Adds a measurement of the throughput of the connection, given the bytes that have been sent in seconds.
+           The connection measures from the moment it starts sending queued packets until its send queue is empty,
+           so when the node sends faster than the network, the time waiting for the socket is included. A burst that
+           fits in the send buffer of the socket only measures the copy into the kernel, which overestimates the
+           network. Only payloads of at least the threshold are used, the time of smaller payloads is not
+           meaningful."""
+        if size < self.threshold or seconds <= 0:
+            return
+
+        with self.lock:
+            throughput = size / seconds
+            if connection.id not in self.throughputs:
+                self.throughputs[connection.id] = throughput
+
+            else:
+                self.throughputs[connection.id] += self.alpha * (throughput - self.throughputs[connection.id])
+
+    def remove(self, id):
+        """Removes the measurements of the peer with the given id, when the node is not connected with it anymore."""
+        with self.lock:
+            self.throughputs.pop(id, None)
+            for key in [key for key in self.stats if key[0] == id]:
+                del self.stats[key]
+
+    def estimate(self, connection, key, compression, size):
+        """Returns the estimated end-to-end time in seconds to send a payload of size bytes with the compression.
+           Codecs that have not been measured are estimated to take forever."""
+        throughput = self.throughputs.get(connection.id, self.throughput)
+        if compression == 'none':
+            return size / throughput
+
+        entry = self.stats.get(key, {})
+        if compression not in entry:
+            return float('inf')
+
+        ratio = entry[compression]["ratio"]
+        if connection.framing != 'length': # base64 encoded
+            ratio = ratio * 4 / 3
+
+        return entry[compression]["cpu"] * size + ratio * size / throughput
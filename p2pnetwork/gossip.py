@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The gossip of a node floods a message through the whole network. Each message has a unique id and a TTL, the
+number of hops the message is still forwarded. Each node delivers the message to the application and forwards it
+to its other nodes. Messages that have been seen before are not delivered and not forwarded again, which is checked
+with the SeenCache.
+"""
+
+class SeenCache:
+    """Holds the id's of the gossip messages that have been seen by the node. The cache is bounded: the oldest id is
+       removed when the cache holds size id's (least recently used) and id's are removed after ttl seconds. A
+       message that arrives again after its id has been removed is seen as a new message, so choose the size and the
+       ttl large enough for the time a message travels through the network. The cache is thread-safe.
+        size: (optional) The maximum number of id's in the cache.
+        ttl: (optional) Seconds after which an id is removed from the cache."""
+
+    def __init__(self, size=100000, ttl=300.0):
+        """Creates an empty cache.
+            size: (optional) The maximum number of id's in the cache.
+            ttl: (optional) Seconds after which an id is removed from the cache."""
+        self.size = size
+        self.ttl = ttl
+
+        # The id's with the time they have been seen, the oldest first
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.seen)
+
+    def __contains__(self, id):
+        with self.lock:
+            self.expire(time.monotonic())
+            return id in self.seen
+
+    def add(self, id):
+        """Adds the id to the cache. Returns True when the id is new and False when it has been seen before."""
+        now = time.monotonic()
+
+        with self.lock:
+            self.expire(now)
+
+            if id in self.seen: # Seen again, so keep it longer
+                self.seen.move_to_end(id)
+                self.seen[id] = now
+                return False
+
+            self.seen[id] = now
+            if len(self.seen) > self.size:
+                self.seen.popitem(last=False)
+
+            return True
+
+    def expire(self, now):
+        """Removes the id's that are older than ttl seconds, the lock must be held."""
+        while len(self.seen) > 0:
+            (id, seen) = next(iter(self.seen.items()))
+            if now - seen < self.ttl:
+                break
+
+            del self.seen[id]
@@ -0,0 +1,187 @@
+import socket
+import selectors
+import threading
+import time
+
+from p2pnetwork import protocol
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The HandshakeReceiver receives the handshakes of all the nodes that connect with a Node on one thread by using
+selectors, so a node that connects and does not send its handshake does not take a thread. Only when the handshake
+has been received completely, the connection is handed over to the handshake threads of the node, which reply and
+create the node connection.
+"""
+
+class HandshakeReceiver:
+    """The HandshakeReceiver is used by the class Node for the connections that have been accepted. Each connection
+       waits in the selector until its handshake is complete, see protocol.HandshakeReader, or until its deadline has
+       passed, then the connection is closed. The legacy nodes that do not send options are handed over when the
+       grace for their options has passed. The thread of the receiver is started by the thread of the node and stops
+       when the node stops.
+        main_node: The Node that owns the receiver."""
+
+    def __init__(self, main_node):
+        """Creates the receiver of the given node. The thread is started by start.
+            main_node: The Node that owns the receiver."""
+        self.main_node = main_node
+        self.selector = selectors.DefaultSelector()
+
+        # Seconds that the receiver waits at most for events, so it notices that the node stops
+        self.select_timeout = 1.0
+
+        # The thread that runs the main loop
+        self.thread = None
+
+        # The connections that have been accepted and are not registered yet: (connection, client_address, deadline)
+        self.incoming = []
+        self.incoming_lock = threading.Lock()
+
+        # The socket pair is used to wake up the receiver when a connection has been accepted
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ, None)
+
+    def start(self):
+        """Starts the thread that receives the handshakes."""
+        self.thread = threading.Thread(target=self.run, name="handshake-receiver", daemon=True)
+        self.thread.start()
+
+    def add(self, connection, client_address, deadline):
+        """Receives the handshake of the connection that has been accepted, which fails when it has not been received
+           at the deadline (time.monotonic). It is safe to call this method from any thread."""
+        with self.incoming_lock:
+            self.incoming.append((connection, client_address, deadline))
+
+        self.wakeup()
+
+    def wakeup(self):
+        """Wakes up the receiver when it is waiting for the sockets."""
+        try:
+            self.wakeup_send.send(b'\x00')
+
+        except (BlockingIOError, OSError):
+            pass # The receiver is already woken up or closed
+
+    def handle_wakeup(self):
+        """Empties the wakeup socket."""
+        try:
+            while self.wakeup_recv.recv(4096):
+                pass
+
+        except (BlockingIOError, OSError):
+            pass
+
+    def register_incoming(self):
+        """Registers the connections that have been accepted, so their handshakes are received."""
+        with self.incoming_lock:
+            incoming = self.incoming
+            self.incoming = []
+
+        for (connection, client_address, deadline) in incoming:
+            try:
+                connection.setblocking(False)
+                self.selector.register(connection, selectors.EVENT_READ, (protocol.HandshakeReader(), client_address, deadline))
+
+            except (OSError, ValueError) as e:
+                self.main_node.handshake_failed(connection, e)
+
+    def handle_readable(self, key):
+        """Receives the data of the connection that is readable. When the handshake is complete, the connection is
+           handed over to the main node. When the connection has been closed or the handshake is invalid, the
+           connection is closed."""
+        (reader, client_address, deadline) = key.data
+        try:
+            chunk = key.fileobj.recv(4096)
+
+        except (BlockingIOError, InterruptedError):
+            return
+
+        except OSError as e:
+            self.drop(key.fileobj, e)
+            return
+
+        try:
+            handshake = reader.feed(chunk) if chunk != b'' else reader.close()
+
+        except Exception as e: # Closed during the handshake, too large or not utf-8
+            self.drop(key.fileobj, e)
+            return
+
+        if handshake is not None:
+            self.complete(key.fileobj, client_address, handshake)
+
+    def complete(self, connection, client_address, handshake):
+        """Hands the connection with the complete handshake over to the main node, see Node.handshake_received."""
+        self.selector.unregister(connection)
+        self.main_node.handshake_received(connection, client_address, handshake[0], handshake[1])
+
+    def drop(self, connection, reason):
+        """Stops receiving the handshake of the connection and closes it."""
+        self.selector.unregister(connection)
+        self.main_node.handshake_failed(connection, reason)
+
+    def expire(self):
+        """Hands over the handshakes of the legacy nodes whose grace has passed and closes the connections whose
+           deadline has passed. Returns the seconds until the next grace or deadline, at most select_timeout."""
+        now = time.monotonic()
+        wait = self.select_timeout
+
+        for key in list(self.selector.get_map().values()):
+            if key.data is None: # The wakeup socket
+                continue
+
+            (reader, client_address, deadline) = key.data
+            handshake = reader.expire(now, deadline)
+            if handshake is not None:
+                self.complete(key.fileobj, client_address, handshake)
+
+            elif now >= deadline:
+                self.drop(key.fileobj, "The handshake has not been received in time")
+
+            else:
+                wait = min(wait, deadline - now)
+                if reader.grace is not None:
+                    wait = min(wait, reader.grace - now)
+
+        return max(0.0, wait)
+
+    def run(self):
+        """The main loop of the receiver. It runs until the terminate flag of the main node is set, then the
+           connections whose handshake has not been received are closed."""
+        wait = self.select_timeout
+
+        while not self.main_node.terminate_flag.is_set():
+            for (key, mask) in self.selector.select(wait):
+                if key.data is None:
+                    self.handle_wakeup()
+
+                else:
+                    self.handle_readable(key)
+
+            self.register_incoming()
+            wait = self.expire()
+
+        self.close()
+
+    def close(self):
+        """Closes the connections whose handshake has not been received and the receiver itself."""
+        self.register_incoming()
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                self.drop(key.fileobj, "The node is stopping")
+
+        self.selector.close()
+        self.wakeup_recv.close()
+        self.wakeup_send.close()
+
+    def stop(self):
+        """Wakes up the receiver, so it stops when the node has been terminated, and waits until it has stopped."""
+        self.wakeup()
+        if self.thread is not None:
+            self.thread.join()
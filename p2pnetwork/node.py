@@ -1,10 +1,28 @@
+import os
 import socket
 import time
 import threading
 import random
+import secrets
 import hashlib
-
-from p2pnetwork.nodeconnection import NodeConnection
+import queue
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from p2pnetwork import protocol
+from p2pnetwork import ringbuffer
+from p2pnetwork import serializer
+from p2pnetwork.compression import CompressionPolicy
+from p2pnetwork.gossip import SeenCache
+from p2pnetwork.handshake import HandshakeReceiver
+from p2pnetwork.peers import PeerSet
+from p2pnetwork.reconnect import ReconnectScheduler
+from p2pnetwork.stats import Stats
+from p2pnetwork.tracing import Tracer
+from p2pnetwork.nodeconnection import NodeConnection # Not used here, kept so it can still be imported from this module
+from p2pnetwork.nodeconnection import SendQueueFull
+from p2pnetwork.reactor import Reactor
+from p2pnetwork.transport import TcpTransport, UnixTransport
 
 """
 Author: Maurice Snoeren <macsnoeren(at)gmail.com>
@@ -29,16 +47,35 @@ class Node(threading.Thread):
                  event: The event string that has happened.
                  main_node: The main node that is running all the connections with the other nodes.
                  connected_node: Which connected node caused the event.
-                 data: The data that is send by the connected node."""
+                 data: The data that is send by the connected node.
+      reactor: (optional) When True, one thread handles all the connections by using a selectors based reactor.
+      backlog: (optional) The number of connections that wait to be accepted.
+      transport: (optional) The transport that is used to connect with other nodes, TCP/IP by default.
+      unix_path: (optional) The path of the Unix domain socket that nodes on the same host are able to connect with."""
 
-    def __init__(self, host, port, id=None, callback=None, max_connections=1):
+    def __init__(self, host, port, id=None, callback=None, max_connections=1, reactor=False, backlog=128, transport=None, unix_path=None, udp_port=None):
         """Create instance of a Node. If you want to implement the Node functionality with a callback, you should 
            provide a callback method. It is preferred to implement a new node by extending this Node class. 
             host: The host name or ip address that is used to bind the TCP/IP server to.
             port: The port number that is used to bind the TCP/IP server to.
             id: (optional) This id will be associated with the node. When not given a unique ID will be created.
             callback: (optional) The callback that is invoked when events happen inside the network.
-            max_connections: (optional) limiting the maximum nodes that are able to connect to this node."""
+            max_connections: (optional) limiting the maximum nodes that are able to connect to this node.
+            reactor: (optional) When True, the thread of the node handles the server socket and the sockets of all
+                     the connections by using a reactor. No thread is created for each connection and the data is
+                     processed as soon as it arrives.
+            backlog: (optional) The number of connections that wait to be accepted before new connections are
+                     refused by the operating system.
+            transport: (optional) The transport that is used to listen for and connect with other nodes, see
+                       transport.Transport. When not given, the node uses TCP/IP. Nodes that run in the same
+                       process are able to use a shared transport.InProcessTransport.
+            unix_path: (optional) When given, the node listens on this Unix domain socket as well. Nodes on the
+                       same host are able to connect with it and connect with it automatically when they know
+                       the path, see prefer_unix. A path that contains ',' or ':' is not sent to the other
+                       nodes.
+            udp_port: (optional) When given, the node opens a UDP socket on this port of its host for the datagram
+                      channel with the other nodes that have one, see send_to_node. With 0 the operating system
+                      chooses the port."""
         super(Node, self).__init__()
 
         # When this flag is set, the node will stop and close
@@ -52,13 +89,15 @@ class Node(threading.Thread):
         self.callback = callback
 
         # Nodes that have established a connection with this node
-        self.nodes_inbound = set()  # Nodes that are connect with us N->(US)
+        self.nodes_inbound = PeerSet()  # Nodes that are connect with us N->(US)
 
         # Nodes that this nodes is connected to
-        self.nodes_outbound = set()  # Nodes that we are connected to (US)->N
+        self.nodes_outbound = PeerSet()  # Nodes that we are connected to (US)->N
 
-        # A list of nodes that should be reconnected to whenever the connection was lost
+        # A list of nodes that should be reconnected to whenever the connection was lost, the scheduler reconnects
+        # with these nodes in the background with exponential backoff between the trials
         self.reconnect_to_nodes = []
+        self.reconnect_scheduler = ReconnectScheduler(self)
 
         # Create a unique ID for each node if the ID is not given.
         if id == None:
@@ -67,17 +106,123 @@ class Node(threading.Thread):
         else:
             self.id = str(id) # Make sure the ID is a string!
 
-        # Start the TCP/IP server
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # The transport that creates the server and the connections, TCP/IP by default
+        self.transport = transport
+        if self.transport is None:
+            self.transport = TcpTransport()
+
+        if reactor and not self.transport.selectable:
+            raise ValueError("The reactor cannot be used with the transport " + type(self.transport).__name__)
+
+        # Nodes on the same host are able to connect with the Unix domain socket of this node, which skips the TCP/IP
+        # stack. The path is sent to the other nodes when they connect. The paths of the nodes on the same host are
+        # kept in unix_paths by host and port. When prefer_unix is True, the node connects with the Unix domain socket
+        # of a node when its path is known and falls back to TCP/IP when that fails.
+        self.unix_path = unix_path
+        self.unix_transport = UnixTransport()
+        self.unix_sock = None
+        self.unix_accept_thread = None
+        self.unix_paths = {}
+        self.prefer_unix = True
+
+        # The addresses (see PeerSet.address) of the legacy nodes that have replied after our options had been sent.
+        # The options are never sent to them again, see connect_with_node.
+        self.legacy_nodes = set()
+
+        # When shm_size is larger than 0, the node offers a ring buffer in shared memory of shm_size bytes to each
+        # node on the same host. When both nodes offer one, the frames are written in the ring buffers instead of
+        # the socket, which is then only used to signal the frames. Only the frames of at least shm_threshold bytes
+        # are written in the ring buffers, smaller frames are faster over the socket. Frames that do not fit are sent
+        # over the socket.
+        self.shm_size = 0
+        self.shm_threshold = 65536
+
+        # The datagram channel (UDP) is negotiated with each node that has one as well, when they are connected over
+        # TCP/IP. Each connection gets a random token from this node that the other node puts in its datagrams, so the
+        # datagrams are delivered to the right connection, see udp_nodes. Datagrams from another host than the one of
+        # the connection are dropped. Messages that are sent with unreliable=True are sent as datagram when the
+        # datagram is at most datagram_size bytes (the MTU of 1500 bytes without the IP and UDP headers), larger
+        # messages are sent over the connection.
+        self.udp_port = udp_port
+        self.udp_sock = None
+        self.udp_thread = None
+        self.udp_nodes = {} # token -> NodeConnection
+        self.datagram_size = 1472
+
+        # Start the server
+        self.backlog = backlog
+        self.sock = None
         self.init_server()
 
-        # Message counters to make sure everyone is able to track the total messages
-        self.message_count_send = 0
-        self.message_count_recv = 0
-        self.message_count_rerr = 0
+        # Message counters to make sure everyone is able to track the total messages, see get_stats. The node
+        # connections add their counters to the counters of the node.
+        self.stats = Stats()
+
+        # The tracer that measures the latency of the stages of sending and receiving messages, see enable_tracing.
+        # Tracing is disabled when it is None.
+        self.tracer = None
         
-        # Connection limit of inbound nodes (nodes that connect to us)
+        # Connection limit of inbound nodes (nodes that connect to us), the connections that are exchanging their
+        # id's count as well, so the limit is never exceeded
         self.max_connections = max_connections
+        self.inbound_pending = 0
+        self.inbound_lock = threading.Lock()
+
+        # The handshakes of the nodes that connect with us are received by one thread that does not wait for any of
+        # them, see HandshakeReceiver, so a node that connects and does not send its id does not stop other nodes from
+        # connecting. A handshake that has not been received within handshake_timeout seconds after the connection
+        # has been accepted fails. When the handshake has been received, a pool of handshake_workers threads replies
+        # and creates the node connection. The transports that are not sockets use these threads to receive the
+        # handshake as well.
+        self.handshake_workers = 16
+        self.handshake_timeout = 10.0
+        self.handshake_executor = None
+        self.handshake_receiver = HandshakeReceiver(self)
+
+        # The reactor that handles all the connections, None when each connection has its own thread
+        self.reactor = None
+        if reactor:
+            self.reactor = Reactor(self)
+
+        # The framing that this node prefers: 'length' or 'eot'. Length framing is only used with nodes that
+        # support it as well, otherwise the legacy EOT framing is used.
+        self.framing = 'length'
+
+        # The serializers that this node supports, the preferred first. With each node the serializers that both
+        # nodes support are used.
+        self.serializers = serializer.names()
+
+        # The codecs that this node supports and the largest frame that this node accepts. With each node only the
+        # codecs that both nodes support are used and frames that are larger than its maximum frame size are not sent.
+        # Connections that send frames larger than max_frame_size (64 MiB by default) are closed. Raise it, at most to
+        # protocol.MAX_FRAME_SIZE, to receive larger messages.
+        self.codecs = ['zlib', 'bzip2', 'lzma', 'zlib-stream']
+        self.max_frame_size = protocol.DEFAULT_MAX_FRAME_SIZE
+
+        # When False, the other nodes are asked not to delay their messages to us to batch them, see flush_window
+        self.batching = True
+
+        # Maximum number of packets that are queued for each connection and what happens when the queue of a
+        # connection is full: 'block' waits until there is space, 'drop' drops the packet and 'raise' raises queue.Full.
+        # The methods that send to many nodes raise SendQueueFull after the other nodes have been sent to.
+        self.send_queue_size = 1000
+        self.backpressure = 'block'
+
+        # The writer of a connection coalesces the queued packets until flush_bytes is reached or the flush_window
+        # (seconds) has passed, and sends them together. With a flush_window of 0 only the packets that are already
+        # queued are coalesced, so the packets are never delayed.
+        self.flush_bytes = 262144
+        self.flush_window = 0.0
+
+        # The policy that chooses the compression of the messages that are sent with compression='auto'
+        self.compression_policy = CompressionPolicy()
+
+        # Gossip: the default TTL (hops) of the gossip messages, the id's of the gossip messages that have been seen
+        # and the counters of the gossip messages. Redundant are the messages that have been received again.
+        self.gossip_ttl = 8
+        self.gossip_cache = SeenCache()
+        self.gossip_counters = {"sent": 0, "received": 0, "delivered": 0, "redundant": 0, "forwarded": 0}
+        self.gossip_lock = threading.Lock()
 
         # Debugging on or off!
         self.debug = False
@@ -85,7 +230,16 @@ class Node(threading.Thread):
     @property
     def all_nodes(self):
         """Return a list of all the nodes, inbound and outbound, that are connected with this node."""
-        return self.nodes_inbound | self.nodes_outbound
+        return list(self.nodes_inbound.snapshot() + self.nodes_outbound.snapshot())
+
+    def get_node(self, id):
+        """Returns the connected node with the given id or None when the node is not connected. When the node is
+           connected inbound and outbound, the outbound node is returned."""
+        node = self.nodes_outbound.get(id)
+        if node is None:
+            node = self.nodes_inbound.get(id)
+
+        return node
 
     def debug_print(self, message):
         """When the debug flag is set to True, all debug messages are printed in the console."""
@@ -100,12 +254,20 @@ class Node(threading.Thread):
         return id.hexdigest()
 
     def init_server(self):
-        """Initialization of the TCP/IP server to receive connections. It binds to the given host and port."""
+        """Initialization of the server to receive connections. The transport binds it to the given host and port."""
         print("Initialisation of the Node on port: " + str(self.port) + " on node (" + self.id + ")")
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.sock.bind((self.host, self.port))
-        self.sock.settimeout(10.0)
-        self.sock.listen(1)
+        self.sock = self.transport.listen(self)
+
+        if self.unix_path is not None:
+            print("Initialisation of the Node on Unix domain socket: " + self.unix_path + " on node (" + self.id + ")")
+            self.unix_sock = self.unix_transport.listen(self)
+
+        if self.udp_port is not None:
+            self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_sock.bind((self.host, self.udp_port))
+            self.udp_sock.settimeout(1.0)
+            self.udp_port = self.udp_sock.getsockname()[1]
+            print("Initialisation of the Node on UDP port: " + str(self.udp_port) + " on node (" + self.id + ")")
 
     def print_connections(self):
         """Prints the connection overview of the node. How many inbound and outbound connections have been made."""
@@ -113,78 +275,317 @@ class Node(threading.Thread):
         print("- Total nodes connected with us: %d" % len(self.nodes_inbound))
         print("- Total nodes connected to     : %d" % len(self.nodes_outbound))
 
-    def send_to_nodes(self, data, exclude=[], compression='none'):
+    @property
+    def message_count_send(self):
+        """The number of messages that have been sent to the nodes, see get_stats. Assigning a value sets the
+           counter, for example to reset it."""
+        return self.stats.get("messages_sent")
+
+    @message_count_send.setter
+    def message_count_send(self, value):
+        self.stats.set("messages_sent", value)
+
+    @property
+    def message_count_recv(self):
+        """The number of messages that have been received from the nodes, see get_stats. Assigning a value sets the
+           counter, for example to reset it."""
+        return self.stats.get("messages_received")
+
+    @message_count_recv.setter
+    def message_count_recv(self, value):
+        self.stats.set("messages_received", value)
+
+    @property
+    def message_count_rerr(self):
+        """The number of messages that have been received and could not be decoded, see get_stats. Assigning a
+           value sets the counter, for example to reset it."""
+        return self.stats.get("receive_errors")
+
+    @message_count_rerr.setter
+    def message_count_rerr(self, value):
+        self.stats.set("receive_errors", value)
+
+    def get_stats(self):
+        """Returns a snapshot (dict) of the statistics of the node: the counters of the node (see stats.COUNTERS),
+           which are the totals of all the connections including the connections that have been closed, the number
+           of connections, the total queue depth and under "nodes" the statistics of each connection by the tuple
+           (id, 'inbound' or 'outbound'), see NodeConnection.get_stats, so a node that is connected inbound and
+           outbound is reported twice. It is cheap enough to be polled every second."""
+        nodes = {}
+        for n in self.nodes_inbound.snapshot():
+            nodes[(n.id, "inbound")] = n.get_stats()
+
+        for n in self.nodes_outbound.snapshot():
+            nodes[(n.id, "outbound")] = n.get_stats()
+
+        stats = self.stats.snapshot()
+        stats["connections"] = len(nodes)
+        stats["queue_depth"] = sum(n["queue_depth"] for n in nodes.values())
+        stats["nodes"] = nodes
+
+        return stats
+
+    def enable_tracing(self, stages=None):
+        """Enables the tracing of the latency of the stages of sending and receiving messages, like decoding the
+           messages and the node_message handler, see tracing.STAGES. The durations are recorded in histograms, see
+           get_latencies. Returns the Tracer, which is used to add hooks that are invoked with each duration of a
+           stage, for example to log slow handlers. Only the given stages are recorded in histograms when given."""
+        self.tracer = Tracer(stages)
+        return self.tracer
+
+    def disable_tracing(self):
+        """Disables the tracing, so the stages are not measured anymore."""
+        self.tracer = None
+
+    def get_latencies(self):
+        """Returns for each stage a snapshot (dict) of its latency histogram with the count, min, mean, max and the
+           percentiles p50, p90, p99 and p999 in seconds. Empty when tracing is disabled."""
+        if self.tracer is None:
+            return {}
+
+        return self.tracer.snapshot()
+
+    def get_queue_depths(self):
+        """Returns the number of packets that are waiting to be sent for each connected node by id. Nodes with a lot of
+           queued packets are congested."""
+        depths = {}
+        for n in self.all_nodes:
+            depths[n.id] = n.get_queue_depth()
+
+        return depths
+
+    def send_to_nodes(self, data, exclude=[], compression='none', unreliable=False):
         """ Send a message to all the nodes that are connected with this node. data is a python variable which is
             converted to JSON that is send over to the other node. exclude list gives all the nodes to which this
-            data should not be sent.
+            data should not be sent. The compression is none, zlib, bzip2, lzma or auto, where auto lets the
+            compression policy choose the compression for each node. The data is serialized and compressed once
+            for all the nodes that use the same format and the same packet is sent to each of these nodes. When
+            unreliable is True, the data is sent as datagram when possible, see send_to_node. With backpressure
+            'raise', a full send queue of a node does not stop sending to the other nodes: the data is sent to all
+            the other nodes first and then SendQueueFull is raised with the nodes whose queue was full.
             TODO: When sending was not successfull, the user is not notified."""
-        self.message_count_send = self.message_count_send + 1
-        for n in self.nodes_inbound:
+        packets = {} # The packets that are shared by the nodes, see NodeConnection.create_packet
+        congested = []
+        for n in self.all_nodes:
             if n in exclude:
                 self.debug_print("Node send_to_nodes: Excluding node in sending the message")
-            else:
-                self.send_to_node(n, data, compression)
+                continue
 
-        for n in self.nodes_outbound:
-            if n in exclude:
-                self.debug_print("Node send_to_nodes: Excluding node in sending the message")
-            else:
-                self.send_to_node(n, data, compression)
+            try:
+                self.send_to_node(n, data, compression, packets, unreliable)
+
+            except queue.Full:
+                congested.append(n)
+
+        if len(congested) > 0:
+            raise SendQueueFull(congested)
 
-    def send_to_node(self, n, data, compression='none'):
-        """ Send the data to the node n if it exists."""
-        self.message_count_send = self.message_count_send + 1
+    def send_to_node(self, n, data, compression='none', packets=None, unreliable=False):
+        """ Send the data to the node n if it exists. The compression is none, zlib, bzip2, lzma or auto. The
+            packets are used to share the packets with other nodes, see NodeConnection.create_packet. When unreliable
+            is True and the node has a datagram channel with this node, the data is sent as one datagram: it may be
+            lost and a message that arrives after a newer message is dropped, but it never waits for the messages
+            before it. Data that does not fit in a datagram (datagram_size) is sent over the connection."""
         if n in self.nodes_inbound or n in self.nodes_outbound:
-            n.send(data, compression=compression)
+            if unreliable:
+                n.send_datagram(data, compression=compression, packets=packets)
+
+            else:
+                n.send(data, compression=compression, packets=packets)
 
         else:
             self.debug_print("Node send_to_node: Could not send the data, node is not found!")
 
-    def connect_with_node(self, host, port, reconnect=False):
+    def gossip(self, data, compression='none', ttl=None):
+        """ Send a message to all the nodes in the network, not only to the nodes that are connected with this node.
+            Each node that receives the message delivers it once to node_gossip_message and forwards it to its other
+            nodes, until the message has been forwarded ttl times (default gossip_ttl). Gossip is only sent to nodes
+            with length framing. The compression is none, zlib, bzip2, lzma or auto. The message is forwarded as it is,
+            so zlib is used instead of zlib-stream. Returns the unique id of the message. With backpressure 'raise',
+            SendQueueFull is raised when the send queues of some nodes are full, see forward_gossip."""
+        if ttl == None:
+            ttl = self.gossip_ttl
+
+        if compression == 'zlib-stream':
+            compression = 'zlib'
+
+        message_id = uuid.uuid4().bytes
+        self.gossip_cache.add(message_id)
+        self.count_gossip("sent")
+        self.forward_gossip(message_id, ttl, data, compression)
+
+        return message_id
+
+    def forward_gossip(self, message_id, ttl, data, compression='none', payload=None, exclude=[]):
+        """ Sends the gossip message to all the nodes that are not excluded. The payload (flags, type, payload) that has
+            been received is forwarded as it is to the nodes that are able to decode it, see can_forward. Otherwise,
+            the data is serialized for the node and compressed with the codec of the payload when the node supports
+            it, or a codec it falls back to, see NodeConnection.choose_codec. With backpressure 'raise', SendQueueFull
+            is raised after the message has been sent to the nodes whose send queue is not full, see send_to_nodes."""
+        if payload != None and payload[0] & protocol.FLAG_COMPRESSED:
+            compression = protocol.codec_name(payload[2]) or 'none'
+
+        packets = {} # The payloads that are shared by the nodes, see NodeConnection.create_packet
+        congested = []
+        for n in self.all_nodes:
+            if n in exclude:
+                continue
+
+            node_payload = payload
+            if node_payload == None or not self.can_forward(n, node_payload):
+                node_payload = n.create_payload(data, compression=compression, packets=packets)
+
+            if node_payload != None:
+                try:
+                    n.send_gossip(message_id, ttl, node_payload[0], node_payload[1], node_payload[2])
+
+                except queue.Full:
+                    congested.append(n)
+
+        if len(congested) > 0:
+            raise SendQueueFull(congested)
+
+    def can_forward(self, node, payload):
+        """ Returns whether the payload (flags, type, payload) that has been received is forwarded as it is to the
+            node: the node has to support its serializer and, when the payload is compressed, its codec. The
+            payloads of zlib-stream can only be decompressed by the connection they have been sent over."""
+        decoder = serializer.get_type(payload[1])
+        if decoder == None or decoder.name not in node.serializers:
+            return False
+
+        if payload[0] & protocol.FLAG_COMPRESSED:
+            codec = protocol.codec_name(payload[2])
+            return codec != None and codec != 'zlib-stream' and codec in node.codecs
+
+        return True
+
+    def gossip_received(self, node, flags, type, payload):
+        """ This method is invoked by the node connection when a gossip message has been received. A message that has
+            been seen before is dropped. Otherwise, it is forwarded to the other nodes when its TTL allows it and
+            delivered to node_gossip_message. Raises FrameError when the payload is too short to hold the gossip
+            header. A message that cannot be decoded is dropped."""
+        if len(payload) < protocol.GOSSIP_HEADER.size:
+            raise protocol.FrameError("The gossip frame is too short to hold the gossip header")
+
+        (message_id, ttl) = protocol.GOSSIP_HEADER.unpack(payload[0:protocol.GOSSIP_HEADER.size])
+        self.count_gossip("received")
+
+        if not self.gossip_cache.add(message_id):
+            self.count_gossip("redundant")
+            return
+
+        payload = bytes(payload[protocol.GOSSIP_HEADER.size:]) # Forwarded after the receive buffer has been reused
+        try:
+            data = node.parse_frame(flags, type, payload)
+
+        except Exception as e:
+            self.debug_print(node.id + ":gossip_received:Could not decode the message: " + str(e))
+            node.stats.add("receive_errors")
+            return
+
+        if ttl > 1:
+            self.count_gossip("forwarded")
+            try:
+                self.forward_gossip(message_id, ttl - 1, data, payload=(flags, type, payload), exclude=[node])
+
+            except queue.Full:
+                self.debug_print("gossip_received: Could not forward the message, the send queue is full")
+
+        self.count_gossip("delivered")
+        self.node_gossip_message(node, data)
+
+    def count_gossip(self, counter):
+        """Increments the gossip counter, see gossip_counters."""
+        with self.gossip_lock:
+            self.gossip_counters[counter] += 1
+
+    def connect_with_node(self, host, port=None, reconnect=False, timeout=None):
         """ Make a connection with another node that is running on host with port. When the connection is made, 
             an event is triggered outbound_node_connected. When the connection is made with the node, it exchanges
             the id's of the node. First we send our id and then we receive the id of the node we are connected to.
             When the connection is made the method outbound_node_connected is invoked. If reconnect is True, the
-            node will try to reconnect to the code whenever the node connection was closed. The method returns
-            True when the node is connected with the specific host."""
+            node will try to reconnect to the code whenever the node connection was closed. When timeout (seconds)
+            is given, the connection and the exchange of the id's fail when they take longer. When port is None,
+            host is the path of the Unix domain socket of a node on the same host, see connect_socket. The method
+            returns True when the node is connected with the specific host."""
 
-        if host == self.host and port == self.port:
+        if (host == self.host and port == self.port) or (port is None and host == self.unix_path):
             print("connect_with_node: Cannot connect with yourself!!")
             return False
 
         # Check if node is already connected with this node!
-        for node in self.nodes_outbound:
-            if node.host == host and node.port == port:
-                print("connect_with_node: Already connected with this node (" + node.id + ").")
-                return True
+        node = self.nodes_outbound.find(host, port)
+        if node is not None:
+            print("connect_with_node: Already connected with this node (" + node.id + ").")
+            return True
 
+        ring = None
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.debug_print("connecting to %s port %s" % (host, port))
-            sock.connect((host, port))
+            started = time.monotonic()
+            deadline = None
+            if timeout is not None:
+                deadline = started + timeout
+            sock = self.connect_socket(host, port, timeout)
+            probe = protocol.probe_time(time.monotonic() - started)
+            ring = self.create_ring(sock, host)
+            token = self.create_datagram_token(sock)
 
             # Basic information exchange (not secure) of the id's of the nodes!
-            sock.send((self.id + ":" + str(self.port)).encode('utf-8')) # Send my id and port to the connected node!
-            connected_node_id = sock.recv(4096).decode('utf-8') # When a node is connected, it sends its id!
+            if deadline is not None:
+                sock.settimeout(max(0.001, deadline - time.monotonic()))
+                probe = min(probe, max(0.001, deadline - time.monotonic()))
+            address = PeerSet.address(host, port)
+            sock.sendall((self.id + ":" + str(self.port)).encode('utf-8')) # Send my id and port to the connected node!
+            if address in self.legacy_nodes: # Wait for the id of the legacy node without sending the options
+                reply = protocol.probe_handshake(sock, sock.gettimeout())
+                if reply == b'':
+                    raise socket.timeout("The legacy node has not sent its id")
+
+            else:
+                reply = protocol.probe_handshake(sock, probe)
+
+            if reply == b'': # The node waits for our options, see protocol.HANDSHAKE_PROBE
+                sock.sendall(self.handshake_options(ring=ring, token=token).encode('utf-8'))
+                (handshake, received) = protocol.read_handshake(sock, deadline) # When a node is connected, it sends its id!
+                if protocol.OPTIONS_SEPARATOR not in handshake:
+                    # A legacy node that replied late has received our options as part of our id and port or its
+                    # stream, so connect again without sending the options
+                    self.debug_print("connect_with_node: " + host + ":" + str(port) + " is a legacy node, connecting again")
+                    self.legacy_nodes.add(address)
+                    sock.close()
+                    return self.connect_with_node(host, port, reconnect, None if deadline is None else max(0.001, deadline - time.monotonic()))
+
+            else: # A legacy node replies directly with its id
+                (handshake, received) = (reply.decode('utf-8'), b'')
+
+            (connected_node_id, options) = protocol.split_options(handshake)
 
             # Cannot connect with yourself
             if self.id == connected_node_id:
                 print("connect_with_node: You cannot connect with yourself?!")
-                sock.send("CLOSING: Already having a connection together".encode('utf-8'))
+                if self.negotiate_framing(options) == 'eot': # With length framing the text is not a valid frame
+                    sock.send("CLOSING: Already having a connection together".encode('utf-8'))
                 sock.close()
                 return True
 
             # Fix bug: Cannot connect with nodes that are already connected with us!
             #          Send message and close the socket.
-            for node in self.nodes_inbound:
-                if node.host == host and node.id == connected_node_id:
-                    print("connect_with_node: This node (" + node.id + ") is already connected with us.")
+            node = self.nodes_inbound.get(connected_node_id, host)
+            if node is not None:
+                print("connect_with_node: This node (" + node.id + ") is already connected with us.")
+                if self.negotiate_framing(options) == 'eot': # With length framing the text is not a valid frame
                     sock.send("CLOSING: Already having a connection together".encode('utf-8'))
-                    sock.close()
-                    return True
+                sock.close()
+                return True
 
             thread_client = self.create_new_connection(sock, connected_node_id, host, port)
-            thread_client.start()
+            self.negotiate(thread_client, options)
+            self.negotiate_shared_memory(thread_client, ring, options)
+            ring = None
+            self.negotiate_datagrams(thread_client, token, options)
+            thread_client.receive_buffer.write(received) # Data that has been sent directly after the handshake
+            self.start_connection(thread_client)
 
             self.nodes_outbound.add(thread_client)
             self.outbound_node_connected(thread_client)
@@ -192,9 +593,7 @@ class Node(threading.Thread):
             # If reconnection to this host is required, it will be added to the list!
             if reconnect:
                 self.debug_print("connect_with_node: Reconnection check is enabled on node " + host + ":" + str(port))
-                self.reconnect_to_nodes.append({
-                    "host": host, "port": port, "tries": 0
-                })
+                self.reconnect_scheduler.add(host, port)
 
             return True
 
@@ -202,6 +601,52 @@ class Node(threading.Thread):
             self.debug_print("TcpServer.connect_with_node: Could not connect with node. (" + str(e) + ")")
             return False
 
+        finally:
+            if ring is not None: # Not used by a connection
+                ring.close()
+
+    def connect_socket(self, host, port, timeout=None):
+        """ Returns the connection with the node at host and port, which is made by the transport of the node. When
+            port is None, the host is the path of a Unix domain socket. When prefer_unix is True and the path of the
+            Unix domain socket of the node is known, the node connects with the Unix domain socket and falls back to
+            the transport when that fails."""
+        if port is None:
+            return self.unix_transport.connect(self, host, None, timeout)
+
+        path = None
+        if self.prefer_unix:
+            path = self.unix_paths.get(PeerSet.address(host, port))
+
+        if path is not None:
+            try:
+                return self.unix_transport.connect(self, path, None, timeout)
+
+            except OSError as e:
+                self.debug_print("connect_socket: Could not connect with " + path + ", using " + host + ":" + str(port) + " (" + str(e) + ")")
+
+        return self.transport.connect(self, host, port, timeout)
+
+    def connect_many(self, peers, timeout=10.0, concurrency=16, reconnect=False):
+        """ Make a connection with each of the peers, a list of (host, port), at the same time. At most concurrency
+            connections are made at the same moment and each connection fails when it takes longer than timeout
+            seconds. The method outbound_node_connected is invoked as soon as a node is connected. The method returns
+            a dict with for each (host, port) True when the node is connected and False otherwise, see
+            connect_with_node."""
+        addresses = {} # Connect only once with the same host and port
+        for (host, port) in peers:
+            addresses.setdefault(PeerSet.address(host, port), (host, port))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(addresses)))) as executor:
+            futures = {}
+            for (host, port) in addresses.values():
+                futures[(host, port)] = executor.submit(self.connect_with_node, host, port, reconnect, timeout)
+
+            results = {}
+            for (peer, future) in futures.items():
+                results[peer] = future.result()
+
+        return results
+
     def disconnect_with_node(self, node):
         """Disconnect the TCP/IP connection with the specified node. It stops the node and joins the thread.
            The node will be deleted from the nodes_outbound list. Before closing, the method 
@@ -217,68 +662,372 @@ class Node(threading.Thread):
         """Stop this node and terminate all the connected nodes."""
         self.node_request_to_stop()
         self.terminate_flag.set()
+        self.handshake_receiver.wakeup()
+
+        if self.reactor is not None:
+            self.reactor.wakeup()
 
     # This method can be overrided when a different nodeconnection is required!
     def create_new_connection(self, connection, id, host, port):
         """When a new connection is made, with a node or a node is connecting with us, this method is used
            to create the actual new connection. The reason for this method is to be able to override the
-           connection class if required. In this case a NodeConnection will be instantiated to represent
-           the node connection."""
-        return NodeConnection(self, connection, id, host, port)
+           connection class if required. By default the transport creates the node connection, which is a
+           NodeConnection with the TCP/IP transport."""
+        return self.transport.create_connection(self, connection, id, host, port)
+
+    def negotiate(self, node, options):
+        """Applies the result of the negotiation with the node that has send the given options when connecting to
+           the node connection: the framing, serializers and codecs that both nodes support, the largest frame that
+           the node accepts and whether the messages to the node may be delayed to batch them."""
+        node.version = int(options.get("version", 1)) if options.get("version", "").isdigit() else 1
+        node.framing = self.negotiate_framing(options)
+        node.serializers = self.negotiate_serializers(options)
+        node.codecs = self.negotiate_codecs(options)
+        node.max_frame_size = self.negotiate_max_frame_size(options)
+        node.batching = options.get("batching", "1") != "0"
+        node.frame_decoder.max_frame_size = self.max_frame_size
+        self.add_unix_path(node, options)
+
+    def add_unix_path(self, node, options):
+        """Remembers the path of the Unix domain socket that the node has sent when connecting, when the node runs
+           on the same host, so the next connection with the node uses the Unix domain socket, see prefer_unix."""
+        path = options.get("unix")
+        if not path or node.port is None or not os.path.exists(path):
+            return
+
+        if self.is_local_host(node.host):
+            self.unix_paths[PeerSet.address(node.host, node.port)] = path
+
+    def is_local_host(self, host):
+        """Returns whether the host is the host of this node or a loopback address."""
+        return host == self.host or host == "localhost" or host == "::1" or str(host).startswith("127.")
+
+    def create_ring(self, sock, host):
+        """Returns a new ring buffer in shared memory that the node at host is able to write its frames into, see
+           shm_size. None is returned when shm_size is 0, the node is not connected with a socket on the same host or
+           shared memory is not supported."""
+        if self.shm_size <= 0 or not ringbuffer.available() or not isinstance(sock, socket.socket):
+            return None
+
+        if sock.family != getattr(socket, "AF_UNIX", None) and not self.is_local_host(host):
+            return None
+
+        try:
+            return ringbuffer.RingBuffer(self.shm_size)
+
+        except (OSError, ValueError) as e:
+            self.debug_print("create_ring: Could not create the ring buffer (" + str(e) + ")")
+            return None
+
+    def negotiate_shared_memory(self, node, ring, options):
+        """Uses the ring buffers in shared memory with the node when both nodes have offered one: the node writes its
+           frames into the ring buffer of this node and this node writes its frames into the ring buffer of the node.
+           The node offers the nonce and the capacity of its ring buffer, so only the shared memory of a ring buffer
+           with that capacity is attached, see ringbuffer.valid_name. The ring buffer of this node is closed when the
+           node has not offered one."""
+        value = options.get("shm")
+        if ring is None or not value or node.framing != 'length':
+            if ring is not None:
+                ring.close()
+            return
+
+        node.ring_in = ring
+        try:
+            (nonce, capacity) = value.split("+")
+            node.ring_out = ringbuffer.RingBuffer(name=ringbuffer.PREFIX + nonce, capacity=int(capacity))
+
+        except (OSError, ValueError) as e: # The frames to the node are sent over the socket
+            self.debug_print("negotiate_shared_memory: Could not attach the ring buffer " + value + " (" + str(e) + ")")
+
+    def create_datagram_token(self, sock):
+        """Returns a new token for the datagram channel with the node that is connected with the socket, see
+           udp_nodes. None is returned when this node has no UDP socket or the node is not connected over TCP/IP."""
+        if self.udp_sock is None or not isinstance(sock, socket.socket) or sock.family != socket.AF_INET:
+            return None
+
+        # A random token, so other hosts are not able to guess the tokens of the connections
+        token = 0
+        while token == 0 or token in self.udp_nodes:
+            token = secrets.randbits(32)
+
+        return token
+
+    def negotiate_datagrams(self, node, token, options):
+        """Uses the datagram channel with the node when both nodes have offered one: the node sends its datagrams
+           with the token of this node to the UDP port of this node and this node sends its datagrams with the token
+           of the node to the UDP port of the node, at the address of the connection."""
+        value = options.get("udp")
+        if token is None or not value or node.framing != 'length':
+            return
+
+        try:
+            (port, udp_token) = value.split("+")
+            node.udp_address = (node.sock.getpeername()[0], int(port))
+            node.udp_token = int(udp_token)
+
+        except (ValueError, OSError) as e: # The messages to the node are sent over the connection
+            self.debug_print("negotiate_datagrams: Invalid datagram channel " + value + " (" + str(e) + ")")
+            node.udp_address = None
+            return
+
+        node.udp_receive_token = token
+        self.udp_nodes[token] = node
+
+    def receive_datagram(self):
+        """Receives one datagram from the UDP socket and hands it over to the connection with the node that has sent
+           it, found by its token. Datagrams of unknown connections, datagrams from another host than the host of the
+           connection and invalid datagrams are dropped."""
+        (datagram, address) = self.udp_sock.recvfrom(65536)
+        if len(datagram) < protocol.DATAGRAM_HEADER.size:
+            self.stats.add("datagrams_dropped")
+            return
+
+        (token, sequence, flags, type) = protocol.DATAGRAM_HEADER.unpack_from(datagram)
+        node = self.udp_nodes.get(token)
+        if node is None or node.udp_address is None or address[0] != node.udp_address[0]:
+            self.debug_print("receive_datagram: Datagram of an unknown connection from " + str(address))
+            self.stats.add("datagrams_dropped")
+            return
+
+        node.process_datagram(sequence, flags, type, memoryview(datagram)[protocol.DATAGRAM_HEADER.size:])
+
+    def negotiate_framing(self, options):
+        """Returns the framing that is used with the node that has send the given options when connecting."""
+        if self.framing == 'length' and options.get("framing") == 'length':
+            return 'length'
+
+        return 'eot'
+
+    def negotiate_serializers(self, options):
+        """Returns the serializers that are used with the node that has send the given options when connecting. These
+           are the serializers of this node that the other node supports as well, in the order of this node. Nodes
+           that do not send their serializers only support the legacy serializers."""
+        supported = serializer.LEGACY
+        if self.negotiate_framing(options) == 'length' and "serializers" in options:
+            supported = options["serializers"].split("+")
+
+        return [name for name in self.serializers if name in supported]
+
+    def negotiate_codecs(self, options):
+        """Returns the codecs that are used with the node that has send the given options when connecting. These are
+           the codecs of this node that the other node supports as well. With EOT framing and with nodes that do not
+           send their codecs only the legacy codecs are used."""
+        supported = protocol.LEGACY_CODECS
+        if self.negotiate_framing(options) == 'length' and "codecs" in options:
+            supported = options["codecs"].split("+")
+
+        return [name for name in self.codecs if name in supported]
+
+    def negotiate_max_frame_size(self, options):
+        """Returns the largest frame that is sent to the node that has send the given options when connecting."""
+        try:
+            return min(protocol.MAX_FRAME_SIZE, int(options.get("max_frame", protocol.MAX_FRAME_SIZE)))
+
+        except ValueError:
+            return protocol.MAX_FRAME_SIZE
+
+    def handshake_options(self, options=None, ring=None, token=None):
+        """Returns the options that are sent after our id when the nodes connect: the version of the handshake and the
+           capabilities of this node. When the options of the other node are given, the options contain the result
+           of the negotiation of the framing. Otherwise, they contain the offer of this node. The other capabilities
+           are the same in both cases, each node uses the capabilities that both nodes support. When the ring buffer
+           is given, its nonce and capacity are offered to the other node, see negotiate_shared_memory. When the token
+           is given, the UDP port of this node and the token are offered to the other node, see negotiate_datagrams."""
+        framing = self.framing
+        if options != None:
+            framing = self.negotiate_framing(options)
+
+        options = {
+            "version": protocol.HANDSHAKE_VERSION,
+            "framing": framing,
+            "codecs": "+".join(self.codecs),
+            "serializers": "+".join(self.serializers),
+            "max_frame": self.max_frame_size,
+            "batching": 1 if self.batching else 0
+        }
+
+        # The options are separated by ',' and the handshake is split at ':' into the id and the port, so the path
+        # is only sent when it contains neither
+        if self.unix_path is not None and not any(c in self.unix_path for c in [",", ":", protocol.HANDSHAKE_END]):
+            options["unix"] = os.path.abspath(self.unix_path)
+
+        if ring is not None:
+            options["shm"] = ring.nonce + "+" + str(ring.capacity)
+
+        if token is not None:
+            options["udp"] = str(self.udp_port) + "+" + str(token)
+
+        return protocol.encode_options(options)
+
+    def start_connection(self, node):
+        """Starts handling the new node connection. When the node uses a reactor, the connection is handed over
+           to the reactor. Otherwise the thread of the connection is started."""
+        self.stats.add("connects")
+        if self.reactor is not None:
+            self.reactor.add_connection(node)
+
+        else:
+            node.start()
 
     def reconnect_nodes(self):
         """This method checks whether nodes that have the reconnection status are still connected. If not
-           connected these nodes are started again."""
-        for node_to_check in self.reconnect_to_nodes:
-            found_node = False
-            self.debug_print("reconnect_nodes: Checking node " + node_to_check["host"] + ":" + str(node_to_check["port"]))
-
-            for node in self.nodes_outbound:
-                if node.host == node_to_check["host"] and node.port == node_to_check["port"]:
-                    found_node = True
-                    node_to_check["trials"] = 0 # Reset the trials
-                    self.debug_print("reconnect_nodes: Node " + node_to_check["host"] + ":" + str(node_to_check["port"]) + " still running!")
-
-            if not found_node: # Reconnect with node
-                node_to_check["trials"] += 1
-                if self.node_reconnection_error(node_to_check["host"], node_to_check["port"], node_to_check["trials"]):
-                    self.connect_with_node(node_to_check["host"], node_to_check["port"]) # Perform the actual connection
-
-                else:
-                    self.debug_print("reconnect_nodes: Removing node (" + node_to_check["host"] + ":" + str(node_to_check["port"]) + ") from the reconnection list!")
-                    self.reconnect_to_nodes.remove(node_to_check)
+           connected these nodes are connected again. The check and the reconnection are done in the background
+           by the reconnect scheduler, which also checks the nodes periodically, see ReconnectScheduler."""
+        self.reconnect_scheduler.check_now()
+
+    def accept_connection(self, sock=None):
+        """Accepts the connection of a node that connects with us on the server sock, the server of the transport
+           when not given. When the maximum number of connections has not been reached, the handshake of the node is
+           received by the handshake receiver, see handshake_received."""
+        if sock is None:
+            sock = self.sock
+
+        connection, client_address = sock.accept()
+        deadline = time.monotonic() + self.handshake_timeout
+        if not isinstance(client_address, tuple): # Unix domain socket, the node runs on the same host
+            client_address = (self.host, 0)
+
+        self.debug_print("Total inbound connections:" + str(len(self.nodes_inbound)))
+        # When the maximum connections is reached, it disconnects the connection 
+        with self.inbound_lock:
+            accepted = len(self.nodes_inbound) + self.inbound_pending < self.max_connections
+            if accepted:
+                self.inbound_pending += 1
+
+        if not accepted:
+            self.debug_print("New connection is closed. You have reached the maximum connection limit!")
+            connection.close()
+            return
+
+        if isinstance(connection, socket.socket):
+            self.handshake_receiver.add(connection, client_address, deadline)
+
+        else: # Not selectable, a handshake thread receives the handshake
+            self.submit_handshake(connection, self.handshake_connection, connection, client_address, deadline)
+
+    def submit_handshake(self, connection, function, *args):
+        """Executes the function with the arguments by a handshake thread for the connection that is exchanging the
+           id's. The connection is closed when the node is stopping."""
+        with self.inbound_lock:
+            if self.handshake_executor is None:
+                self.handshake_executor = ThreadPoolExecutor(max_workers=self.handshake_workers, thread_name_prefix="handshake")
+
+        try:
+            self.handshake_executor.submit(function, *args)
+
+        except RuntimeError: # The node is stopping
+            self.handshake_failed(connection, "The node is stopping")
+
+    def handshake_received(self, connection, client_address, handshake, received):
+        """This method is invoked by the handshake receiver when the handshake of the node that connected with us
+           has been received. A handshake thread replies and creates the node connection, see complete_handshake."""
+        self.submit_handshake(connection, self.complete_handshake, connection, client_address, handshake, received)
+
+    def handshake_failed(self, connection, reason):
+        """Closes the connection of a node that connected with us, when its handshake failed."""
+        self.debug_print("handshake_failed: Could not exchange the id with the connected node (" + str(reason) + ")")
+        connection.close()
+        with self.inbound_lock:
+            self.inbound_pending -= 1
+
+    def handshake_connection(self, connection, client_address, deadline=None):
+        """Exchanges the node id's with the node that connected with us. First we receive the id of the connected
+           node and secondly we will send our node id to the connected node, see complete_handshake. The connection
+           is closed when the id has not been received at the deadline (time.monotonic()), by default
+           handshake_timeout seconds from now. This method waits for the handshake, the handshakes of the sockets
+           are received by the handshake receiver instead."""
+        if deadline is None:
+            deadline = time.monotonic() + self.handshake_timeout
+
+        try:
+            (handshake, received) = protocol.read_handshake(connection, deadline)
+
+        except Exception as e:
+            self.handshake_failed(connection, e)
+            return
+
+        self.complete_handshake(connection, client_address, handshake, received)
+
+    def complete_handshake(self, connection, client_address, handshake, received):
+        """Replies to the handshake that has been received from the node that connected with us with our node id and
+           creates the node connection. When connected the method inbound_node_connected is invoked. The connection
+           is closed when the exchange fails or the reply cannot be sent within handshake_timeout seconds."""
+        thread_client = None
+        ring = None
+        token = None
+
+        try:
+            # Basic information exchange (not secure) of the id's of the nodes!
+            connection.settimeout(self.handshake_timeout)
+            connected_node_port = client_address[1] # backward compatibilty
+            (connected_node_id, options) = protocol.split_options(handshake)
+            if ":" in connected_node_id:
+                # When a node is connected, it sends its id!
+                (connected_node_id, connected_node_port) = connected_node_id.split(':')
+
+            # Options are only send back to nodes that send options, legacy nodes only expect our id
+            reply_options = ""
+            if options:
+                if "shm" in options and self.negotiate_framing(options) == 'length':
+                    ring = self.create_ring(connection, client_address[0])
+                if "udp" in options and self.negotiate_framing(options) == 'length':
+                    token = self.create_datagram_token(connection)
+                reply_options = self.handshake_options(options, ring, token)
+            connection.sendall((self.id + reply_options).encode('utf-8')) # Send my id to the connected node!
+
+            thread_client = self.create_new_connection(connection, connected_node_id, client_address[0], connected_node_port)
+            self.negotiate(thread_client, options)
+            self.negotiate_shared_memory(thread_client, ring, options)
+            ring = None
+            self.negotiate_datagrams(thread_client, token, options)
+            thread_client.receive_buffer.write(received) # Data that has been sent directly after the handshake
+
+        except Exception as e:
+            self.debug_print("complete_handshake: Could not exchange the id with the connected node (" + str(e) + ")")
+            connection.close()
+            if ring is not None:
+                ring.close()
+            if thread_client is not None: # Created, but never started
+                for ring in (thread_client.ring_in, thread_client.ring_out):
+                    if ring is not None:
+                        ring.close()
+                if thread_client.udp_receive_token is not None:
+                    self.udp_nodes.pop(thread_client.udp_receive_token, None)
+                thread_client = None
+
+        with self.inbound_lock:
+            self.inbound_pending -= 1
+            if thread_client is not None:
+                self.nodes_inbound.add(thread_client)
+
+        if thread_client is not None:
+            self.start_connection(thread_client)
+            self.inbound_node_connected(thread_client)
 
     def run(self):
         """The main loop of the thread that deals with connections from other nodes on the network. When a
            node is connected it will exchange the node id's. First we receive the id of the connected node
            and secondly we will send our node id to the connected node. When connected the method
-           inbound_node_connected is invoked."""
+           inbound_node_connected is invoked. When the node uses a reactor, the reactor runs the main loop."""
+        self.reconnect_scheduler.start()
+        self.handshake_receiver.start()
+
+        if self.reactor is not None:
+            self.reactor.run()
+
+        else:
+            if self.unix_sock is not None:
+                self.unix_accept_thread = threading.Thread(target=self.accept_unix_connections, daemon=True)
+                self.unix_accept_thread.start()
+
+            if self.udp_sock is not None:
+                self.udp_thread = threading.Thread(target=self.receive_datagrams, daemon=True)
+                self.udp_thread.start()
+
         while not self.terminate_flag.is_set():  # Check whether the thread needs to be closed
             try:
                 self.debug_print("Node: Wait for incoming connection")
-                connection, client_address = self.sock.accept()
-
-                self.debug_print("Total inbound connections:" + str(len(self.nodes_inbound)))
-                # When the maximum connections is reached, it disconnects the connection 
-                if len(self.nodes_inbound) < self.max_connections:
-                    
-                    # Basic information exchange (not secure) of the id's of the nodes!
-                    connected_node_port = client_address[1] # backward compatibilty
-                    connected_node_id   = connection.recv(4096).decode('utf-8')
-                    if ":" in connected_node_id:
-                        # When a node is connected, it sends its id!
-                        (connected_node_id, connected_node_port) = connected_node_id.split(':')
-                    connection.send(self.id.encode('utf-8')) # Send my id to the connected node!
-
-                    thread_client = self.create_new_connection(connection, connected_node_id, client_address[0], connected_node_port)
-                    thread_client.start()
-
-                    self.nodes_inbound.add(thread_client)
-                    self.inbound_node_connected(thread_client)
-
-                else:
-                    self.debug_print("New connection is closed. You have reached the maximum connection limit!")
-                    connection.close()
+                self.accept_connection()
             
             except socket.timeout:
                 self.debug_print('Node: Connection timeout!')
@@ -286,29 +1035,87 @@ class Node(threading.Thread):
             except Exception as e:
                 raise e
 
-            self.reconnect_nodes()
+        print("Node stopping...")
+        self.reconnect_scheduler.stop()
+        if self.unix_sock is not None:
+            self.close_unix_server()
 
-            time.sleep(0.01)
+        self.handshake_receiver.stop() # Closes the connections whose handshake has not been received
+        if self.handshake_executor is not None:
+            self.handshake_executor.shutdown(wait=True) # The connections that are exchanging id's are stopped below
 
-        print("Node stopping...")
-        for t in self.nodes_inbound:
+        if self.reactor is not None:
+            self.reactor.close()
+
+        for t in list(self.nodes_inbound):
             t.stop()
 
-        for t in self.nodes_outbound:
+        for t in list(self.nodes_outbound):
             t.stop()
 
-        time.sleep(1)
+        if self.reactor is None:
+            time.sleep(1)
+
+            for t in list(self.nodes_inbound):
+                t.join()
 
-        for t in self.nodes_inbound:
-            t.join()
+            for t in list(self.nodes_outbound):
+                t.join()
 
-        for t in self.nodes_outbound:
-            t.join()
+        if self.udp_sock is not None:
+            if self.udp_thread is not None:
+                self.udp_thread.join()
+            self.udp_sock.close()
 
         self.sock.settimeout(None)   
         self.sock.close()
         print("Node stopped")
 
+    def accept_unix_connections(self):
+        """The main loop of the thread that accepts the nodes that connect with the Unix domain socket, when the
+           node does not use a reactor."""
+        while not self.terminate_flag.is_set():
+            try:
+                self.accept_connection(self.unix_sock)
+
+            except socket.timeout:
+                self.debug_print('Node: Unix domain socket connection timeout!')
+
+            except OSError as e: # The server has been closed
+                self.debug_print("accept_unix_connections: " + str(e))
+                break
+
+    def receive_datagrams(self):
+        """The main loop of the thread that receives the datagrams of the datagram channel, when the node does not
+           use a reactor."""
+        while not self.terminate_flag.is_set():
+            try:
+                self.receive_datagram()
+
+            except socket.timeout:
+                pass
+
+            except Exception as e: # Do not let one datagram stop the datagram channel
+                self.debug_print("receive_datagrams: " + str(e))
+
+    def close_unix_server(self):
+        """Closes the Unix domain socket of the node and removes its path."""
+        try:
+            self.unix_sock.shutdown(socket.SHUT_RDWR) # Wakes up the thread that accepts the connections
+
+        except OSError:
+            pass
+
+        if self.unix_accept_thread is not None:
+            self.unix_accept_thread.join()
+
+        self.unix_sock.close()
+        try:
+            os.unlink(self.unix_path)
+
+        except OSError:
+            pass
+
     def outbound_node_connected(self, node):
         """This method is invoked when a connection with a outbound node was 
            successfull.  The node `self` made the connection."""
@@ -330,12 +1137,17 @@ class Node(threading.Thread):
 
         if node in self.nodes_inbound:
             self.nodes_inbound.remove(node)
+            self.stats.add("disconnects")
             self.inbound_node_disconnected(node)
 
         if node in self.nodes_outbound:
             self.nodes_outbound.remove(node)
+            self.stats.add("disconnects")
             self.outbound_node_disconnected(node)
 
+        if self.get_node(node.id) is None: # Not connected anymore, also not the other way around
+            self.compression_policy.remove(node.id)
+
     def inbound_node_disconnected(self, node):
         """This method is invoked when a node, that was previously connected with us, is in a disconnected
            state."""
@@ -355,6 +1167,13 @@ class Node(threading.Thread):
         if self.callback is not None:
             self.callback("node_message", self, node, data)
 
+    def node_gossip_message(self, node, data):
+        """This method is invoked once for each gossip message that has been received. The node is the node that
+           has forwarded the message to us."""
+        self.debug_print("node_gossip_message: " + node.id + ": " + str(data))
+        if self.callback is not None:
+            self.callback("node_gossip_message", self, node, data)
+
     def node_disconnect_with_outbound_node(self, node):
         """This method is invoked just before the connection is closed with the outbound node. From the node
            this request is created."""
@@ -1,9 +1,17 @@
 import socket
 import time
 import threading
+import itertools
+import queue
+import struct
 import json
 import zlib, bz2, lzma, base64
 
+from p2pnetwork import protocol
+from p2pnetwork import serializer
+from p2pnetwork.receivebuffer import ReceiveBuffer
+from p2pnetwork.stats import Stats
+
 """
 Author : Maurice Snoeren <macsnoeren(at)gmail.com>
 Version: 0.3 beta (use at your own risk)
@@ -13,6 +21,17 @@ Python package p2pnet for implementing decentralized peer-to-peer network applic
 """
 
 
+class SendQueueFull(queue.Full):
+    """Raised by the methods of the node that send a message to many nodes, like send_to_nodes and gossip, when the
+       backpressure of the node is 'raise' and the send queues of one or more nodes are full. The message has been
+       sent to all the other nodes.
+        nodes: The nodes whose send queue was full, the message has not been sent to them."""
+
+    def __init__(self, nodes):
+        super(SendQueueFull, self).__init__("The send queue of " + str(len(nodes)) + " node(s) is full")
+        self.nodes = nodes
+
+
 class NodeConnection(threading.Thread):
     """The class NodeConnection is used by the class Node and represent the TCP/IP socket connection with another node. 
        Both inbound (nodes that connect with the server) and outbound (nodes that are connected to) are represented by
@@ -54,6 +73,69 @@ class NodeConnection(threading.Thread):
         # Datastore to store additional information concerning the node.
         self.info = {}
 
+        # Hold the stream that comes in!
+        self.receive_buffer = ReceiveBuffer()
+
+        # The framing that is used on this connection: 'eot' or 'length'. It is negotiated by the main node when
+        # the connection is made. Length framing is only used when both nodes support it.
+        self.framing = 'eot'
+        self.frame_decoder = protocol.FrameDecoder(self.receive_buffer, main_node.max_frame_size)
+
+        # The serializers that are supported by both nodes, the preferred first. It is negotiated by the main node
+        # when the connection is made, legacy nodes only support the legacy serializers.
+        self.serializers = list(serializer.LEGACY)
+
+        # The other capabilities that are negotiated by the main node when the connection is made: the version of
+        # the handshake of the connected node, the codecs that both nodes support, the largest frame that the
+        # connected node accepts and whether the messages to the connected node may be delayed to batch them.
+        self.version = 1
+        self.codecs = list(main_node.codecs)
+        self.max_frame_size = protocol.MAX_FRAME_SIZE
+        self.batching = True
+
+        # The zlib streams of zlib-stream compression, which live as long as the connection, so later messages are
+        # compressed with the history of the earlier messages. They are created when they are used the first time.
+        self.compressor = None
+        self.decompressor = None
+
+        # The ring buffers in shared memory with a node on the same host, negotiated by the main node when the
+        # connection is made: the ring buffer of this node that the connected node writes into and the ring buffer
+        # of the connected node that this node writes into. None when the frames are only sent over the socket.
+        self.ring_in = None
+        self.ring_out = None
+
+        # The datagram channel (UDP) with the connected node, negotiated by the main node when the connection is made:
+        # the address of the UDP socket of the connected node and the token that the connected node has given to this
+        # connection, the token that the main node has given to this connection and the sequence numbers of the
+        # datagrams that are sent and the last one that has been received. The address is None without the channel.
+        self.udp_address = None
+        self.udp_token = None
+        self.udp_receive_token = None
+        self.udp_sequence = itertools.count(1)
+        self.udp_received = 0
+
+        # Packets of different threads are queued one after the other, in the order in which they are created
+        self.send_lock = threading.Lock()
+
+        # The packets that are waiting to be sent by the writer thread of the connection. The writer is started when
+        # the first packet is queued, so a stalled node does not block the threads that send data. When the main node
+        # uses a reactor, there is no writer thread: the reactor sends the packets when the socket is writable, see
+        # flush. The buffers that have been taken from the queue by the reactor and have not been sent completely are
+        # kept in out_buffers and flush_scheduled tells whether the reactor has been asked to flush the connection.
+        self.send_queue = queue.Queue(main_node.send_queue_size)
+        self.writer = None
+        self.dropped_packets = 0
+        self.out_buffers = []
+        self.flush_scheduled = False
+
+        # The time (time.perf_counter) at which sending started after the send queue has been empty and the bytes
+        # that have been sent since, to measure the throughput of the connection, see count_sent
+        self.drain_start = None
+        self.drain_bytes = 0
+
+        # The statistics of this connection, which are added to the statistics of the main node, see get_stats
+        self.stats = Stats(main_node.stats)
+
         # Use socket timeout to determine problems with the connection
         self.sock.settimeout(10.0)
 
@@ -63,15 +145,30 @@ class NodeConnection(threading.Thread):
 
     def compress(self, data, compression):
         """Compresses the data given the type. It is used to provide compression to lower the network traffic in case of
-           large data chunks. It stores the compression type inside the data, so it can be easily retrieved."""
+           large data chunks. It stores the compression type inside the data, so it can be easily retrieved. With length
+           framing the compressed data is binary and starts with the codec byte. With EOT framing the compressed data is
+           base64 encoded with the type at the end, because the binary data could contain the EOT character. The
+           compression zlib-stream compresses the data with the zlib stream of the connection, which is only possible
+           with length framing. With EOT framing zlib is used instead."""
 
         self.main_node.debug_print(self.id + ":compress:" + compression)
-        self.main_node.debug_print(self.id + ":compress:input: " + str(data))
+        if self.main_node.debug:
+            self.main_node.debug_print(self.id + ":compress:input: " + str(data))
+
+        if compression not in protocol.CODECS:
+            self.main_node.debug_print(self.id + ":compress:Unknown compression")
+            return None
 
         compressed = data
 
         try:
-            if compression == 'zlib':
+            if self.framing == 'length' and compression == 'zlib-stream':
+                compressed = self.compress_stream(data)
+
+            elif self.framing == 'length':
+                compressed = protocol.compress(data, compression)
+
+            elif compression == 'zlib' or compression == 'zlib-stream':
                 compressed = base64.b64encode(zlib.compress(data, 6) + b'zlib')
 
             elif compression == 'bzip2':
@@ -80,23 +177,34 @@ class NodeConnection(threading.Thread):
             elif compression == 'lzma':
                 compressed = base64.b64encode(lzma.compress(data) + b'lzma')
 
-            else:
-                self.main_node.debug_print(self.id + ":compress:Unknown compression")
-                return None
-
         except Exception as e:
             self.main_node.debug_print("compress: exception: " + str(e))
 
-        self.main_node.debug_print(self.id + ":compress:b64encode:" + str(compressed))
-        self.main_node.debug_print(
-            self.id + ":compress:compression:" + str(int(10000 * len(compressed) / len(data)) / 100) + "%")
+        if self.main_node.debug:
+            self.main_node.debug_print(self.id + ":compress:result:" + str(compressed))
+            self.main_node.debug_print(
+                self.id + ":compress:compression:" + str(int(10000 * len(compressed) / max(len(data), 1)) / 100) + "%")
 
         return compressed
 
     def decompress(self, compressed):
         """Decompresses the data given the type. It is used to provide compression to lower the network traffic in case of
-           large data chunks."""
-        self.main_node.debug_print(self.id + ":decompress:input: " + str(compressed))
+           large data chunks. Both the binary format and the legacy base64 format are decompressed. The exception is
+           raised when the data cannot be decompressed, so the message is dropped and counted once by the caller."""
+        if self.main_node.debug:
+            self.main_node.debug_print(self.id + ":decompress:input: " + str(bytes(compressed)))
+
+        if protocol.is_binary_compressed(compressed):
+            try:
+                if compressed[0] == protocol.CODEC_ZLIB_STREAM:
+                    return self.decompress_stream(compressed)
+
+                return protocol.decompress(compressed)
+
+            except Exception as e:
+                self.main_node.debug_print(self.id + ":decompress:Could not decompress: " + str(e))
+                raise
+
         compressed = base64.b64decode(compressed)
         self.main_node.debug_print(self.id + ":decompress:b64decode: " + str(compressed))
 
@@ -110,74 +218,527 @@ class NodeConnection(threading.Thread):
             elif compressed[-4:] == b'lzma':
                 compressed = lzma.decompress(compressed[0:len(compressed) - 4])
         except Exception as e:
-            print("Exception: " + str(e))
+            self.main_node.debug_print(self.id + ":decompress:Could not decompress: " + str(e))
+            raise
 
         self.main_node.debug_print(self.id + ":decompress:result: " + str(compressed))
 
         return compressed
 
-    def send(self, data, encoding_type='utf-8', compression='none'):
+    def compress_stream(self, data):
+        """Compresses the data with the zlib stream of the connection and flushes the stream with Z_SYNC_FLUSH, so the
+           other node is able to decompress the message directly. The packets that are compressed with the stream must
+           be sent in the same order."""
+        if self.compressor == None:
+            self.compressor = zlib.compressobj(6)
+
+        compressed = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return bytes([protocol.CODEC_ZLIB_STREAM]) + compressed[0:len(compressed) - len(protocol.SYNC_FLUSH_TAIL)]
+
+    def decompress_stream(self, compressed):
+        """Decompresses the payload that has been compressed with the zlib stream of the other node. The payloads
+           must be decompressed in the order in which they have been received."""
+        if self.decompressor == None:
+            self.decompressor = zlib.decompressobj()
+
+        compressed = memoryview(compressed)[1:]
+        return self.decompressor.decompress(compressed) + self.decompressor.decompress(protocol.SYNC_FLUSH_TAIL)
+
+    def choose_codec(self, compression):
+        """Returns the compression that is used for the given compression on this connection. When the connected node
+           does not support the codec, zlib-stream falls back to zlib and the other codecs to no compression."""
+        if compression == 'none' or compression not in protocol.CODECS or compression in self.codecs:
+            return compression
+
+        if compression == 'zlib-stream' and 'zlib' in self.codecs:
+            return 'zlib'
+
+        return 'none'
+
+    def choose_serializer(self, data):
+        """Returns the first serializer of this connection that accepts the data or None when there is none."""
+        for name in self.serializers:
+            encoder = serializer.get(name)
+            if encoder != None and encoder.accepts(data):
+                return encoder
+
+        return None
+
+    def create_packet(self, data, encoding_type='utf-8', compression='none', packets=None):
+        """Creates the packet that is send over the network from the data. The data can be pure text (str), dict object
+           (converted to json or msgpack) and bytes object, or any data of your own serializers. The first serializer of
+           the connection that accepts the data is used. With EOT framing the packet is terminated by the end of
+           transmission character 0x04, so the other node is able to find the end of the packet. When compression is
+           used the compression character is placed before the end of transmission character. With length framing the
+           packet is a frame with a header that holds the length, the flags and the type of the data, which is the
+           serializer. None is returned when the data cannot be sent.
+            packets: (optional) Dict that holds the serialized data and the packets that have been created for other
+                     connections. Connections that use the same serializer, framing and compression share the same
+                     packet, so the data is serialized and compressed only once when it is sent to many nodes."""
+        buffers = self.create_buffers(data, encoding_type, compression, packets)
+        if buffers == None:
+            return None
+
+        return b''.join(buffers)
+
+    def create_buffers(self, data, encoding_type='utf-8', compression='none', packets=None):
+        """Creates the packet of the data like create_packet, but returns the packet as a tuple of buffers that are
+           sent after each other, for example the header and the data of a frame. In this way the data is never
+           copied to add a header or the end of transmission character."""
+        payload = self.create_payload(data, encoding_type, compression, packets)
+        if payload == None:
+            return None
+
+        return self.payload_buffers(payload)
+
+    def payload_buffers(self, payload):
+        """Returns the packet of the payload (flags, type, payload), see create_payload, as a tuple of buffers like
+           create_buffers. None is returned when the payload is larger than the maximum frame size of the node."""
+        (flags, type, data) = payload
+        if self.framing == 'length':
+            if len(data) > self.max_frame_size:
+                self.main_node.debug_print("create_buffers: The data is larger than the maximum frame size of the node")
+                return None
+
+            return protocol.create_frame_buffers(data, flags, type)
+
+        if flags & protocol.FLAG_COMPRESSED:
+            return (data, self.COMPR_CHAR + self.EOT_CHAR)
+
+        return (data, self.EOT_CHAR)
+
+    def create_payload(self, data, encoding_type='utf-8', compression='none', packets=None):
+        """Serializes and compresses the data for this connection and returns the tuple (flags, type, payload) that is
+           used to create the packet, or None when the data cannot be sent. See create_packet for the packets."""
+        if packets == None:
+            packets = {}
+
+        encoder = self.choose_serializer(data)
+        if encoder == None:
+            self.main_node.debug_print('datatype used is not valid plese use str, dict (will be send as json) or bytes')
+            return None
+
+        if ("data", encoder.name) not in packets:
+            try:
+                packets[("data", encoder.name)] = encoder.encode(data, encoding_type)
+
+            except (TypeError, ValueError) as error:
+                self.main_node.debug_print('This ' + encoder.name + ' data is invalid')
+                self.main_node.debug_print(error)
+                packets[("data", encoder.name)] = None
+
+        data = packets[("data", encoder.name)]
+        type = encoder.type
+        if data == None:
+            return None
+
+        policy = None
+        if compression == 'auto':
+            policy = self.main_node.compression_policy
+            compression = policy.choose(self, type, data)
+
+        compression = self.choose_codec(compression)
+        if compression == 'zlib-stream' and self.may_drop(len(data)):
+            # A packet of the zlib stream that is dropped would corrupt the packets after it
+            compression = self.choose_codec('zlib')
+
+        # The payloads of zlib-stream depend on the earlier payloads of this connection, so they cannot be shared
+        key = ("payload", self.framing, encoder.name, compression)
+        if key in packets:
+            (flags, type, compressed) = packets[key]
+            if flags & protocol.FLAG_COMPRESSED:
+                self.stats.update({"bytes_raw": len(data), "bytes_compressed": len(compressed)})
+
+            return packets[key]
+
+        flags = 0
+        if compression != 'none':
+            tracer = self.main_node.tracer
+            start = tracer.now() if tracer is not None else 0
+            compressed = self.compress(data, compression)
+            if tracer is not None:
+                tracer.record("compress", self, start)
+
+            if compressed == None:
+                return None
+
+            if policy != None:
+                compressed_size = len(compressed) if self.framing == 'length' else len(compressed) * 3 // 4
+                policy.record(self, type, len(data), compression, compressed_size)
+
+            data = compressed
+            flags = protocol.FLAG_COMPRESSED
+
+        if compression != 'zlib-stream':
+            packets[key] = (flags, type, data)
+
+        if flags & protocol.FLAG_COMPRESSED:
+            self.stats.update({"bytes_raw": len(packets[("data", encoder.name)]), "bytes_compressed": len(data)})
+
+        return (flags, type, data)
+
+    def may_drop(self, size):
+        """Returns whether the packet of a payload of size bytes, before it is compressed, may be dropped instead of
+           queued: when its frame may become larger than the max_frame_size of the connected node or when the send
+           queue is full and the packet is not waited for, see queue_packet. Only reliable while the send_lock is held."""
+        if self.framing == 'length' and size + (size >> 10) + 64 > self.max_frame_size: # Deflate may grow the data
+            return True
+
+        if not self.send_queue.full():
+            return False
+
+        reactor = self.main_node.reactor
+        return self.main_node.backpressure != 'block' or (reactor is not None and reactor.in_reactor_thread())
+
+    def send(self, data, encoding_type='utf-8', compression='none', packets=None):
         """Send the data to the connected node. The data can be pure text (str), dict object (send as json) and bytes object.
            When sending bytes object, it will be using standard socket communication. A end of transmission character 0x04 
            utf-8/ascii will be used to decode the packets ate the other node. When the socket is corrupted the node connection
            is closed. Compression can be enabled by using zlib, bzip2 or lzma. When enabled the data is compressed and send to
-           the client. This could reduce the network bandwith when sending large data chunks.
+           the client. This could reduce the network bandwith when sending large data chunks. With compression 'auto'
+           the compression policy of the main node chooses the compression, based on the measurements of the codecs
+           and the throughput of this connection. The packets are shared with other connections, see create_packet.
+           The packet is queued and sent by the writer of the connection, see queue_packet.
            """
-        if isinstance(data, str):
-            try:
-                if compression == 'none':
-                    self.sock.sendall(data.encode(encoding_type) + self.EOT_CHAR)
-                else:
-                    data = self.compress(data.encode(encoding_type), compression)
-                    if data != None:
-                        self.sock.sendall(data + self.COMPR_CHAR + self.EOT_CHAR)
+        try:
+            with self.send_lock:
+                buffers = self.create_buffers(data, encoding_type, compression, packets)
+                if buffers != None:
+                    self.queue_packet(buffers)
+
+        except queue.Full: # Backpressure 'raise', the caller handles the full queue
+            raise
+
+        except Exception as e:  # Fixed issue #19: When sending is corrupted, close the connection
+            self.main_node.debug_print("nodeconnection send: Error sending data to node: " + str(e))
+            self.stats.add("send_errors")
+            self.stop()  # Stopping node due to failure
+
+    def send_payload(self, payload):
+        """Sends the payload (flags, type, payload) that has already been created, see create_payload, to the connected
+           node like send. The packet is queued and sent by the writer of the connection, see queue_packet."""
+        try:
+            with self.send_lock:
+                buffers = self.payload_buffers(payload)
+                if buffers != None:
+                    self.queue_packet(buffers)
 
-            except Exception as e:  # Fixed issue #19: When sending is corrupted, close the connection
-                self.main_node.debug_print("nodeconnection send: Error sending data to node: " + str(e))
-                self.stop()  # Stopping node due to failure
+        except queue.Full: # Backpressure 'raise', the caller handles the full queue
+            raise
 
-        elif isinstance(data, dict):
-            try:
-                if compression == 'none':
-                    self.sock.sendall(json.dumps(data).encode(encoding_type) + self.EOT_CHAR)
-                else:
-                    data = self.compress(json.dumps(data).encode(encoding_type), compression)
-                    if data != None:
-                        self.sock.sendall(data + self.COMPR_CHAR + self.EOT_CHAR)
+        except Exception as e:
+            self.main_node.debug_print("nodeconnection send: Error sending data to node: " + str(e))
+            self.stats.add("send_errors")
+            self.stop()  # Stopping node due to failure
 
-            except TypeError as type_error:
-                self.main_node.debug_print('This dict is invalid')
-                self.main_node.debug_print(type_error)
+    def send_datagram(self, data, encoding_type='utf-8', compression='none', packets=None):
+        """Sends the data as one datagram over the datagram channel (UDP) with the connected node. The datagram is
+           sent directly, is not retransmitted and may arrive out of order, in which case the connected node drops
+           it. The data is sent over the connection instead when there is no datagram channel with the connected node
+           or when the datagram would be larger than the datagram_size of the main node. zlib-stream is replaced by zlib,
+           because each datagram is decompressed on its own."""
+        if self.udp_address is None:
+            return self.send(data, encoding_type, compression, packets)
 
-            except Exception as e:  # Fixed issue #19: When sending is corrupted, close the connection
-                self.main_node.debug_print("nodeconnection send: Error sending data to node: " + str(e))
-                self.stop()  # Stopping node due to failure
+        if packets is None:
+            packets = {}
 
-        elif isinstance(data, bytes):
-            try:
-                if compression == 'none':
-                    self.sock.sendall(data + self.EOT_CHAR)
-                else:
-                    data = self.compress(data, compression)
-                    if data != None:
-                        self.sock.sendall(data + self.COMPR_CHAR + self.EOT_CHAR)
+        if compression == 'zlib-stream':
+            compression = 'zlib'
+
+        try:
+            payload = self.create_payload(data, encoding_type, compression, packets)
+            if payload is None:
+                return
 
-            except Exception as e:  # Fixed issue #19: When sending is corrupted, close the connection
+        except Exception as e:
+            self.main_node.debug_print("nodeconnection send_datagram: Error creating the datagram: " + str(e))
+            self.stats.add("send_errors")
+            return
+
+        if protocol.DATAGRAM_HEADER.size + len(payload[2]) > self.main_node.datagram_size:
+            return self.send_payload(payload) # The payload has already been created and counted
+
+        (flags, type, payload) = payload
+        datagram = b''.join((protocol.DATAGRAM_HEADER.pack(self.udp_token, next(self.udp_sequence), flags, type), payload))
+        try:
+            self.main_node.udp_sock.sendto(datagram, self.udp_address)
+            self.stats.update({"messages_sent": 1, "datagrams_sent": 1, "bytes_sent": len(datagram)})
+
+        except OSError as e: # Lost like a datagram that is lost on the network, the connection is not stopped
+            self.main_node.debug_print("nodeconnection send_datagram: Could not send the datagram: " + str(e))
+            self.stats.add("datagrams_dropped")
+
+    def send_gossip(self, message_id, ttl, flags, type, payload):
+        """Sends the payload of a gossip message, see create_payload, to the connected node. Gossip is only sent with
+           length framing. The packet is queued and sent by the writer of the connection, see queue_packet."""
+        if self.framing != 'length':
+            return
+
+        if len(payload) + protocol.GOSSIP_HEADER.size > self.max_frame_size:
+            self.main_node.debug_print("send_gossip: The message is larger than the maximum frame size of the node")
+            return
+
+        try:
+            with self.send_lock:
+                self.queue_packet(protocol.create_gossip_buffers(message_id, ttl, payload, flags, type))
+
+        except queue.Full: # Backpressure 'raise', the caller handles the full queue
+            raise
+
+        except Exception as e:
+            self.main_node.debug_print("nodeconnection send_gossip: Error sending data to node: " + str(e))
+            self.stats.add("send_errors")
+            self.stop()  # Stopping node due to failure
+
+    def queue_packet(self, packet):
+        """Adds the packet, a tuple of buffers, to the send queue of the connection, which is sent by the writer thread
+           or by the reactor of the main node, see flush. When the queue is full, the backpressure of the main node
+           determines what happens: 'block' waits until there is space in the queue, 'drop' drops the packet and
+           'raise' raises queue.Full. The thread of the reactor never waits, so with 'block' the packets that it
+           sends to a full queue are dropped. Packets are dropped when the connection or the main node has been
+           terminated."""
+        reactor = self.main_node.reactor
+        if self.writer == None and reactor is None:
+            self.writer = threading.Thread(target=self.write_packets, daemon=True)
+            self.writer.start()
+
+        if self.main_node.backpressure == 'block' and (reactor is None or not reactor.in_reactor_thread()):
+            while not self.terminate_flag.is_set() and not self.main_node.terminate_flag.is_set():
+                try:
+                    self.send_queue.put(packet, timeout=0.1)
+                    self.stats.add("messages_sent")
+                    if reactor is not None:
+                        reactor.want_write(self)
+                    return
+
+                except queue.Full:
+                    pass
+
+            self.stats.add("messages_dropped")
+            return
+
+        try:
+            self.send_queue.put_nowait(packet)
+            self.stats.add("messages_sent")
+            if reactor is not None:
+                reactor.want_write(self)
+
+        except queue.Full:
+            self.stats.add("messages_dropped")
+            if self.main_node.backpressure == 'raise':
+                raise
+
+            self.dropped_packets += 1
+            self.main_node.debug_print("nodeconnection send: Send queue of node " + self.id + " is full, packet dropped")
+
+    def get_queue_depth(self):
+        """Returns the number of packets that are waiting to be sent to the connected node."""
+        return self.send_queue.qsize()
+
+    def get_stats(self):
+        """Returns a snapshot (dict) of the statistics of this connection: the counters (see stats.COUNTERS) and the
+           queue depth, see get_queue_depth."""
+        stats = self.stats.snapshot()
+        stats["queue_depth"] = self.get_queue_depth()
+
+        return stats
+
+    def write_packets(self):
+        """The main loop of the writer thread that sends the packets of the send queue to the connected node. The
+           packets that are queued are coalesced until the flush_bytes of the main node is reached, or until the
+           flush_window (seconds) of the main node has passed, and sent together with send_buffers. The writer waits
+           for the packets without waking up and stops at the None that close puts in the queue, after the packets
+           that are queued before it have been sent. When sending fails the connection is stopped and the writer stops
+           as well, the packets that are still queued are dropped."""
+        stopped = False
+
+        while not stopped:
+            packet = self.send_queue.get()
+            if packet == None: # Stop, all packets have been sent
+                break
+
+            packets = [packet]
+            buffers = len(packet)
+            size = sum(len(buffer) for buffer in packet)
+            deadline = time.monotonic()
+            if self.batching: # The connected node allows us to delay the packets to batch them
+                deadline += self.main_node.flush_window
+
+            while size < self.main_node.flush_bytes and buffers < 1000: # Stay below IOV_MAX of sendmsg
+                try:
+                    packet = self.send_queue.get(timeout=max(0, deadline - time.monotonic()))
+
+                except queue.Empty:
+                    break
+
+                if packet == None:
+                    stopped = True
+                    break
+
+                packets.append(packet)
+                buffers += len(packet)
+                size += sum(len(buffer) for buffer in packet)
+
+            tracer = self.main_node.tracer
+            try:
+                start = tracer.now() if tracer is not None else 0
+                if self.drain_start is None:
+                    self.drain_start = time.perf_counter()
+                self.send_packets(packets)
+                if tracer is not None:
+                    tracer.record("send", self, start)
+                self.count_sent(size)
+
+            except Exception as e: # The connection is broken, the packets that are still queued cannot be sent
                 self.main_node.debug_print("nodeconnection send: Error sending data to node: " + str(e))
+                self.stats.add("send_errors")
                 self.stop()  # Stopping node due to failure
+                break
+
+    def flush(self):
+        """Sends the queued packets to the connected node without blocking, used by the reactor of the main node
+           instead of the writer thread. The packets that are queued are coalesced until the flush_bytes of the main
+           node is reached and sent with one sendmsg call, the flush_window is not used. Returns True when all the
+           packets have been sent and False when the socket does not accept more data, then the reactor flushes
+           again when the socket is writable. Raises the exception when sending fails."""
+        while True:
+            if len(self.out_buffers) == 0:
+                packets = []
+                buffers = 0
+                size = 0
+                while size < self.main_node.flush_bytes and buffers < 1000: # Stay below IOV_MAX of sendmsg
+                    try:
+                        packet = self.send_queue.get_nowait()
+
+                    except queue.Empty:
+                        break
+
+                    packets.append(packet)
+                    buffers += len(packet)
+                    size += sum(len(buffer) for buffer in packet)
+
+                if len(packets) == 0:
+                    return True
+
+                self.out_buffers = [memoryview(buffer) for buffer in self.packet_buffers(packets)]
+
+            tracer = self.main_node.tracer
+            start = tracer.now() if tracer is not None else 0
+            if self.drain_start is None:
+                self.drain_start = time.perf_counter()
+            try:
+                if hasattr(self.sock, "sendmsg"):
+                    sent = self.sock.sendmsg(self.out_buffers)
 
-        else:
-            self.main_node.debug_print('datatype used is not valid plese use str, dict (will be send as json) or bytes')
+                else:
+                    sent = self.sock.send(b''.join(self.out_buffers))
+
+            except (BlockingIOError, InterruptedError):
+                return False
+
+            if tracer is not None:
+                tracer.record("send", self, start)
+
+            size = sent
+            i = 0
+            while i < len(self.out_buffers) and sent >= len(self.out_buffers[i]):
+                sent -= len(self.out_buffers[i])
+                i += 1
+
+            self.out_buffers = self.out_buffers[i:]
+            if len(self.out_buffers) > 0: # The socket is full
+                self.out_buffers[0] = self.out_buffers[0][sent:]
+            self.count_sent(size)
+            if len(self.out_buffers) > 0:
+                return False
+
+    def count_sent(self, size):
+        """Counts the bytes that have been sent. When the send queue is empty, the throughput of the connection is
+           updated with the bytes that have been sent since the send queue was empty the last time, see
+           CompressionPolicy.update_throughput."""
+        self.stats.add("bytes_sent", size)
+        self.drain_bytes += size
+        if not self.has_output():
+            self.main_node.compression_policy.update_throughput(self, self.drain_bytes, time.perf_counter() - self.drain_start)
+            self.drain_start = None
+            self.drain_bytes = 0
+
+    def has_output(self):
+        """Returns whether there are packets that have not been sent yet."""
+        return len(self.out_buffers) > 0 or not self.send_queue.empty()
+
+    def send_packets(self, packets):
+        """Sends the packets, each a tuple of buffers, to the connected node with send_buffers, see packet_buffers."""
+        self.send_buffers(self.packet_buffers(packets))
+
+    def packet_buffers(self, packets):
+        """Returns the buffers that are sent over the socket for the packets, each a tuple of buffers. When the
+           connected node shares a ring buffer in shared memory, the frames of at least shm_threshold bytes of the
+           main node are written in the ring buffer and only a small frame with FLAG_SHARED that holds the number of
+           frames is sent over the socket. The other frames and the frames that do not fit in the ring buffer are sent
+           over the socket, after the frames in the ring buffer, so the order is kept."""
+        buffers = []
+        if self.ring_out is None:
+            for packet in packets:
+                buffers.extend(packet)
+
+            return buffers
+
+        shared = 0
+        threshold = self.main_node.shm_threshold
+        for packet in packets:
+            if sum(len(buffer) for buffer in packet) >= threshold and self.ring_out.write(packet):
+                shared += 1
+                continue
+
+            if shared > 0:
+                buffers.extend(protocol.create_frame_buffers(protocol.SHARED_COUNT.pack(shared), protocol.FLAG_SHARED, protocol.TYPE_BYTES))
+                shared = 0
+
+            buffers.extend(packet)
+
+        if shared > 0:
+            buffers.extend(protocol.create_frame_buffers(protocol.SHARED_COUNT.pack(shared), protocol.FLAG_SHARED, protocol.TYPE_BYTES))
+
+        return buffers
+
+    def send_buffers(self, buffers):
+        """Sends the buffers after each other with one sendmsg call (scatter-gather), so the buffers do not have to be
+           concatenated. When not all the data has been sent, sending continues with the remaining data. Platforms
+           without sendmsg send the concatenated buffers with sendall."""
+        if not hasattr(self.sock, "sendmsg"):
+            self.sock.sendall(b''.join(buffers))
+            return
+
+        buffers = [memoryview(buffer) for buffer in buffers]
+        i = 0
+        while i < len(buffers):
+            sent = self.sock.sendmsg(buffers[i:])
+            while i < len(buffers) and sent >= len(buffers[i]):
+                sent -= len(buffers[i])
+                i += 1
+
+            if sent > 0:
+                buffers[i] = buffers[i][sent:]
 
     def stop(self):
-        """Terminates the connection and the thread is stopped. Stop the node client. Please make sure you join the thread."""
+        """Terminates the connection and the thread is stopped. Stop the node client. Please make sure you join the thread.
+           When the main node uses a reactor, the reactor closes the connection."""
         self.terminate_flag.set()
 
+        if self.main_node.reactor is not None:
+            self.main_node.reactor.call_soon(self.main_node.reactor.remove_connection, self)
+
     def parse_packet(self, packet):
         """Parse the packet and determines wheter it has been send in str, json or byte format. It returns
            the according data."""
         if packet.find(self.COMPR_CHAR) == len(packet) - 1:  # Check if packet was compressed
+            tracer = self.main_node.tracer
+            start = tracer.now() if tracer is not None else 0
             packet = self.decompress(packet[0:-1])
+            if tracer is not None:
+                tracer.record("decompress", self, start)
 
         try:
             packet_decoded = packet.decode('utf-8')
@@ -191,18 +752,233 @@ class NodeConnection(threading.Thread):
         except UnicodeDecodeError:
             return packet
 
+    def parse_frame(self, flags, type, payload):
+        """Parse the payload of a frame that has been received with length framing. The type of the payload is
+           given by the frame, so the payload is directly decoded by the serializer of that type. The payload is a
+           memoryview of the receive buffer, which is only copied when the data is decoded. When the type is
+           unknown, the payload is returned as bytes."""
+        if flags & protocol.FLAG_COMPRESSED:
+            tracer = self.main_node.tracer
+            start = tracer.now() if tracer is not None else 0
+            payload = self.decompress(payload)
+            if tracer is not None:
+                tracer.record("decompress", self, start)
+
+        decoder = serializer.get_type(type)
+        if decoder == None:
+            self.main_node.debug_print(self.id + ":parse_frame:Unknown type " + str(type))
+            return bytes(payload)
+
+        return decoder.decode(payload)
+
+    def receive_data(self, chunk):
+        """Adds the chunk of data that has been received to the receive buffer and processes all the packets that
+           are complete. Used when the data is not received from the socket by this connection itself."""
+        self.receive_buffer.write(chunk)
+        self.process_buffer()
+
+    def process_buffer(self):
+        """Processes all the packets in the receive buffer that are complete. For each packet the method
+           node_message of the main node is invoked. Gossip messages are handed to the method gossip_received of
+           the main node. When tracing is enabled, the stages are measured by the tracer of the main node: frame,
+           decode (including decompress) and handler."""
+        tracer = self.main_node.tracer
+        start = tracer.now() if tracer is not None else 0
+
+        if self.framing == 'length':
+            try:
+                for (flags, type, payload) in self.frame_decoder.frames():
+                    if tracer is not None:
+                        start = tracer.record("frame", self, start)
+
+                    if flags & protocol.FLAG_SHARED:
+                        if len(payload) != protocol.SHARED_COUNT.size:
+                            raise protocol.FrameError("Invalid frame with FLAG_SHARED")
+
+                        start = self.process_ring(protocol.SHARED_COUNT.unpack(payload)[0], tracer, start)
+
+                    else:
+                        start = self.process_frame(flags, type, payload, tracer, start)
+
+            except protocol.FrameError:
+                self.stats.add("receive_errors")
+                raise
+
+            return
+
+        # BUG: possible buffer overflow when no EOT_CHAR is found => Fix by max buffer count or so?
+        eot_pos = self.receive_buffer.find(self.EOT_CHAR)
+
+        while eot_pos >= 0:
+            packet = bytes(self.receive_buffer.consume(eot_pos))
+            self.receive_buffer.consume(1) # The EOT_CHAR itself
+            if tracer is not None:
+                start = tracer.record("frame", self, start)
+
+            self.stats.update({"messages_received": 1, "bytes_received": len(packet) + 1})
+            try:
+                data = self.parse_packet(packet)
+
+            except Exception as e:
+                self.main_node.debug_print(self.id + ":process_buffer:Could not decode the message: " + str(e))
+                self.stats.add("receive_errors")
+
+            else:
+                if tracer is not None:
+                    start = tracer.record("decode", self, start)
+
+                self.main_node.node_message(self, data)
+                if tracer is not None:
+                    start = tracer.record("handler", self, start)
+
+            eot_pos = self.receive_buffer.find(self.EOT_CHAR)
+
+    def process_frame(self, flags, type, payload, tracer=None, start=0):
+        """Processes the payload of a frame that has been received with length framing, see process_buffer. Returns
+           the moment that the tracer has recorded last."""
+        self.stats.update({"messages_received": 1, "bytes_received": protocol.HEADER.size + len(payload)})
+        if flags & protocol.FLAG_GOSSIP:
+            self.main_node.gossip_received(self, flags & ~protocol.FLAG_GOSSIP, type, payload)
+            if tracer is not None:
+                start = tracer.record("handler", self, start)
+            return start
+
+        try:
+            data = self.parse_frame(flags, type, payload)
+
+        except Exception as e:
+            self.main_node.debug_print(self.id + ":process_buffer:Could not decode the message: " + str(e))
+            self.stats.add("receive_errors")
+            return start
+
+        if tracer is not None:
+            start = tracer.record("decode", self, start)
+
+        self.main_node.node_message(self, data)
+        if tracer is not None:
+            start = tracer.record("handler", self, start)
+
+        return start
+
+    def process_ring(self, count, tracer=None, start=0):
+        """Processes the given number of frames that the connected node has written in the ring buffer of this node.
+           The frames are decoded directly from the shared memory. Returns the moment that the tracer has recorded
+           last. Raises FrameError when this node does not share a ring buffer with the connected node or when a
+           frame in the ring buffer is corrupt."""
+        if self.ring_in is None:
+            raise protocol.FrameError("A frame in shared memory has been received without a ring buffer")
+
+        for i in range(count):
+            try:
+                frame = self.ring_in.read()
+
+            except (ValueError, struct.error) as e:
+                raise protocol.FrameError("Corrupt frame in shared memory: " + str(e))
+
+            try:
+                if len(frame) < protocol.HEADER.size:
+                    raise protocol.FrameError("The frame in shared memory is too short to hold the header")
+
+                (length, flags, type) = protocol.HEADER.unpack_from(frame)
+                if protocol.HEADER.size + length > len(frame):
+                    raise protocol.FrameError("The frame in shared memory is shorter than its length")
+
+                payload = frame[protocol.HEADER.size:protocol.HEADER.size + length]
+                try:
+                    start = self.process_frame(flags, type, payload, tracer, start)
+
+                finally:
+                    payload.release()
+
+            finally:
+                frame.release()
+                self.ring_in.consume()
+
+        return start
+
+    def process_datagram(self, sequence, flags, type, payload):
+        """Processes the payload of a datagram that the connected node has sent over the datagram channel, see
+           send_datagram. The datagram is dropped when it is not newer than the last datagram that has been received,
+           so a stale message is never delivered after a newer one."""
+        if sequence <= self.udp_received:
+            self.stats.add("datagrams_dropped")
+            return
+
+        self.udp_received = sequence
+        if flags & (protocol.FLAG_GOSSIP | protocol.FLAG_SHARED):
+            self.main_node.debug_print(self.id + ":process_datagram:Invalid flags " + str(flags))
+            self.stats.add("receive_errors")
+            return
+
+        tracer = self.main_node.tracer
+        start = tracer.now() if tracer is not None else 0
+
+        self.stats.add("datagrams_received")
+        self.process_frame(flags, type, payload, tracer, start)
+
+    def close(self):
+        """Closes the socket of the connection and informs the main node that the connection has been closed."""
+        # IDEA: Invoke (event) a method in main_node so the user is able to send a bye message to the node before it is closed?
+        if self.writer != None: # Give the writer the chance to send the packets that are still queued and stop it
+            deadline = time.monotonic() + 1.0
+            try:
+                self.send_queue.put(None, timeout=1.0)
+
+            except queue.Full:
+                pass
+
+            self.writer.join(max(0, deadline - time.monotonic()))
+            if self.writer.is_alive(): # Stalled, sending fails when the socket is shut down, which stops the writer
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+
+                except OSError:
+                    pass
+
+        self.sock.settimeout(None)
+        self.sock.close()
+
+        for ring in (self.ring_in, self.ring_out):
+            if ring is not None:
+                ring.close()
+
+        if self.udp_receive_token is not None: # Datagrams that arrive later are dropped
+            self.main_node.udp_nodes.pop(self.udp_receive_token, None)
+
+        self.main_node.node_disconnected(
+            self)  # Fixed issue #19: Send to main_node when a node is disconnected. We do not know whether it is inbounc or outbound.
+        self.main_node.debug_print("NodeConnection: Stopped")
+
     # Required to implement the Thread. This is the main loop of the node client.
     def run(self):
         """The main loop of the thread to handle the connection with the node. Within the
            main loop the thread waits to receive data from the node. If data is received 
-           the method node_message will be invoked of the main node to be processed."""
-        buffer = b''  # Hold the stream that comes in!
+           the method node_message will be invoked of the main node to be processed. When
+           the connected node closes the connection, the connection is closed as well. When
+           the main node uses a reactor, the thread is not started and the reactor receives
+           the data instead."""
+        received = len(self.receive_buffer) # Data that has been received together with the handshake
 
         while not self.terminate_flag.is_set():
-            chunk = b''
+            if received > 0:
+                try:
+                    self.process_buffer()
+
+                except (protocol.FrameError, MemoryError) as e:
+                    self.terminate_flag.set()  # The stream is corrupted, so the connection cannot be used anymore
+                    self.main_node.debug_print("NodeConnection: " + str(e))
+                    break
+
+                except Exception as e: # Do not let the thread stop without closing the connection
+                    self.main_node.debug_print("NodeConnection: Exception while processing the data: " + str(e))
+
+            received = 0
 
             try:
-                chunk = self.sock.recv(4096)
+                received = self.receive_buffer.recv_into(self.sock)
+                if received == 0: # The connected node has closed the connection
+                    self.terminate_flag.set()
+                    break
 
             except socket.timeout:
                 self.main_node.debug_print("NodeConnection: timeout")
@@ -212,28 +988,12 @@ class NodeConnection(threading.Thread):
                 self.main_node.debug_print('Unexpected error')
                 self.main_node.debug_print(e)
 
-            # BUG: possible buffer overflow when no EOT_CHAR is found => Fix by max buffer count or so?
-            if chunk != b'':
-                buffer += chunk
-                eot_pos = buffer.find(self.EOT_CHAR)
-
-                while eot_pos > 0:
-                    packet = buffer[:eot_pos]
-                    buffer = buffer[eot_pos + 1:]
-
-                    self.main_node.message_count_recv += 1
-                    self.main_node.node_message(self, self.parse_packet(packet))
-
-                    eot_pos = buffer.find(self.EOT_CHAR)
+            if received > 0:
+                continue # Process the data directly
 
             time.sleep(0.01)
 
-        # IDEA: Invoke (event) a method in main_node so the user is able to send a bye message to the node before it is closed?
-        self.sock.settimeout(None)
-        self.sock.close()
-        self.main_node.node_disconnected(
-            self)  # Fixed issue #19: Send to main_node when a node is disconnected. We do not know whether it is inbounc or outbound.
-        self.main_node.debug_print("NodeConnection: Stopped")
+        self.close()
 
     def set_info(self, key, value):
         self.info[key] = value
@@ -0,0 +1,132 @@
+import threading
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The nodes that are connected with a node are kept in a PeerSet. Besides the nodes, the PeerSet keeps an index by the
+id of the node and by the host and port of the node, so a node is found directly, also when there are thousands of
+connected nodes. Iterating over a PeerSet iterates over a snapshot, so nodes that connect or disconnect while
+iterating do not change the iteration.
+"""
+
+class PeerSet:
+    """Set of node connections in the order in which they have been added, with an index by id and by host and port.
+       The PeerSet is used like a set (add, remove, discard, in, len) and like a list (iterate, index), so existing
+       code that uses nodes_inbound and nodes_outbound still works. The PeerSet is thread-safe."""
+
+    def __init__(self, nodes=[]):
+        """Creates the PeerSet with the given nodes.
+            nodes: (optional) The node connections that are added to the PeerSet."""
+
+        # The nodes (dict as set that keeps the order) and the indexes
+        self.nodes = {}
+        self.ids = {}       # id -> {node: None, ...}
+        self.addresses = {} # (host, port) -> node, the node that has been added last
+
+        # The snapshot of the nodes that is used to iterate, created when it is needed after a change
+        self.nodes_snapshot = ()
+
+        self.lock = threading.Lock()
+
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def address(host, port):
+        """Returns the key of the address index. The port is a string or an integer, both are the same port."""
+        return (host, str(port))
+
+    def add(self, node):
+        """Adds the node connection to the PeerSet."""
+        with self.lock:
+            if node in self.nodes:
+                return
+
+            self.nodes[node] = None
+            self.ids.setdefault(node.id, {})[node] = None
+            self.addresses[self.address(node.host, node.port)] = node
+            self.nodes_snapshot = None
+
+    def remove(self, node):
+        """Removes the node connection from the PeerSet. Raises KeyError when the node is not in the PeerSet."""
+        with self.lock:
+            del self.nodes[node]
+
+            ids = self.ids[node.id]
+            del ids[node]
+            if len(ids) == 0:
+                del self.ids[node.id]
+
+            address = self.address(node.host, node.port)
+            other = self.addresses.get(address)
+            if other is not None and other == node:
+                del self.addresses[address]
+                for other in ids: # Another connection with the same id and address takes its place
+                    if self.address(other.host, other.port) == address:
+                        self.addresses[address] = other
+
+            self.nodes_snapshot = None
+
+    def discard(self, node):
+        """Removes the node connection from the PeerSet when it is in the PeerSet."""
+        try:
+            self.remove(node)
+
+        except KeyError:
+            pass
+
+    def clear(self):
+        """Removes all the node connections from the PeerSet."""
+        with self.lock:
+            self.nodes = {}
+            self.ids = {}
+            self.addresses = {}
+            self.nodes_snapshot = ()
+
+    def get(self, id, host=None):
+        """Returns the node connection with the given id or None when it does not exist. When host is given, only
+           the node connection with this host is returned."""
+        with self.lock:
+            for node in self.ids.get(id, ()):
+                if host is None or node.host == host:
+                    return node
+
+        return None
+
+    def find(self, host, port):
+        """Returns the node connection with the given host and port or None when it does not exist."""
+        return self.addresses.get(self.address(host, port))
+
+    def snapshot(self):
+        """Returns a tuple with the node connections at this moment."""
+        snapshot = self.nodes_snapshot
+        if snapshot is None:
+            with self.lock:
+                snapshot = tuple(self.nodes)
+                self.nodes_snapshot = snapshot
+
+        return snapshot
+
+    def __contains__(self, node):
+        return node in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __getitem__(self, index):
+        return self.snapshot()[index]
+
+    def __bool__(self):
+        return len(self.nodes) > 0
+
+    def __str__(self):
+        return str(list(self.snapshot()))
+
+    def __repr__(self):
+        return '<PeerSet: ' + str(len(self.nodes)) + ' nodes>'
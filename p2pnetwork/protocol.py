@@ -0,0 +1,387 @@
+import socket
+import struct
+import time
+import zlib, bz2, lzma
+
+from p2pnetwork.receivebuffer import ReceiveBuffer
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The protocol module holds the details of the wire format that is shared by the node connections. Originally each
+message is terminated by the end of transmission character 0x04 (EOT framing). Nodes that both support it use the
+length framing, where each message is preceded by a fixed header that holds the length, the flags and the type of
+the payload. The framing is negotiated when the node id's are exchanged by adding options to the id's. With length
+framing, compressed payloads are binary and start with a byte that holds the codec. With EOT framing the compressed
+payloads are base64 encoded, because binary data could contain the EOT character.
+
+The handshake is versioned: the options hold the version of the handshake and the capabilities of the node (framing,
+codecs, serializers, maximum frame size and batching) and are terminated by HANDSHAKE_END, so the handshake is
+received completely, also when it arrives in more than one segment. Legacy nodes only send their id and never receive
+options, see HANDSHAKE_PROBE.
+"""
+
+# Header of a frame: length of the payload, flags and the type of the payload
+HEADER = struct.Struct('!IBB')
+
+# The largest payload the header is able to hold, the limit of the wire format
+MAX_FRAME_SIZE = 0xffffffff
+
+# The largest payload that a node accepts by default. Connections that send larger frames are closed, raise the
+# max_frame_size of the node (at most MAX_FRAME_SIZE) to receive larger messages.
+DEFAULT_MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Flags of a frame
+FLAG_COMPRESSED = 0x01
+FLAG_GOSSIP = 0x02
+FLAG_SHARED = 0x04
+
+# Payload of a frame with FLAG_SHARED: the number of frames that have been written in the ring buffer in shared
+# memory of the receiving node, see the ringbuffer module. These frames are processed before the next frame.
+SHARED_COUNT = struct.Struct('!I')
+
+# Header of a datagram of the datagram channel (UDP): the token that the receiving node has given to the connection,
+# the sequence number of the datagram on the connection and the flags and the type of the payload, like a frame. The
+# receiving node drops the datagrams that are older than the last datagram that it has received on the connection.
+DATAGRAM_HEADER = struct.Struct('!IQBB')
+
+# Header of the payload of a gossip frame: the unique id of the message and the TTL (hops the message is forwarded)
+GOSSIP_HEADER = struct.Struct('!16sB')
+
+# Types of the payload of a frame, which is the serializer that has been used, see the serializer module
+TYPE_BYTES = 0x00
+TYPE_STR = 0x01
+TYPE_JSON = 0x02
+TYPE_MSGPACK = 0x03
+
+# Codecs of a compressed payload, given by the first byte of the payload. These bytes are never used by base64, so
+# the legacy base64 compressed payloads are still recognized.
+CODEC_ZLIB = 0x01
+CODEC_BZIP2 = 0x02
+CODEC_LZMA = 0x03
+
+# The payloads of zlib-stream are compressed by the zlib stream of the connection, so they can only be decompressed
+# by the zlib stream at the other side of the connection and not by decompress.
+CODEC_ZLIB_STREAM = 0x04
+
+CODECS = {'zlib': CODEC_ZLIB, 'bzip2': CODEC_BZIP2, 'lzma': CODEC_LZMA, 'zlib-stream': CODEC_ZLIB_STREAM}
+
+# The codecs that are known by each node, including the legacy nodes that use EOT framing
+LEGACY_CODECS = ['zlib', 'bzip2', 'lzma']
+
+# Each payload of zlib-stream is flushed with Z_SYNC_FLUSH, which always ends with these bytes. They are not sent.
+SYNC_FLUSH_TAIL = b'\x00\x00\xff\xff'
+
+# Separates the options from the id that is exchanged when the nodes connect. Legacy nodes do not send options. They
+# do not receive any either, because a node that connects only sends its options when the other node waits for them,
+# see HANDSHAKE_PROBE, so legacy nodes keep on using EOT framing.
+OPTIONS_SEPARATOR = '\x00'
+
+# The version of the handshake, legacy nodes (version 1) only send their id. The options of the handshake are
+# terminated by HANDSHAKE_END and the handshake may not be larger than MAX_HANDSHAKE_SIZE.
+HANDSHAKE_VERSION = 2
+HANDSHAKE_END = '\n'
+MAX_HANDSHAKE_SIZE = 65536
+
+# A legacy node that accepts a connection takes all the data that it receives first as the id and the port of the
+# other node, so the node that connects first sends only its id and port. A node of version 2 does not reply before it
+# has received the options, while a legacy node replies directly with its id. The node that connects sends its options
+# when no reply has arrived within HANDSHAKE_PROBE seconds plus twice the time it took to connect, see probe_handshake.
+# A legacy node that replies later has taken the options as part of the id and port or of the stream, so the node
+# closes the connection and connects again without sending the options, see Node.connect_with_node.
+HANDSHAKE_PROBE = 0.05
+
+# The id of a node could arrive in an earlier segment than its options and the options of a node that connects only
+# follow after HANDSHAKE_PROBE. When the first data of a handshake has no options, the node waits at most this many
+# seconds for the rest before it takes the data as the id of a legacy node. The node does not use a thread to wait,
+# see HandshakeReader, so the legacy nodes that connect at the same time wait together.
+LEGACY_HANDSHAKE_GRACE = 1.0
+
+
+class FrameError(ValueError):
+    """Raised when the stream of a connection does not follow the protocol, for example when a frame is larger than
+       the maximum frame size. The connection cannot be used anymore."""
+    pass
+
+
+def create_frame(payload, flags, type):
+    """Returns the frame of the payload, which is the header followed by the payload."""
+    return HEADER.pack(len(payload), flags, type) + payload
+
+
+def create_frame_buffers(payload, flags, type):
+    """Returns the frame of the payload as the tuple (header, payload), so the payload is not copied. The buffers
+       are sent after each other."""
+    return (HEADER.pack(len(payload), flags, type), payload)
+
+
+def compress(data, compression):
+    """Returns the data compressed in the binary format: the codec byte followed by the compressed data. The
+       compression is zlib, bzip2 or lzma, otherwise a ValueError is raised."""
+    if compression == 'zlib':
+        compressed = zlib.compress(data, 6)
+
+    elif compression == 'bzip2':
+        compressed = bz2.compress(data)
+
+    elif compression == 'lzma':
+        compressed = lzma.compress(data)
+
+    else:
+        raise ValueError("Unknown compression: " + str(compression))
+
+    return bytes([CODECS[compression]]) + compressed
+
+
+def create_gossip_buffers(message_id, ttl, payload, flags, type):
+    """Returns the gossip frame of the payload as the tuple (header, gossip header, payload). The payload is the data
+       as it is sent in a normal frame, so it can be forwarded without encoding it again."""
+    return (HEADER.pack(GOSSIP_HEADER.size + len(payload), flags | FLAG_GOSSIP, type), GOSSIP_HEADER.pack(message_id, ttl), payload)
+
+
+def is_binary_compressed(payload):
+    """Returns whether the compressed payload is in the binary format and not in the legacy base64 format."""
+    return len(payload) > 0 and payload[0] in CODECS.values()
+
+
+def codec_name(payload):
+    """Returns the name of the codec of the compressed payload in the binary format, None when it is unknown."""
+    for (name, codec) in CODECS.items():
+        if len(payload) > 0 and payload[0] == codec:
+            return name
+
+    return None
+
+
+def decompress(payload):
+    """Returns the data of a compressed payload in the binary format. The payload can be any bytes-like object,
+       like a memoryview of the receive buffer. A ValueError is raised when the codec is unknown."""
+    codec = payload[0]
+    compressed = memoryview(payload)[1:]
+
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(compressed)
+
+    if codec == CODEC_BZIP2:
+        return bz2.decompress(compressed)
+
+    if codec == CODEC_LZMA:
+        return lzma.decompress(compressed)
+
+    raise ValueError("Unknown codec: " + str(codec))
+
+
+def encode_options(options):
+    """Returns the options (dict) as text that is appended to the id that is send when the nodes connect. The text
+       is terminated by HANDSHAKE_END."""
+    return OPTIONS_SEPARATOR + ",".join(key + "=" + str(value) for (key, value) in options.items()) + HANDSHAKE_END
+
+
+def split_options(text):
+    """Splits the text that has been received when the nodes connect into the id part and the options (dict). A
+       legacy node does not send any options, so the options are empty in that case."""
+    if OPTIONS_SEPARATOR not in text:
+        return (text, {})
+
+    (text, encoded) = text.split(OPTIONS_SEPARATOR, 1)
+    options = {}
+    for option in encoded.rstrip(HANDSHAKE_END).split(","):
+        if "=" in option:
+            (key, value) = option.split("=", 1)
+            options[key] = value
+
+    return (text, options)
+
+
+def handshake_length(data, legacy=True):
+    """Returns the length of the handshake at the start of the received data (bytes) or None when the handshake is
+       not complete yet. The handshake of a node with options ends with HANDSHAKE_END. A legacy node sends its id
+       without options, so its handshake is all the data that has been received. When legacy is False, data
+       without options is not complete yet, because the options could still arrive, see read_handshake. Raises
+       FrameError when the handshake is too large."""
+    separator = data.find(OPTIONS_SEPARATOR.encode('utf-8'))
+    if separator < 0:
+        if legacy:
+            return len(data)
+
+        if len(data) > MAX_HANDSHAKE_SIZE:
+            raise FrameError("The handshake is larger than " + str(MAX_HANDSHAKE_SIZE) + " bytes")
+
+        return None
+
+    end = data.find(HANDSHAKE_END.encode('utf-8'), separator)
+    if end >= 0:
+        return end + 1
+
+    if len(data) > MAX_HANDSHAKE_SIZE:
+        raise FrameError("The handshake is larger than " + str(MAX_HANDSHAKE_SIZE) + " bytes")
+
+    return None
+
+
+def probe_time(connect_time):
+    """Returns how many seconds the node that connects waits for the reply to its id and port before it sends its
+       options, given the seconds it took to connect (about one round trip), see HANDSHAKE_PROBE. It stays well
+       below LEGACY_HANDSHAKE_GRACE, so the other node is still waiting when the options arrive."""
+    return min(HANDSHAKE_PROBE + 2 * connect_time, LEGACY_HANDSHAKE_GRACE / 2)
+
+
+def probe_handshake(sock, timeout):
+    """Waits at most timeout seconds for the reply of the node that has received our id and port, see
+       HANDSHAKE_PROBE. Returns the data that has been received, which is the id of a legacy node, or b'' when the
+       node has not replied, because it waits for our options. Raises ConnectionError when the connection has been
+       closed."""
+    previous = sock.gettimeout()
+    sock.settimeout(timeout)
+    try:
+        chunk = sock.recv(4096)
+
+    except socket.timeout:
+        return b''
+
+    finally:
+        sock.settimeout(previous)
+
+    if chunk == b'':
+        raise ConnectionError("The connection has been closed during the handshake")
+
+    return chunk
+
+
+def read_handshake(sock, deadline=None):
+    """Receives the handshake (id and options) of the other node from the socket. It returns the text of the
+       handshake and the data that has been received after the handshake, which belongs to the stream of the
+       connection. When the first data has no options, the rest of the handshake is awaited for
+       LEGACY_HANDSHAKE_GRACE seconds, before the data is taken as the id of a legacy node, see HandshakeReader.
+       Raises ConnectionError when the connection has been closed before the handshake has been received and
+       socket.timeout when the deadline (time.monotonic) has passed."""
+    reader = HandshakeReader()
+    timeout = sock.gettimeout()
+
+    try:
+        while True:
+            wait = timeout
+            if deadline is not None:
+                wait = max(0.001, deadline - time.monotonic())
+
+            if reader.grace is not None:
+                wait = max(0.001, reader.grace - time.monotonic()) if wait is None else min(wait, max(0.001, reader.grace - time.monotonic()))
+
+            sock.settimeout(wait)
+            try:
+                chunk = sock.recv(4096)
+
+            except socket.timeout:
+                handshake = reader.expire(deadline=deadline)
+                if handshake is not None: # The id of a legacy node has been received before the deadline
+                    return handshake
+                raise
+
+            handshake = reader.feed(chunk) if chunk != b'' else reader.close()
+            if handshake is not None:
+                return handshake
+
+    finally:
+        sock.settimeout(timeout)
+
+
+class HandshakeReader:
+    """Collects the handshake (id and options) of a node that connects from the chunks of data that arrive, so the
+       handshake can be received without waiting for the data, for example by a selector. The handshake is complete
+       when its options have been received. When the first data has no options, the options are awaited until the
+       moment grace (time.monotonic), which is LEGACY_HANDSHAKE_GRACE seconds later, see expire. After that the data
+       is taken as the id of a legacy node. Each method returns the tuple (handshake, received) when the handshake
+       is complete, with the text of the handshake and the data that has been received after the handshake, which
+       belongs to the stream of the connection, and None otherwise."""
+
+    def __init__(self):
+        self.data = b''
+        self.grace = None  # The moment until which the options of a node are awaited
+        self.legacy = None # The length of the data without options that has been received, the handshake of a legacy node
+
+    def feed(self, chunk):
+        """Adds the chunk that has been received. Raises FrameError when the handshake is too large."""
+        self.data += chunk
+        length = handshake_length(self.data, legacy=False)
+        if length is not None:
+            return self.handshake(length)
+
+        if OPTIONS_SEPARATOR.encode('utf-8') in self.data:
+            self.grace = None # The options are on their way, wait for the rest until the deadline
+
+        else: # A legacy node only sends data after our reply, so more data is the rest of its id
+            if self.grace is None:
+                self.grace = time.monotonic() + LEGACY_HANDSHAKE_GRACE
+            self.legacy = len(self.data)
+
+        return None
+
+    def expire(self, now=None, deadline=None):
+        """Returns the handshake of a legacy node when its options have not arrived within the grace or before the
+           deadline (time.monotonic) of the handshake."""
+        if now is None:
+            now = time.monotonic()
+
+        if self.grace is not None and (now >= self.grace or (deadline is not None and now >= deadline)):
+            return self.handshake(self.legacy)
+
+        return None
+
+    def close(self):
+        """The connection has been closed. Returns the handshake of a legacy node that closes the connection directly
+           after its id, otherwise ConnectionError is raised."""
+        if self.legacy is None:
+            raise ConnectionError("The connection has been closed during the handshake")
+
+        return self.handshake(self.legacy)
+
+    def handshake(self, length):
+        """Returns the tuple (handshake, received) of the handshake of the given length."""
+        return (self.data[0:length].decode('utf-8'), self.data[length:])
+
+
+class FrameDecoder:
+    """Splits the stream of a connection that uses length framing into frames. The stream is held by a
+       ReceiveBuffer, so the frames are handed out as memoryview slices of the buffer without copying them. Because
+       of the length in the header, the payload is allowed to contain any byte and the stream is processed in
+       linear time.
+        buffer: (optional) The ReceiveBuffer that holds the stream, a new buffer is created when not given.
+        max_frame_size: (optional) The largest payload that is accepted."""
+
+    def __init__(self, buffer=None, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        """Creates a decoder for a new stream.
+            buffer: (optional) The ReceiveBuffer that holds the stream, a new buffer is created when not given.
+            max_frame_size: (optional) The largest payload that is accepted."""
+        if buffer == None:
+            buffer = ReceiveBuffer()
+
+        self.buffer = buffer
+        self.max_frame_size = max_frame_size
+
+    def feed(self, chunk):
+        """Adds the chunk to the stream and returns the frames that are complete, see frames."""
+        self.buffer.write(chunk)
+        return self.frames()
+
+    def frames(self):
+        """Generates the frames in the buffer that are complete. Each frame is a tuple (flags, type, payload) where
+           the payload is a memoryview that is only valid until the next frame is generated, so process it before
+           continuing. When the next frame is not complete, the buffer grows with the data that actually arrives:
+           it reserves the space for the rest of the frame, but at most as much as has been received already, so a
+           header that claims a large frame does not allocate the memory for it. Raises FrameError when the frame
+           is larger than the maximum frame size."""
+        while len(self.buffer) >= HEADER.size:
+            (length, flags, type) = HEADER.unpack(self.buffer.peek(HEADER.size))
+            if length > self.max_frame_size:
+                raise FrameError("The frame of " + str(length) + " bytes is larger than the maximum frame size")
+
+            if len(self.buffer) < HEADER.size + length:
+                missing = HEADER.size + length - len(self.buffer)
+                self.buffer.reserve(min(missing, max(len(self.buffer), self.buffer.size)))
+                return
+
+            self.buffer.consume(HEADER.size)
+            yield (flags, type, self.buffer.consume(length))
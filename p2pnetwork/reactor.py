@@ -0,0 +1,308 @@
+import socket
+import selectors
+import threading
+import time
+
+from p2pnetwork import protocol
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The Reactor multiplexes the server socket and the sockets of all the node connections of a Node in one
+thread by using selectors (epoll, kqueue or select, whatever is the best on the platform). Data is
+dispatched as soon as it arrives and sent as soon as the sockets are writable, so there is no polling delay
+and no thread for each connection.
+"""
+
+class Reactor:
+    """The Reactor is used by the class Node when it is created with reactor=True. The thread of the Node runs
+       the main loop of the reactor. The reactor waits for the sockets to become readable and processes the
+       incoming connections and the incoming data of all the connections. The queued packets of the connections
+       are sent by the reactor as well, see flush_connection. Other threads are able to hand work
+       to the reactor by using call_soon, which wakes up the reactor when it is waiting.
+        main_node: The Node that owns the reactor."""
+
+    def __init__(self, main_node):
+        """Creates the reactor of the given node. The main loop is started by the thread of the node.
+            main_node: The Node that owns the reactor."""
+        self.main_node = main_node
+        self.selector = selectors.DefaultSelector()
+
+        # Minimal free space in the receive buffer when receiving from a socket that is readable
+        self.recv_size = 65536
+
+        # Maximum number of datagrams that are received each time the UDP socket of the main node is readable, so
+        # the connections get their turn as well
+        self.datagram_batch = 64
+
+        # Seconds that the reactor waits at most for events, so it notices that the node stops
+        self.select_timeout = 1.0
+
+        # Seconds that a connection that is closed stays open at most to send the packets that are still queued.
+        # The connections that are closing are kept by their socket, with the time at which they are closed anyway.
+        self.close_linger = 1.0
+        self.closing = {}
+
+        # The thread that runs the main loop
+        self.thread = None
+
+        # Work that needs to be executed on the thread of the reactor
+        self.pending = []
+        self.pending_lock = threading.Lock()
+
+        # The socket pair is used to wake up the reactor when other threads hand over work
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ, self.handle_wakeup)
+
+    def call_soon(self, callback, *args):
+        """Executes the callback with the arguments on the thread of the reactor. It is safe to call this method
+           from any thread."""
+        with self.pending_lock:
+            self.pending.append((callback, args))
+
+        self.wakeup()
+
+    def in_reactor_thread(self):
+        """Returns whether the current thread is the thread that runs the main loop of the reactor."""
+        return threading.current_thread() is self.thread
+
+    def wakeup(self):
+        """Wakes up the reactor when it is waiting for the sockets."""
+        try:
+            self.wakeup_send.send(b'\x00')
+
+        except (BlockingIOError, OSError):
+            pass # The reactor is already woken up or closed
+
+    def handle_wakeup(self, sock):
+        """Empties the wakeup socket, the pending work is executed by the main loop."""
+        try:
+            while sock.recv(4096):
+                pass
+
+        except (BlockingIOError, OSError):
+            pass
+
+    def add_connection(self, node):
+        """Starts handling the node connection by the reactor. The socket is registered when the reactor
+           executes the pending work."""
+        self.call_soon(self.register_connection, node)
+
+    def register_connection(self, node):
+        """Registers the socket of the node connection, so the reactor processes its incoming data."""
+        if not node.terminate_flag.is_set():
+            node.sock.setblocking(False)
+            self.selector.register(node.sock, selectors.EVENT_READ, node)
+            if len(node.receive_buffer) > 0: # Data that has been received together with the handshake
+                self.process_connection(node)
+            if node.has_output(): # Packets that have been queued before the connection was registered
+                self.flush_connection(node)
+
+        else:
+            node.close()
+
+    def remove_connection(self, node, linger=True):
+        """Stops handling the node connection and closes it. When linger is True and packets of the connection
+           still have to be sent, the reactor only sends them and closes the connection when they have been sent,
+           or after close_linger seconds. Must be executed on the thread of the reactor."""
+        if node.sock in self.closing:
+            if linger:
+                return # Already closing
+            del self.closing[node.sock]
+
+        try:
+            self.selector.get_key(node.sock)
+
+        except (KeyError, ValueError):
+            return # Not registered anymore, so the connection has already been closed
+
+        if linger and node.has_output():
+            self.closing[node.sock] = (node, time.monotonic() + self.close_linger)
+            self.selector.modify(node.sock, selectors.EVENT_WRITE, node)
+            return
+
+        self.selector.unregister(node.sock)
+        node.close()
+
+    def want_write(self, node):
+        """Lets the reactor send the queued packets of the node connection. It is safe to call this method from
+           any thread."""
+        if not node.flush_scheduled:
+            node.flush_scheduled = True
+            self.call_soon(self.flush_connection, node)
+
+    def flush_connection(self, node):
+        """Sends the queued packets of the node connection that is registered, see NodeConnection.flush. The
+           reactor waits for the socket to become writable as long as not all the packets have been sent. When
+           sending fails, the connection is closed."""
+        node.flush_scheduled = False
+
+        try:
+            key = self.selector.get_key(node.sock)
+
+        except (KeyError, ValueError):
+            return # Not registered (yet), the packets are sent when the connection is registered
+
+        try:
+            flushed = node.flush()
+
+        except Exception as e: # The connection is broken, close it without sending the packets that are still queued
+            self.main_node.debug_print("Reactor: Error sending data to node: " + str(e))
+            node.stats.add("send_errors")
+            node.terminate_flag.set()
+            self.remove_connection(node, linger=False)
+            return
+
+        if node.sock in self.closing:
+            if flushed:
+                self.remove_connection(node, linger=False)
+            return
+
+        events = selectors.EVENT_READ if flushed else selectors.EVENT_READ | selectors.EVENT_WRITE
+        if key.events != events:
+            self.selector.modify(node.sock, events, node)
+
+    def handle_readable(self, node):
+        """Receives the data of the node connection that is readable and hands it over to the node connection.
+           When the other node has closed the connection, the connection is closed."""
+        tracer = self.main_node.tracer
+        start = tracer.now() if tracer is not None else 0
+
+        try:
+            received = node.receive_buffer.recv_into(node.sock, self.recv_size)
+
+        except (BlockingIOError, socket.timeout):
+            return
+
+        except Exception as e:
+            self.main_node.debug_print("Reactor: Unexpected error: " + str(e))
+            received = 0
+
+        if tracer is not None:
+            tracer.record("recv", node, start)
+
+        if received == 0:
+            node.terminate_flag.set()
+            self.remove_connection(node)
+
+        else:
+            self.process_connection(node)
+
+    def process_connection(self, node):
+        """Processes the data in the receive buffer of the node connection. When the data does not follow the
+           protocol, the connection is closed."""
+        try:
+            node.process_buffer()
+
+        except (protocol.FrameError, MemoryError) as e:
+            self.main_node.debug_print("Reactor: " + str(e))
+            node.terminate_flag.set()
+            self.remove_connection(node)
+
+        except Exception as e: # Do not let one connection stop the reactor
+            self.main_node.debug_print("Reactor: Exception while processing the data: " + str(e))
+
+    def handle_accept(self, sock):
+        """Accepts the node that connects with the server socket of the main node, which is the server of the
+           transport or the Unix domain socket of the main node."""
+        try:
+            self.main_node.accept_connection(sock)
+
+        except (BlockingIOError, socket.timeout):
+            pass
+
+        except Exception as e:
+            self.main_node.debug_print("Reactor: Could not accept the connection: " + str(e))
+
+    def handle_datagrams(self, sock):
+        """Receives the datagrams that have arrived at the UDP socket of the main node, see Node.receive_datagram."""
+        for i in range(self.datagram_batch):
+            try:
+                self.main_node.receive_datagram()
+
+            except (BlockingIOError, socket.timeout):
+                return
+
+            except Exception as e: # Do not let one datagram stop the reactor
+                self.main_node.debug_print("Reactor: Could not receive the datagram: " + str(e))
+                return
+
+    def run_pending(self):
+        """Executes the work that has been handed over by other threads."""
+        with self.pending_lock:
+            pending = self.pending
+            self.pending = []
+
+        for (callback, args) in pending:
+            try:
+                callback(*args)
+
+            except Exception as e:
+                self.main_node.debug_print("Reactor: Exception in pending work: " + str(e))
+
+    def close_expired(self):
+        """Closes the connections that are closing and have not been able to send their packets in time."""
+        now = time.monotonic()
+        for (node, deadline) in list(self.closing.values()):
+            if now >= deadline:
+                self.remove_connection(node, linger=False)
+
+    def handle_events(self, events):
+        """Dispatches the events that have been returned by the selector."""
+        for (key, mask) in events:
+            if key.fileobj is self.wakeup_recv:
+                self.handle_wakeup(key.fileobj)
+
+            elif key.fileobj is self.main_node.udp_sock:
+                self.handle_datagrams(key.fileobj)
+
+            elif key.data is None:
+                self.handle_accept(key.fileobj)
+
+            else:
+                if mask & selectors.EVENT_WRITE:
+                    self.flush_connection(key.data)
+
+                if mask & selectors.EVENT_READ and not key.data.terminate_flag.is_set():
+                    self.handle_readable(key.data)
+
+    def run(self):
+        """The main loop of the reactor. It runs until the terminate flag of the main node is set."""
+        self.thread = threading.current_thread()
+        self.selector.register(self.main_node.sock, selectors.EVENT_READ, None)
+        if self.main_node.unix_sock is not None:
+            self.selector.register(self.main_node.unix_sock, selectors.EVENT_READ, None)
+        if self.main_node.udp_sock is not None:
+            self.main_node.udp_sock.setblocking(False)
+            self.selector.register(self.main_node.udp_sock, selectors.EVENT_READ, None)
+
+        while not self.main_node.terminate_flag.is_set():
+            self.handle_events(self.selector.select(self.select_timeout if len(self.closing) == 0 else 0.1))
+            self.run_pending()
+            self.close_expired()
+
+    def close(self):
+        """Closes all the node connections that are handled by the reactor and the reactor itself. The packets
+           that are still queued are sent first, for close_linger seconds at most."""
+        self.run_pending()
+
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None and key.fileobj is not self.wakeup_recv:
+                key.data.terminate_flag.set()
+                self.remove_connection(key.data)
+
+        while len(self.closing) > 0:
+            for (key, mask) in self.selector.select(0.1):
+                if key.fileobj in self.closing:
+                    self.flush_connection(key.data)
+
+            self.close_expired()
+
+        self.selector.close()
+        self.wakeup_recv.close()
+        self.wakeup_send.close()
@@ -0,0 +1,109 @@
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The ReceiveBuffer holds the stream of a node connection that has been received, but has not been processed yet.
+It is one bytearray that is reused for the lifetime of the connection. The socket writes directly into the buffer
+with recv_into and the packets are handed out as memoryview slices, so the data is not copied for each chunk.
+"""
+
+class ReceiveBuffer:
+    """Growable receive buffer of a connection. The data between start and end has been received and not yet been
+       consumed. When the free space at the end of the buffer is too small, the unconsumed data is moved to the
+       front of the buffer and only when that is not enough a larger buffer is created. When the buffer is empty
+       again, a buffer that has grown is replaced by a buffer of the initial size, so a connection does not keep the
+       memory of one large frame. The memoryview slices that are returned by consume are valid until data is added
+       to the buffer again.
+        size: (optional) The initial size of the buffer."""
+
+    def __init__(self, size=65536):
+        """Creates an empty receive buffer.
+            size: (optional) The initial size of the buffer."""
+        self.size = size
+        self.data = bytearray(size)
+        self.view = memoryview(self.data)
+        self.start = 0
+        self.end = 0
+
+        # Position from where the next find continues, so the buffer is not scanned twice
+        self.scan = 0
+
+        # Total bytes that have been moved or copied inside the buffer, used to benchmark the buffer
+        self.bytes_copied = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def reserve(self, size):
+        """Makes sure that at least size bytes are free at the end of the buffer."""
+        if len(self.data) - self.end >= size:
+            return
+
+        length = self.end - self.start
+        if length + size <= len(self.data) and length <= self.start: # Move the data to the front, it does not overlap
+            self.data[0:length] = self.view[self.start:self.end]
+
+        else:
+            capacity = len(self.data)
+            if length + size > capacity:
+                capacity = max(2 * capacity, length + size)
+
+            data = bytearray(capacity)
+            data[0:length] = self.view[self.start:self.end]
+            self.data = data
+            self.view = memoryview(self.data)
+
+        self.bytes_copied += length
+        self.scan -= self.start
+        self.start = 0
+        self.end = length
+
+    def recv_into(self, sock, size=65536):
+        """Receives data from the socket directly into the buffer. The free space at the end of the buffer is filled,
+           for example the space that is reserved for a large frame, and when the buffer is full at least size bytes
+           are reserved. Returns the number of bytes that have been received, 0 means that the connection has been
+           closed by the other side."""
+        if self.end == len(self.data):
+            self.reserve(size)
+
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def write(self, data):
+        """Adds the data to the buffer. Used when the data is not received from a socket directly."""
+        self.reserve(len(data))
+        self.data[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def find(self, sub):
+        """Returns the position of sub relative to the start of the unconsumed data or -1 when it is not found. The
+           data that has been scanned before is not scanned again."""
+        pos = self.data.find(sub, max(self.start, self.scan), self.end)
+        if pos == -1:
+            self.scan = max(self.start, self.end - len(sub) + 1)
+            return -1
+
+        return pos - self.start
+
+    def peek(self, size):
+        """Returns a memoryview of the first size bytes of the unconsumed data without consuming them."""
+        return self.view[self.start:self.start + size]
+
+    def consume(self, size):
+        """Consumes the first size bytes of the unconsumed data and returns them as memoryview."""
+        packet = self.view[self.start:self.start + size]
+        self.start += size
+
+        if self.start == self.end: # Empty, start at the front again without moving any data
+            self.start = 0
+            self.end = 0
+            self.scan = 0
+            if len(self.data) > self.size: # Release the memory of a large frame, the packet keeps its own view
+                self.data = bytearray(self.size)
+                self.view = memoryview(self.data)
+
+        self.scan = max(self.scan, self.start)
+        return packet
@@ -0,0 +1,172 @@
+import heapq
+import random
+import threading
+import time
+
+from p2pnetwork.peers import PeerSet
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The reconnect scheduler reconnects the node with the nodes that have been connected with reconnect=True, when their
+connection has been lost. The scheduler keeps a heap with the moment each node needs to be checked, so it only wakes
+up when there is something to do. When the node is not connected, the connection is made in the background, so the
+node keeps accepting connections and a host that does not respond does not delay the other reconnections. After each
+failed trial, the scheduler waits twice as long before it tries again (exponential backoff), with a random part
+(jitter) so nodes that lost their connections at the same moment do not all reconnect at the same moment.
+"""
+
+def backoff(trials, delay, max_delay, jitter):
+    """Returns the seconds to wait before the next trial after the given number of failed trials. The delay doubles
+       with each failed trial up to max_delay. A random part (jitter, fraction of the delay) is subtracted.
+        trials: The number of failed trials, 1 or more.
+        delay: Seconds to wait after the first failed trial.
+        max_delay: The maximum seconds to wait.
+        jitter: The fraction of the delay that is random, 0.0 (no jitter) - 1.0."""
+    seconds = min(max_delay, delay * (2 ** min(64, max(0, trials - 1))))
+    return seconds * (1.0 - jitter * random.random())
+
+
+class ReconnectScheduler(threading.Thread):
+    """Thread that checks whether the nodes in reconnect_to_nodes of the main node are still connected and reconnects
+       with them when they are not. Each entry in reconnect_to_nodes is a dict with the host, port and the number
+       of failed trials. Before each trial node_reconnection_error of the main node is invoked, which decides
+       whether the node tries to reconnect or removes the entry.
+        main_node: The Node that owns the scheduler."""
+
+    def __init__(self, main_node):
+        """Creates the scheduler of the given node. The scheduler is started by the node.
+            main_node: The Node that owns the scheduler."""
+        super(ReconnectScheduler, self).__init__(daemon=True)
+        self.main_node = main_node
+
+        # Seconds between the checks whether a connected node is still connected
+        self.check_interval = 1.0
+
+        # Backoff: seconds to wait after the first failed trial, the maximum seconds to wait and the random part
+        self.delay = 1.0
+        self.max_delay = 60.0
+        self.jitter = 0.5
+
+        # The heap with (due, sequence, entry) and the entries by address. An entry is only checked when the due
+        # moment in the heap is the due moment of the entry, so rescheduling an entry does not need to search the heap.
+        self.heap = []
+        self.sequence = 0
+        self.entries = {}
+        self.condition = threading.Condition()
+
+        self.terminate_flag = threading.Event()
+
+    def add(self, host, port):
+        """Adds the node with the given host and port to reconnect_to_nodes of the main node, if it is not added
+           already, and returns its entry."""
+        with self.condition:
+            address = PeerSet.address(host, port)
+            if address in self.entries:
+                return self.entries[address]
+
+            entry = {"host": host, "port": port, "trials": 0, "due": None}
+            self.entries[address] = entry
+            self.main_node.reconnect_to_nodes.append(entry)
+            self.schedule(entry, self.check_interval)
+
+            return entry
+
+    def remove(self, entry):
+        """Removes the entry from reconnect_to_nodes of the main node, so the node is not reconnected anymore."""
+        with self.condition:
+            self.entries.pop(PeerSet.address(entry["host"], entry["port"]), None)
+            entry["due"] = None
+            if entry in self.main_node.reconnect_to_nodes:
+                self.main_node.reconnect_to_nodes.remove(entry)
+
+    def schedule(self, entry, seconds):
+        """Schedules the check of the entry after the given seconds."""
+        with self.condition:
+            if PeerSet.address(entry["host"], entry["port"]) not in self.entries:
+                return
+
+            entry["due"] = time.monotonic() + seconds
+            self.sequence += 1
+            heapq.heappush(self.heap, (entry["due"], self.sequence, entry))
+            self.condition.notify()
+
+    def check_now(self):
+        """Schedules the check of all the entries that are not reconnecting at this moment."""
+        with self.condition:
+            for entry in list(self.entries.values()):
+                if entry["due"] is not None:
+                    self.schedule(entry, 0.0)
+
+    def next_entry(self):
+        """Waits until an entry needs to be checked and returns it, or returns None when the scheduler stops."""
+        with self.condition:
+            while not self.terminate_flag.is_set():
+                if len(self.heap) == 0:
+                    self.condition.wait()
+                    continue
+
+                (due, sequence, entry) = self.heap[0]
+                if due != entry["due"]: # Rescheduled or removed
+                    heapq.heappop(self.heap)
+                    continue
+
+                now = time.monotonic()
+                if due > now:
+                    self.condition.wait(due - now)
+                    continue
+
+                heapq.heappop(self.heap)
+                entry["due"] = None
+                return entry
+
+        return None
+
+    def check(self, entry):
+        """Checks whether the node of the entry is connected. When it is not connected, the node reconnects in the
+           background when node_reconnection_error allows it."""
+        host = entry["host"]
+        port = entry["port"]
+
+        if self.main_node.nodes_outbound.find(host, port) is not None:
+            entry["trials"] = 0 # Reset the trials
+            self.schedule(entry, self.check_interval)
+            return
+
+        entry["trials"] += 1
+        if self.main_node.node_reconnection_error(host, port, entry["trials"]):
+            threading.Thread(target=self.reconnect, args=(entry,), daemon=True).start()
+
+        else:
+            self.main_node.debug_print("reconnect_nodes: Removing node (" + host + ":" + str(port) + ") from the reconnection list!")
+            self.remove(entry)
+
+    def reconnect(self, entry):
+        """Reconnects with the node of the entry and schedules the next check."""
+        self.main_node.debug_print("reconnect_nodes: Reconnecting with node " + entry["host"] + ":" + str(entry["port"]) + " (trials: " + str(entry["trials"]) + ")")
+        if self.main_node.connect_with_node(entry["host"], entry["port"]) and self.main_node.nodes_outbound.find(entry["host"], entry["port"]) is not None:
+            self.schedule(entry, self.check_interval)
+
+        else:
+            self.schedule(entry, backoff(entry["trials"], self.delay, self.max_delay, self.jitter))
+
+    def stop(self):
+        """Stops the scheduler."""
+        self.terminate_flag.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def run(self):
+        """The main loop of the scheduler. It runs until the scheduler is stopped."""
+        while not self.terminate_flag.is_set():
+            entry = self.next_entry()
+            if entry is not None and not self.main_node.terminate_flag.is_set():
+                try:
+                    self.check(entry)
+
+                except Exception as e:
+                    self.main_node.debug_print("ReconnectScheduler: Exception while checking " + entry["host"] + ":" + str(entry["port"]) + ": " + str(e))
+                    self.schedule(entry, backoff(max(1, entry["trials"]), self.delay, self.max_delay, self.jitter))
@@ -0,0 +1,199 @@
+import os
+import struct
+import secrets
+
+try:
+    from multiprocessing import shared_memory # Python 3.8 and later
+except ImportError:
+    shared_memory = None
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+Nodes on the same host are able to send their frames through a ring buffer in shared memory instead of the socket of
+the connection. Each node creates the ring buffer that it reads from and the other node writes its frames into it,
+so a frame is copied once: from the data of the sending node into the shared memory. The receiving node decodes the
+frame directly from the shared memory. There is one writer and one reader for each ring buffer, so there are no
+locks. The socket of the connection is used to signal that frames have been written, see NodeConnection.packet_buffers.
+"""
+
+# Header of the shared memory: the position (total bytes) up to which the reader has read the ring and the capacity
+HEADER = struct.Struct('=QQ')
+
+# Each frame in the ring is preceded by its length. The length WRAP means that the frame starts at the beginning
+# of the ring, because it did not fit at the end. The records are aligned, so the length never wraps.
+RECORD = struct.Struct('=I')
+WRAP = 0xffffffff
+ALIGNMENT = 8
+
+# The name of each ring buffer is PREFIX followed by a random nonce of NONCE_SIZE bytes in hex. Only the nonce is sent
+# to the other node, which attaches the ring buffer by PREFIX and the nonce, so a node never attaches shared memory
+# that has not been created by a ring buffer, see valid_name.
+PREFIX = "p2pnet_"
+NONCE_SIZE = 16
+
+# The names of the shared memory that has been created by this process
+created = set()
+
+
+def available():
+    """Returns whether shared memory is supported by this python version."""
+    return shared_memory is not None
+
+
+def valid_name(name):
+    """Returns whether the name is the name of a ring buffer: PREFIX followed by a nonce of NONCE_SIZE bytes in hex."""
+    nonce = name[len(PREFIX):]
+    return name.startswith(PREFIX) and len(nonce) == 2 * NONCE_SIZE and all(c in "0123456789abcdef" for c in nonce)
+
+
+def attach(name):
+    """Returns the shared memory with the given name that has been created by another node. The shared memory is
+       removed by the node that created it, so it is not tracked by this process."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13 and later
+
+    except TypeError:
+        pass
+
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix" and name not in created:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+
+    return shm
+
+
+class RingBuffer:
+    """Ring buffer in shared memory that holds frames. The node that reads the frames creates the ring buffer with
+       the given size and sends its nonce and capacity to the other node, which attaches the ring buffer by its name
+       and writes the frames. The frames are read in the order in which they have been written.
+        size: (optional) The capacity in bytes of a new ring buffer.
+        name: (optional) The name of the ring buffer of another node to attach.
+        capacity: (optional) The capacity that the ring buffer to attach should have."""
+
+    def __init__(self, size=None, name=None, capacity=None):
+        """Creates a new ring buffer of the given size or attaches the ring buffer with the given name. Raises
+           OSError when shared memory is not supported or the ring buffer does not exist and ValueError when the
+           name is not the name of a ring buffer (see valid_name) or its size does not match the capacity.
+            size: (optional) The capacity in bytes of a new ring buffer.
+            name: (optional) The name of the ring buffer of another node to attach.
+            capacity: (optional) The capacity that the ring buffer to attach should have."""
+        if shared_memory is None:
+            raise OSError("Shared memory is not supported by this python version")
+
+        if name is None:
+            capacity = max(ALIGNMENT, size - size % ALIGNMENT)
+            self.shm = None
+            while self.shm is None:
+                try:
+                    self.shm = shared_memory.SharedMemory(name=PREFIX + secrets.token_hex(NONCE_SIZE), create=True, size=HEADER.size + capacity)
+
+                except FileExistsError: # Another nonce
+                    pass
+
+            created.add(self.shm.name)
+            HEADER.pack_into(self.shm.buf, 0, 0, capacity)
+            self.owner = True
+
+        else:
+            if not valid_name(name):
+                raise ValueError("The shared memory " + name + " is not a ring buffer")
+
+            self.shm = attach(name)
+            self.owner = False
+            if self.shm.size < HEADER.size:
+                self.shm.close()
+                raise ValueError("The shared memory " + name + " is too small for a ring buffer")
+
+        self.name = self.shm.name
+        self.nonce = self.name[len(PREFIX):]
+        self.buf = self.shm.buf
+        self.capacity = HEADER.unpack_from(self.buf, 0)[1]
+
+        # The header is written by the other node, so its capacity is only used when the shared memory holds it
+        if HEADER.size + self.capacity > self.shm.size or (capacity is not None and self.capacity != capacity):
+            self.close()
+            raise ValueError("The size of the shared memory " + self.name + " does not match the capacity")
+
+        # The position (total bytes) of the writer or the reader, the reader shares it with the writer by consume
+        self.position = 0
+
+    def write(self, buffers):
+        """Writes the buffers after each other as one frame in the ring. Returns False when the ring does not have
+           enough free space, so the frame has to be sent in another way."""
+        size = sum(len(buffer) for buffer in buffers)
+        record = RECORD.size + size
+        record += -record % ALIGNMENT
+
+        offset = self.position % self.capacity
+        skip = 0
+        if offset + record > self.capacity: # Does not fit at the end, the frame starts at the beginning of the ring
+            skip = self.capacity - offset
+
+        read = HEADER.unpack_from(self.buf, 0)[0]
+        if skip + record > self.capacity - (self.position - read):
+            return False
+
+        if skip > 0:
+            RECORD.pack_into(self.buf, HEADER.size + offset, WRAP)
+            self.position += skip
+            offset = 0
+
+        i = HEADER.size + offset
+        RECORD.pack_into(self.buf, i, size)
+        i += RECORD.size
+        for buffer in buffers:
+            self.buf[i:i + len(buffer)] = buffer
+            i += len(buffer)
+
+        self.position += record
+        return True
+
+    def read(self):
+        """Returns the next frame as a memoryview of the shared memory. Release the memoryview and invoke consume
+           when the frame has been processed, so the writer is able to reuse its space. Only read a frame when the
+           writer has signalled that it has been written. Raises ValueError when the record does not fit in the ring
+           buffer, so the shared memory has been corrupted."""
+        offset = self.position % self.capacity
+        if offset + RECORD.size > self.capacity:
+            raise ValueError("The position of the ring buffer is corrupt")
+
+        size = RECORD.unpack_from(self.buf, HEADER.size + offset)[0]
+        if size == WRAP:
+            self.position += self.capacity - offset
+            offset = 0
+            size = RECORD.unpack_from(self.buf, HEADER.size)[0]
+
+        if size > self.capacity - offset - RECORD.size:
+            raise ValueError("The record of " + str(size) + " bytes does not fit in the ring buffer")
+
+        record = RECORD.size + size
+        self.position += record + (-record % ALIGNMENT)
+
+        start = HEADER.size + offset + RECORD.size
+        return self.buf[start:start + size]
+
+    def consume(self):
+        """Shares the position of the reader with the writer, so the space of the frames that have been read is free."""
+        HEADER.pack_into(self.buf, 0, self.position, self.capacity)
+
+    def close(self):
+        """Closes the ring buffer. The node that created the ring buffer removes it."""
+        try:
+            self.buf = None
+            self.shm.close()
+
+        except BufferError: # A frame is still in use, the memory is released when it is not used anymore
+            pass
+
+        if self.owner:
+            created.discard(self.name)
+            try:
+                self.shm.unlink()
+
+            except FileNotFoundError:
+                pass
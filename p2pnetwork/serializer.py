@@ -0,0 +1,143 @@
+import json
+
+from p2pnetwork import protocol
+
+try:
+    import msgpack # Optional, the compact binary serializer is only available when msgpack is installed
+except ImportError:
+    msgpack = None
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The serializers convert the data that is sent into the payload of a frame and back. The type of the frame holds
+the serializer that has been used, so the receiving node directly uses the right serializer without trying to
+decode the payload. The nodes exchange the serializers they support when they connect, so the sending node only uses
+serializers that the other node supports. Your own serializers can be added by register. The types 0x00 - 0x7f are
+used by the package, use the types 0x80 - 0xff for your own serializers.
+"""
+
+# The serializers by name and by the type of the frame
+serializers = {}
+types = {}
+
+# The serializers that are known by each node, including the legacy nodes that use EOT framing
+LEGACY = ['json', 'str', 'bytes']
+
+
+class Serializer:
+    """Base class of a serializer. A serializer has a unique name and type and converts the data of the python types
+       it accepts into bytes and back. Extend this class to create your own serializer and register it."""
+
+    # Name of the serializer that is exchanged when the nodes connect
+    name = None
+
+    # Type of the frame that holds a payload of this serializer
+    type = None
+
+    # The python types that are serialized by this serializer
+    accepted_types = ()
+
+    def accepts(self, data):
+        """Returns whether the data is serialized by this serializer."""
+        return isinstance(data, self.accepted_types)
+
+    def encode(self, data, encoding_type='utf-8'):
+        """Returns the data as bytes. Raises TypeError or ValueError when the data cannot be serialized."""
+        raise NotImplementedError
+
+    def decode(self, payload):
+        """Returns the data of the payload, which is a bytes-like object like a memoryview of the receive buffer."""
+        raise NotImplementedError
+
+
+class BytesSerializer(Serializer):
+    """Sends bytes as they are."""
+    name = 'bytes'
+    type = protocol.TYPE_BYTES
+    accepted_types = (bytes, bytearray)
+
+    def encode(self, data, encoding_type='utf-8'):
+        return bytes(data)
+
+    def decode(self, payload):
+        return bytes(payload)
+
+
+class StrSerializer(Serializer):
+    """Sends text (str) encoded with utf-8."""
+    name = 'str'
+    type = protocol.TYPE_STR
+    accepted_types = (str,)
+
+    def encode(self, data, encoding_type='utf-8'):
+        return data.encode(encoding_type)
+
+    def decode(self, payload):
+        return str(payload, 'utf-8')
+
+
+class JsonSerializer(Serializer):
+    """Sends a dict as json."""
+    name = 'json'
+    type = protocol.TYPE_JSON
+    accepted_types = (dict,)
+
+    def encode(self, data, encoding_type='utf-8'):
+        return json.dumps(data).encode(encoding_type)
+
+    def decode(self, payload):
+        return json.loads(str(payload, 'utf-8'))
+
+
+class MsgpackSerializer(Serializer):
+    """Sends a dict in the compact binary format of msgpack, which is smaller and faster than json. The result is not
+       the same as with json: the keys that are not strings are not converted to strings and bytes are sent as they
+       are, so it is only used when it is placed before json in the serializers of the node."""
+    name = 'msgpack'
+    type = protocol.TYPE_MSGPACK
+    accepted_types = (dict,)
+
+    def encode(self, data, encoding_type='utf-8'):
+        return msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, payload):
+        return msgpack.unpackb(payload, raw=False)
+
+
+def register(serializer):
+    """Registers the serializer, so nodes are able to use it. Replaces the serializer with the same name. To send
+       data with it, the serializer must be in the serializers of the node, before the other serializers that accept
+       the same data."""
+    if serializer.name in serializers:
+        del types[serializers[serializer.name].type]
+
+    serializers[serializer.name] = serializer
+    types[serializer.type] = serializer
+
+
+def get(name):
+    """Returns the serializer with the given name or None when it does not exist."""
+    return serializers.get(name)
+
+
+def get_type(type):
+    """Returns the serializer of the given type of frame or None when it does not exist."""
+    return types.get(type)
+
+
+def names():
+    """Returns the names of all the serializers in the order in which they have been registered, the preferred first."""
+    return list(serializers.keys())
+
+
+register(JsonSerializer())
+register(StrSerializer())
+register(BytesSerializer())
+
+# msgpack is supported, but opt-in: json stays the preferred serializer of a dict, see MsgpackSerializer
+if msgpack != None:
+    register(MsgpackSerializer())
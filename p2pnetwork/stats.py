@@ -0,0 +1,82 @@
+import threading
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The statistics of the nodes and the node connections. Each node connection counts the messages and bytes that it
+sends and receives. The counters of a connection are added to the counters of its node as well, so the node holds
+the totals of all the connections, also of the connections that have been closed.
+"""
+
+# The counters that are held by the statistics
+COUNTERS = [
+    "messages_sent",     # Messages that have been queued to be sent
+    "messages_received", # Messages that have been received
+    "messages_dropped",  # Messages that have been dropped, because the send queue was full
+    "bytes_sent",        # Bytes that have been written to the sockets
+    "bytes_received",    # Bytes of the messages that have been received, including the framing
+    "bytes_raw",         # Bytes of the messages that have been compressed, before the compression
+    "bytes_compressed",  # Bytes of the messages that have been compressed, after the compression
+    "send_errors",       # Failures when sending data
+    "receive_errors",    # Messages that could not be decoded
+    "datagrams_sent",    # Messages that have been sent as datagram, see Node.send_to_node
+    "datagrams_received",# Datagrams that have been received and delivered
+    "datagrams_dropped", # Datagrams that have been dropped: stale, unknown or could not be sent
+    "connects",          # Nodes that have been connected
+    "disconnects"        # Nodes that have been disconnected
+]
+
+
+class Stats:
+    """Thread-safe counters of a node or a node connection. The counters are changed by the threads that send and
+       receive the data, the snapshot returns all the counters at the same moment. When a parent is given, each
+       change is added to the counters of the parent as well.
+        parent: (optional) The Stats that holds the totals, for example the Stats of the node."""
+
+    def __init__(self, parent=None):
+        """Creates the counters, which all start at zero.
+            parent: (optional) The Stats that holds the totals, for example the Stats of the node."""
+        self.parent = parent
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.lock = threading.Lock()
+
+    def add(self, name, value=1):
+        """Adds the value to the counter with the given name."""
+        with self.lock:
+            self.counters[name] += value
+
+        if self.parent is not None:
+            self.parent.add(name, value)
+
+    def update(self, counters):
+        """Adds the values of the dict counters to the counters with the same names at once."""
+        with self.lock:
+            for (name, value) in counters.items():
+                self.counters[name] += value
+
+        if self.parent is not None:
+            self.parent.update(counters)
+
+    def get(self, name):
+        """Returns the value of the counter with the given name."""
+        return self.counters[name]
+
+    def set(self, name, value=0):
+        """Sets the counter with the given name to the value, by default it is reset. The parent is not changed."""
+        with self.lock:
+            self.counters[name] = value
+
+    def snapshot(self):
+        """Returns a copy (dict) of all the counters that is taken at one moment, so the counters are consistent
+           with each other."""
+        with self.lock:
+            return dict(self.counters)
+
+    def __str__(self):
+        return 'Stats: ' + str(self.snapshot())
+
+    def __repr__(self):
+        return '<Stats ' + str(self.snapshot()) + '>'
@@ -0,0 +1,49 @@
+import threading
+
+from p2pnetwork.node import Node
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+The nodes that are shared by the tests.
+"""
+
+class EventNode (Node):
+    """Node that records the messages and signals the events, so the tests do not need to sleep."""
+
+    def __init__(self, host, port, id, **kwargs):
+        super(EventNode, self).__init__(host, port, id=id, max_connections=10, **kwargs)
+        self.messages = []
+        self.gossip_messages = []
+        self.connected = threading.Event()
+        self.disconnected = threading.Event()
+        self.received = threading.Event()
+
+    def inbound_node_connected(self, node):
+        self.connected.set()
+
+    def inbound_node_disconnected(self, node):
+        self.disconnected.set()
+
+    def outbound_node_disconnected(self, node):
+        self.disconnected.set()
+
+    def node_message(self, node, data):
+        self.messages.append((node.id, data))
+        self.received.set()
+
+    def node_gossip_message(self, node, data):
+        self.gossip_messages.append(data)
+        self.received.set()
+
+    def wait_messages(self, count):
+        """Waits at most 5 seconds until count messages have been received."""
+        for i in range(0, 50):
+            if len(self.messages) >= count:
+                return True
+
+            self.received.wait(0.1)
+            self.received.clear()
+
+        return len(self.messages) >= count
@@ -0,0 +1,259 @@
+import os
+import tempfile
+import unittest
+import asyncio
+
+from p2pnetwork.node import Node
+from p2pnetwork.asyncnode import AsyncNode
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the AsyncNode on its basic functionality, like connecting to other nodes and
+sending data around. The AsyncNode should also be able to talk with the threaded Node.
+"""
+
+class TestAsyncNode(unittest.TestCase):
+    """Testing the AsyncNode class."""
+
+    def test_async_node_communication(self):
+        """Test whether two AsyncNode instances are able to connect and send messages to each other."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event != "node_request_to_stop":
+                message.append(event + ":" + main_node.id + ":" + connected_node.id + ":" + str(data))
+
+        async def scenario():
+            node1 = AsyncNode(host="127.0.0.1", port=10001, id="node1", callback=node_callback)
+            node2 = AsyncNode(host="127.0.0.1", port=10002, id="node2", callback=node_callback)
+
+            await node1.start()
+            await node2.start()
+
+            connected = await node1.connect_with_node("127.0.0.1", 10002)
+            await asyncio.sleep(0.5)
+
+            step_1 = (len(node1.nodes_outbound), len(node2.nodes_inbound))
+
+            node1.send_to_nodes("Hi from node 1!")
+            node1.send_to_nodes({"key": "value"}, compression='zlib')
+            await node1.drain()
+            await asyncio.sleep(0.5)
+
+            node2.send_to_nodes("Hi from node 2!")
+            await asyncio.sleep(0.5)
+
+            await node1.stop()
+            await node2.stop()
+            await asyncio.sleep(0.5)
+
+            return connected, step_1
+
+        connected, step_1 = asyncio.run(scenario())
+
+        self.assertTrue(connected, "Node 1 should be connected with node 2.")
+        self.assertEqual(step_1, (1, 1), "Node 1 should have one outbound and node 2 one inbound connection.")
+
+        self.assertIn("outbound_node_connected:node1:node2:{}", message)
+        self.assertIn("inbound_node_connected:node2:node1:{}", message)
+        self.assertIn("node_message:node2:node1:Hi from node 1!", message)
+        self.assertIn("node_message:node2:node1:{'key': 'value'}", message)
+        self.assertIn("node_message:node1:node2:Hi from node 2!", message)
+        self.assertIn("outbound_node_disconnected:node1:node2:{}", message)
+        self.assertIn("inbound_node_disconnected:node2:node1:{}", message)
+
+    def test_async_node_with_node(self):
+        """Test whether an AsyncNode is able to communicate with a threaded Node."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append(main_node.id + ":" + connected_node.id + ":" + str(data))
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback)
+        node1.start()
+
+        async def scenario():
+            node2 = AsyncNode(host="127.0.0.1", port=10002, id="node2", callback=node_callback)
+            await node2.start()
+
+            await asyncio.get_event_loop().run_in_executor(None, node1.connect_with_node, "127.0.0.1", 10002)
+            await asyncio.sleep(0.5)
+
+            node1.send_to_nodes("Hi from node 1!", compression='lzma')
+            await asyncio.sleep(0.5)
+
+            node2.send_to_nodes({"from": "node 2"})
+            await asyncio.sleep(0.5)
+
+            await node2.stop()
+
+        asyncio.run(scenario())
+
+        node1.stop()
+        node1.join()
+
+        self.assertIn("node2:node1:Hi from node 1!", message, "The message is not correctly received by the AsyncNode")
+        self.assertIn("node1:node2:{'from': 'node 2'}", message, "The message is not correctly received by the Node")
+
+    def test_async_node_zlib_stream(self):
+        """Test whether an AsyncNode and a threaded Node are able to send messages with zlib-stream to each other."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append(main_node.id + ":" + connected_node.id + ":" + str(data))
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback)
+        node1.start()
+
+        async def scenario():
+            node2 = AsyncNode(host="127.0.0.1", port=10002, id="node2", callback=node_callback)
+            await node2.start()
+
+            await asyncio.get_event_loop().run_in_executor(None, node1.connect_with_node, "127.0.0.1", 10002)
+            await asyncio.sleep(0.5)
+
+            for i in range(3):
+                node1.send_to_nodes("Hi " + str(i) + " from node 1!", compression='zlib-stream')
+                node2.send_to_nodes("Hi " + str(i) + " from node 2!", compression='zlib-stream')
+            await node2.drain()
+            await asyncio.sleep(0.5)
+
+            connected = len(node2.nodes_inbound)
+            await node2.stop()
+
+            return connected
+
+        connected = asyncio.run(scenario())
+
+        node1.stop()
+        node1.join()
+
+        self.assertEqual(connected, 1, "The connection should not be closed by sending with zlib-stream.")
+        for i in range(3):
+            self.assertIn("node2:node1:Hi " + str(i) + " from node 1!", message, "The message is not correctly received by the AsyncNode")
+            self.assertIn("node1:node2:Hi " + str(i) + " from node 2!", message, "The message is not correctly received by the Node")
+
+    def test_async_node_with_unix_node(self):
+        """Test whether an AsyncNode connects with a threaded Node that listens on a Unix domain socket as well, in
+           both directions, and remembers the path of its Unix domain socket."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append(main_node.id + ":" + connected_node.id + ":" + str(data))
+
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "node1.sock")
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback, unix_path=path)
+        node1.start()
+
+        async def scenario():
+            node2 = AsyncNode(host="127.0.0.1", port=10002, id="node2", callback=node_callback)
+            node3 = AsyncNode(host="127.0.0.1", port=10003, id="node3", callback=node_callback)
+            await node2.start()
+            await node3.start()
+
+            inbound = await asyncio.get_event_loop().run_in_executor(None, node1.connect_with_node, "127.0.0.1", 10002)
+            outbound = await node3.connect_with_node("127.0.0.1", 10001)
+            await asyncio.sleep(0.5)
+
+            node2.send_to_nodes("Hi from node 2!")
+            node3.send_to_nodes("Hi from node 3!")
+            await asyncio.sleep(0.5)
+
+            connected = (len(node2.nodes_inbound), len(node3.nodes_outbound))
+            unix_paths = (node2.unix_paths, node3.unix_paths)
+            await node2.stop()
+            await node3.stop()
+
+            return inbound, outbound, connected, unix_paths
+
+        (inbound, outbound, connected, unix_paths) = asyncio.run(scenario())
+
+        node1.stop()
+        node1.join()
+        directory.cleanup()
+
+        self.assertTrue(inbound, "Node 1 should be connected with node 2.")
+        self.assertTrue(outbound, "Node 3 should be connected with node 1.")
+        self.assertEqual(connected, (1, 1), "The connections with node 1 should not be closed.")
+        self.assertEqual(unix_paths[0], {("127.0.0.1", "10001"): os.path.abspath(path)}, "Node 2 should remember the Unix domain socket of node 1.")
+        self.assertEqual(unix_paths[1], {("127.0.0.1", "10001"): os.path.abspath(path)}, "Node 3 should remember the Unix domain socket of node 1.")
+        self.assertIn("node1:node2:Hi from node 2!", message, "The message is not correctly received by the Node")
+        self.assertIn("node1:node3:Hi from node 3!", message, "The message is not correctly received by the Node")
+
+    def test_async_node_connect_many(self):
+        """Test whether an AsyncNode connects with many nodes at the same time."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "outbound_node_connected":
+                message.append(main_node.id + ":" + connected_node.id)
+
+        async def scenario():
+            node1 = AsyncNode(host="127.0.0.1", port=10001, id="node1", callback=node_callback)
+            node2 = AsyncNode(host="127.0.0.1", port=10002, id="node2")
+            node3 = AsyncNode(host="127.0.0.1", port=10003, id="node3")
+            await node1.start()
+            await node2.start()
+            await node3.start()
+
+            results = await node1.connect_many([("127.0.0.1", 10002), ("127.0.0.1", 10003), ("127.0.0.1", 10009)], timeout=2.0, concurrency=2)
+            await asyncio.sleep(0.5)
+
+            await node1.stop()
+            await node2.stop()
+            await node3.stop()
+
+            return results
+
+        results = asyncio.run(scenario())
+
+        self.assertEqual(results, {("127.0.0.1", 10002): True, ("127.0.0.1", 10003): True, ("127.0.0.1", 10009): False}, "Node 1 should only be connected with node 2 and node 3.")
+        self.assertIn("node1:node2", message, "The event outbound_node_connected should be invoked for node 2.")
+        self.assertIn("node1:node3", message, "The event outbound_node_connected should be invoked for node 3.")
+
+    def test_async_node_failing_handler(self):
+        """Test whether the connection is closed and the nodes are informed when the node_message handler raises."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                raise ValueError("The handler fails")
+
+            if event != "node_request_to_stop":
+                message.append(event + ":" + main_node.id + ":" + connected_node.id)
+
+        async def scenario():
+            node1 = AsyncNode(host="127.0.0.1", port=10001, id="node1", callback=node_callback)
+            node2 = AsyncNode(host="127.0.0.1", port=10002, id="node2", callback=node_callback)
+            await node1.start()
+            await node2.start()
+
+            await node1.connect_with_node("127.0.0.1", 10002)
+            await asyncio.sleep(0.5)
+
+            node1.send_to_nodes("Hi from node 1!")
+            await asyncio.sleep(0.5)
+
+            connections = (len(node1.nodes_outbound), len(node2.nodes_inbound))
+            receive_errors = node2.get_stats()["receive_errors"]
+
+            await node1.stop()
+            await node2.stop()
+
+            return connections, receive_errors
+
+        (connections, receive_errors) = asyncio.run(scenario())
+
+        self.assertEqual(connections, (0, 0), "The connection should be closed at both sides.")
+        self.assertEqual(receive_errors, 1, "The failing handler should be counted as receive error.")
+        self.assertIn("inbound_node_disconnected:node2:node1", message, "Node 2 should invoke inbound_node_disconnected.")
+        self.assertIn("outbound_node_disconnected:node1:node2", message, "Node 1 should invoke outbound_node_disconnected.")
+
+if __name__ == '__main__':
+    unittest.main()
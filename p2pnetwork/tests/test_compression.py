@@ -0,0 +1,201 @@
+import unittest
+import time
+import os
+import socket
+import threading
+
+from p2pnetwork import protocol
+from p2pnetwork.compression import CompressionPolicy
+from p2pnetwork.node import Node
+from p2pnetwork.nodeconnection import NodeConnection
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the compression policy that chooses the compression when compression='auto' is used and the zlib
+streams of the connections.
+"""
+
+class Connection:
+    """Stands in for a node connection, the policy only uses the id and the framing."""
+
+    def __init__(self, id, framing='length'):
+        self.id = id
+        self.framing = framing
+
+
+class TestCompression(unittest.TestCase):
+    """Testing the compression policy."""
+
+    def test_policy(self):
+        """Test whether the policy skips small payloads and compresses only when it saves time."""
+        policy = CompressionPolicy()
+        slow = Connection("slow")
+        fast = Connection("fast")
+        policy.throughputs["slow"] = 100000.0 # 100 KB/s
+        policy.throughputs["fast"] = 10000000000.0 # 10 GB/s
+
+        text = ("The quick brown fox jumps over the lazy dog. " * 1000).encode('utf-8')
+        random = os.urandom(100000)
+
+        self.assertEqual(policy.choose(slow, protocol.TYPE_STR, b'small message'), 'none', "Small payloads should not be compressed.")
+        self.assertNotEqual(policy.choose(slow, protocol.TYPE_STR, text), 'none', "Text should be compressed on a slow connection.")
+        self.assertEqual(policy.choose(fast, protocol.TYPE_STR, text), 'none', "Compression does not pay off on a fast connection.")
+        self.assertEqual(policy.choose(slow, protocol.TYPE_BYTES, random), 'none', "Random data should not be compressed.")
+
+        policy.update_throughput(fast, 1000000, 1.0)
+        self.assertLess(policy.throughputs["fast"], 10000000000.0, "The throughput is not updated.")
+
+        policy.remove("slow")
+        self.assertNotIn("slow", policy.throughputs, "The throughput of a removed peer should be dropped.")
+        self.assertEqual([key[0] for key in policy.stats], ["fast"], "The measurements of a removed peer should be dropped.")
+
+    def test_auto_compression(self):
+        """Test whether messages that are sent with compression='auto' are received correctly."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append(data)
+
+        node1 = Node(host="127.0.0.1", port=10001, callback=node_callback)
+        node2 = Node(host="127.0.0.1", port=10002, callback=node_callback)
+        node1.compression_policy.throughput = 100000.0 # Compress until the throughput has been measured
+
+        node1.start()
+        node2.start()
+        node1.connect_with_node("127.0.0.1", 10002)
+        time.sleep(1)
+
+        data = {"text": "The quick brown fox jumps over the lazy dog. " * 1000}
+        node1.send_to_nodes("Hi there!", compression='auto')
+        node1.send_to_nodes(data, compression='auto')
+        time.sleep(1)
+        measured = len(node1.compression_policy.stats) > 0
+
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+
+        self.assertEqual(message, ["Hi there!", data], "The messages are not correctly received.")
+        self.assertTrue(measured, "The codecs should have been measured.")
+        self.assertEqual(node1.compression_policy.stats, {}, "The measurements should be dropped when the node disconnects.")
+
+    def test_zlib_stream(self):
+        """Test whether the zlib stream of a connection compresses small repetitive messages better than zlib."""
+        node = Node(host="127.0.0.1", port=10001)
+        node.sock.close()
+
+        sender = NodeConnection(node, socket.socket(), "receiver", "127.0.0.1", 10002)
+        receiver = NodeConnection(node, socket.socket(), "sender", "127.0.0.1", 10003)
+        sender.framing = 'length'
+        receiver.framing = 'length'
+
+        size_zlib = 0
+        size_stream = 0
+        for i in range(100):
+            data = {"type": "heartbeat", "node": "node1", "sequence": i, "state": "running"}
+            size_zlib += len(sender.create_packet(data, compression='zlib'))
+            packet = sender.create_packet(data, compression='zlib-stream')
+            size_stream += len(packet)
+
+            decoder = protocol.FrameDecoder()
+            for (flags, type, payload) in decoder.feed(packet):
+                self.assertEqual(receiver.parse_frame(flags, type, payload), data, "The message is not correctly decompressed.")
+
+        sender.sock.close()
+        receiver.sock.close()
+
+        self.assertLess(size_stream * 2, size_zlib, "The zlib stream should compress much better.")
+
+    def test_zlib_stream_dropped_packet(self):
+        """Test whether a zlib-stream packet that is dropped does not corrupt the messages that are sent after it."""
+        node = Node(host="127.0.0.1", port=10001)
+        node.sock.close()
+        node.backpressure = 'drop'
+        node.send_queue_size = 1
+
+        sender = NodeConnection(node, socket.socket(), "receiver", "127.0.0.1", 10002)
+        receiver = NodeConnection(node, socket.socket(), "sender", "127.0.0.1", 10003)
+        sender.framing = 'length'
+        receiver.framing = 'length'
+        sender.max_frame_size = 1000
+        sender.writer = threading.Thread() # Not started, so the queued packets stay in the send queue
+
+        received = []
+        decoder = protocol.FrameDecoder()
+
+        def receive():
+            for (flags, type, payload) in decoder.feed(b''.join(sender.send_queue.get_nowait())):
+                received.append(receiver.parse_frame(flags, type, payload))
+
+        sender.send("message 1", compression='zlib-stream')
+        sender.send("message 2", compression='zlib-stream') # Dropped, the queue is full
+        receive()
+        sender.send(os.urandom(2000), compression='zlib-stream') # Dropped, larger than the maximum frame size
+        sender.send("message 3", compression='zlib-stream')
+        receive()
+
+        sender.sock.close()
+        receiver.sock.close()
+
+        self.assertEqual(received, ["message 1", "message 3"], "The message after the dropped packets should be intact.")
+        self.assertEqual(sender.stats.get("messages_dropped"), 1, "The packet should be dropped by the full queue.")
+
+    def test_corrupt_payload(self):
+        """Test whether a payload that cannot be decompressed is dropped and counted once."""
+        messages = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                messages.append(data)
+
+        node = Node(host="127.0.0.1", port=10001, callback=node_callback)
+        node.sock.close()
+
+        connection = NodeConnection(node, socket.socket(), "sender", "127.0.0.1", 10002)
+        connection.framing = 'length'
+        connection.receive_data(protocol.create_frame(b'\x01not zlib at all', protocol.FLAG_COMPRESSED, protocol.TYPE_BYTES))
+        connection.receive_data(protocol.create_frame(b'Hi there!', 0, protocol.TYPE_BYTES))
+
+        connection.framing = 'eot'
+        connection.receive_data(b'bm90IHpsaWIgYXQgYWxsemxpYg==' + connection.COMPR_CHAR + connection.EOT_CHAR)
+        connection.sock.close()
+
+        self.assertEqual(messages, [b'Hi there!'], "The corrupt payloads should not be delivered.")
+        self.assertEqual(connection.stats.get("receive_errors"), 2, "Each corrupt payload should be counted once.")
+
+    def test_zlib_stream_nodes(self):
+        """Test whether the messages that are sent with zlib-stream are received correctly in order."""
+        message = {"node1": [], "node2": []}
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message[main_node.id].append(data)
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback, reactor=True)
+        node2 = Node(host="127.0.0.1", port=10002, id="node2", callback=node_callback)
+
+        node1.start()
+        node2.start()
+        node1.connect_with_node("127.0.0.1", 10002)
+        time.sleep(1)
+
+        data = [{"sequence": i, "state": "running"} for i in range(50)]
+        for d in data:
+            node1.send_to_nodes(d, compression='zlib-stream')
+        node2.send_to_nodes("Hi node 1!", compression='zlib-stream')
+        time.sleep(1)
+
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+
+        self.assertEqual(message["node2"], data, "The messages are not correctly received in order.")
+        self.assertEqual(message["node1"], ["Hi node 1!"], "The message is not correctly received.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import socket
+import tempfile
+import unittest
+
+from p2pnetwork import protocol
+from p2pnetwork.tests.helpers import EventNode
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the datagram channel (UDP) of the nodes, which is used by the messages that are sent with unreliable=True.
+"""
+
+class TestDatagram(unittest.TestCase):
+    """Testing the datagram channel of the Node class."""
+
+    def setUp(self):
+        self.nodes = []
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.stop()
+
+        for node in self.nodes:
+            node.join()
+
+    def create_node(self, port, udp_port=0, reactor=False):
+        node = EventNode("127.0.0.1", port, "node" + str(port), udp_port=udp_port, reactor=reactor)
+        node.start()
+        self.nodes.append(node)
+
+        return node
+
+    def connect(self, node1, node2):
+        self.assertTrue(node1.connect_with_node("127.0.0.1", node2.port))
+        self.assertTrue(node2.connected.wait(5.0))
+
+        return (node1.nodes_outbound[0], node2.nodes_inbound[0])
+
+    def check_datagram_channel(self, reactor):
+        node1 = self.create_node(10001, reactor=reactor)
+        node2 = self.create_node(10002, reactor=reactor)
+        (connection1, connection2) = self.connect(node1, node2)
+
+        self.assertEqual(connection1.udp_address, ("127.0.0.1", node2.udp_port))
+        self.assertEqual(connection2.udp_address, ("127.0.0.1", node1.udp_port))
+        self.assertEqual(connection1.udp_token, connection2.udp_receive_token)
+        self.assertEqual(connection2.udp_token, connection1.udp_receive_token)
+
+        node1.send_to_node(connection1, {"tick": 1}, unreliable=True)
+        self.assertTrue(node2.wait_messages(1))
+        node2.send_to_nodes("tock", unreliable=True)
+        self.assertTrue(node1.wait_messages(1))
+
+        # Too large for a datagram, also when it is compressed, so it is sent over the connection
+        large = os.urandom(node1.datagram_size + 1)
+        node1.send_to_node(connection1, large, compression='zlib', unreliable=True)
+        self.assertTrue(node2.wait_messages(2))
+
+        self.assertEqual(node2.messages, [("node10001", {"tick": 1}), ("node10001", large)])
+        self.assertEqual(node1.messages, [("node10002", "tock")])
+        self.assertEqual(node1.get_stats()["datagrams_sent"], 1)
+        self.assertEqual(node1.get_stats()["messages_sent"], 2)
+        self.assertEqual(node1.get_stats()["bytes_raw"], len(large), "The compressed message should be counted once.")
+        self.assertEqual(node2.get_stats()["datagrams_received"], 1)
+
+    def test_datagram_channel(self):
+        """Test whether small messages are sent as datagrams and large messages over the connection."""
+        self.check_datagram_channel(False)
+
+    def test_datagram_channel_reactor(self):
+        """Test whether the reactor receives the datagrams."""
+        self.check_datagram_channel(True)
+
+    def test_stale_datagrams_are_dropped(self):
+        """Test whether datagrams that are older than the last datagram and datagrams of unknown connections are
+           dropped."""
+        node1 = self.create_node(10001)
+        node2 = self.create_node(10002)
+        (connection1, connection2) = self.connect(node1, node2)
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for (token, sequence, data) in [(connection1.udp_token, 5, b'5'), (connection1.udp_token, 3, b'3'),
+                                            (connection1.udp_token ^ 1, 6, b'?'), (connection1.udp_token, 7, b'7')]:
+                header = protocol.DATAGRAM_HEADER.pack(token, sequence, 0, protocol.TYPE_BYTES)
+                sock.sendto(header + data, ("127.0.0.1", node2.udp_port))
+
+        finally:
+            sock.close()
+
+        self.assertTrue(node2.wait_messages(2))
+        self.assertEqual(node2.messages, [("node10001", b'5'), ("node10001", b'7')])
+        self.assertEqual(node2.get_stats()["datagrams_dropped"], 2)
+
+    def test_spoofed_datagrams_are_dropped(self):
+        """Test whether datagrams from another host than the host of the connection are dropped, so they are not
+           able to block the datagram channel with a high sequence number."""
+        node1 = self.create_node(10001)
+        node2 = self.create_node(10002)
+        (connection1, connection2) = self.connect(node1, node2)
+
+        self.assertNotEqual(connection1.udp_token, 0)
+
+        for (host, sequence, data) in [("127.0.0.2", 2**64 - 1, b'?'), ("127.0.0.1", 1, b'1')]:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.bind((host, 0))
+                header = protocol.DATAGRAM_HEADER.pack(connection1.udp_token, sequence, 0, protocol.TYPE_BYTES)
+                sock.sendto(header + data, ("127.0.0.1", node2.udp_port))
+
+            finally:
+                sock.close()
+
+        self.assertTrue(node2.wait_messages(1))
+        self.assertEqual(node2.messages, [("node10001", b'1')])
+        self.assertEqual(node2.get_stats()["datagrams_dropped"], 1)
+
+    def test_handshake_without_colons(self):
+        """Test whether the options of the handshake do not contain a ':', because a legacy node splits the whole
+           handshake at ':' into the id and the port."""
+        path = os.path.join(tempfile.mkdtemp(), "node:10001.sock")
+        node = EventNode("127.0.0.1", 10001, "node10001", udp_port=0, unix_path=path)
+        node.start()
+        self.nodes.append(node)
+
+        handshake = "node10001:10001" + node.handshake_options(token=0xffffffff)
+        self.assertEqual(len(handshake.split(":")), 2)
+        self.assertNotIn("unix", protocol.split_options(handshake)[1])
+
+    def test_without_datagram_channel(self):
+        """Test whether the messages are sent over the connection when a node has no datagram channel."""
+        node1 = self.create_node(10001)
+        node2 = self.create_node(10002, udp_port=None)
+        (connection1, connection2) = self.connect(node1, node2)
+
+        self.assertIsNone(connection1.udp_address)
+        self.assertIsNone(connection2.udp_address)
+        self.assertEqual(node1.udp_nodes, {})
+
+        node1.send_to_nodes({"tick": 1}, unreliable=True)
+        self.assertTrue(node2.wait_messages(1))
+        self.assertEqual(node2.messages, [("node10001", {"tick": 1})])
+        self.assertEqual(node1.get_stats()["datagrams_sent"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import time
+import socket
+
+from p2pnetwork import protocol
+from p2pnetwork.gossip import SeenCache
+from p2pnetwork.node import Node
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the gossip of the nodes: each message is delivered exactly once by each node in the network.
+"""
+
+class TestGossip(unittest.TestCase):
+    """Testing the gossip module and the gossip of the nodes."""
+
+    def test_seen_cache(self):
+        """Test whether the cache detects the id's that have been seen and removes the oldest id's."""
+        cache = SeenCache(size=2, ttl=0.5)
+
+        self.assertTrue(cache.add(b'1'), "The id 1 should be new.")
+        self.assertFalse(cache.add(b'1'), "The id 1 should have been seen.")
+        self.assertTrue(cache.add(b'2'), "The id 2 should be new.")
+        self.assertTrue(cache.add(b'3'), "The id 3 should be new.")
+        self.assertEqual(len(cache), 2, "The cache should hold 2 id's.")
+        self.assertNotIn(b'1', cache, "The oldest id 1 should have been removed.")
+        self.assertIn(b'3', cache, "The id 3 should be in the cache.")
+
+        time.sleep(0.6)
+        self.assertNotIn(b'3', cache, "The id 3 should have expired.")
+        self.assertEqual(len(cache), 0, "The cache should be empty.")
+
+    def test_gossip_ring(self):
+        """Test whether a gossip message is delivered exactly once by each node of a ring."""
+        messages = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_gossip_message":
+                messages.append((main_node.id, data))
+
+        nodes = []
+        for i in range(1, 5):
+            nodes.append(Node(host="127.0.0.1", port=10000 + i, id="node" + str(i), callback=node_callback, reactor=(i % 2 == 0)))
+
+        for n in nodes:
+            n.start()
+
+        # Ring: node1 -> node2 -> node3 -> node4 -> node1
+        for i in range(0, 4):
+            nodes[i].connect_with_node("127.0.0.1", 10001 + (i + 1) % 4)
+        time.sleep(1)
+
+        nodes[0].gossip({"message": "Hi there!"})
+        nodes[2].gossip("Hi from node3!", compression='zlib', ttl=1)
+        time.sleep(1)
+
+        counters = {}
+        for n in nodes:
+            counters[n.id] = dict(n.gossip_counters)
+            n.stop()
+
+        for n in nodes:
+            n.join()
+
+        for id in ["node2", "node3", "node4"]:
+            self.assertEqual(messages.count((id, {"message": "Hi there!"})), 1, "The message should be delivered once by " + id + ".")
+
+        self.assertNotIn(("node1", {"message": "Hi there!"}), messages, "The message should not be delivered to its sender.")
+        self.assertIn(("node2", "Hi from node3!"), messages, "The message should be delivered to node2.")
+        self.assertIn(("node4", "Hi from node3!"), messages, "The message should be delivered to node4.")
+        self.assertNotIn(("node1", "Hi from node3!"), messages, "The message with ttl 1 should not be forwarded.")
+
+        self.assertEqual(counters["node1"]["sent"], 1, "Node 1 should have sent one message.")
+        self.assertEqual(counters["node3"]["received"], 2, "Node 3 should have received the message from node2 and node4.")
+        self.assertGreater(sum(c["redundant"] for c in counters.values()), 0, "The ring should have redundant messages.")
+
+    def test_gossip_codecs(self):
+        """Test whether a compressed gossip message is only forwarded as it is to the nodes that support its codec,
+           the other nodes receive the message encoded again."""
+        messages = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_gossip_message":
+                messages.append((main_node.id, data))
+
+        nodes = []
+        for i in range(1, 4):
+            nodes.append(Node(host="127.0.0.1", port=10000 + i, id="node" + str(i), callback=node_callback))
+        nodes[2].codecs = ['zlib']
+
+        for n in nodes:
+            n.start()
+
+        # Line: node1 -> node2 -> node3
+        nodes[0].connect_with_node("127.0.0.1", 10002)
+        nodes[1].connect_with_node("127.0.0.1", 10003)
+        time.sleep(1)
+
+        node3 = nodes[1].nodes_outbound[0]
+        compressed = protocol.compress(b'"Hi there!"', 'bzip2')
+        self.assertTrue(nodes[1].can_forward(node3, (0, protocol.TYPE_JSON, b'"Hi there!"')))
+        self.assertTrue(nodes[1].can_forward(node3, (protocol.FLAG_COMPRESSED, protocol.TYPE_JSON, protocol.compress(b'"Hi there!"', 'zlib'))))
+        self.assertFalse(nodes[1].can_forward(node3, (protocol.FLAG_COMPRESSED, protocol.TYPE_JSON, compressed)))
+        self.assertFalse(nodes[1].can_forward(node3, (protocol.FLAG_COMPRESSED, protocol.TYPE_JSON, bytes([protocol.CODEC_ZLIB_STREAM]))))
+
+        data = "Hi with bzip2! " * 10000
+        nodes[0].gossip(data, compression='bzip2', ttl=2)
+        time.sleep(1)
+        bytes_sent = node3.stats.get("bytes_sent")
+
+        for n in nodes:
+            n.stop()
+
+        for n in nodes:
+            n.join()
+
+        self.assertIn(("node2", data), messages, "The message should be delivered to node2.")
+        self.assertIn(("node3", data), messages, "The message should be forwarded to node3.")
+        self.assertGreater(bytes_sent, len(data), "Node 3 does not support bzip2, so the message should not be compressed.")
+
+    def test_invalid_gossip(self):
+        """Test whether a gossip message that cannot be decoded is dropped and a gossip frame that is too short
+           closes the connection."""
+        node = Node(host="127.0.0.1", port=10001, id="node1")
+        node.start()
+
+        sock = socket.create_connection(("127.0.0.1", 10001))
+        sock.sendall(("node2:10002" + protocol.encode_options({"version": 2, "framing": "length"})).encode('utf-8'))
+        protocol.read_handshake(sock, time.monotonic() + 5.0)
+        time.sleep(0.5)
+
+        payload = protocol.GOSSIP_HEADER.pack(b'\x01' * 16, 1) + b'{invalid json'
+        sock.sendall(protocol.create_frame(payload, protocol.FLAG_GOSSIP, protocol.TYPE_JSON))
+        time.sleep(0.5)
+        self.assertEqual(len(node.nodes_inbound), 1, "The connection should not be closed by an invalid message.")
+        self.assertEqual(node.get_stats()["receive_errors"], 1, "The invalid message should be counted.")
+
+        sock.sendall(protocol.create_frame(b'abc', protocol.FLAG_GOSSIP, protocol.TYPE_JSON))
+        sock.settimeout(5.0)
+        self.assertEqual(sock.recv(1), b'', "The connection should be closed by a frame that is too short.")
+        time.sleep(0.5)
+        self.assertEqual(len(node.nodes_inbound), 0, "The node should be disconnected.")
+
+        sock.close()
+        node.stop()
+        node.join()
+
+if __name__ == '__main__':
+    unittest.main()
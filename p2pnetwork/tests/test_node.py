@@ -1,6 +1,9 @@
 import unittest
 import time
+import socket
+import threading
 
+from p2pnetwork import protocol
 from p2pnetwork.node import Node
 
 """
@@ -433,7 +436,8 @@ class TestNode(unittest.TestCase):
 
         # Perform the asserts!
         self.assertEqual(node_0_inbound, 1, "More inbound connections have been accepted bij node_0!")
-        self.assertEqual(node_1_inbound, 2, "Node 1 should have two connections from node_0 and node_2!")
+        # Node 0 closes its connection with node 1, because node 1 is already connected with node 0
+        self.assertEqual(node_1_inbound, 1, "Node 1 should only keep the connection from node_2!")
         self.assertEqual(node_2_outbound, 1, "Node 2 should have one outbound connection with node_1!")
 
     def test_node_id(self):
@@ -464,5 +468,171 @@ class TestNode(unittest.TestCase):
         self.assertNotEqual(node_1.id, "thisisanidtest", "Node 1 should have a different id than node 0")
         self.assertNotEqual(node_1.id, None, "The ID pf node 1 should not be equal to None")
 
+    def test_node_connect_many(self):
+        """Testing whether the node connects with many nodes at the same time and does not wait for nodes that do not respond."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "outbound_node_connected":
+                message.append(main_node.id + ":" + connected_node.id)
+
+        node_0 = Node(host='127.0.0.1', port=10000, id="node0", callback=node_callback)
+        node_1 = Node(host='127.0.0.1', port=10001, id="node1")
+        node_2 = Node(host='127.0.0.1', port=10002, id="node2")
+
+        # Two nodes that accept the connection, but never send their id
+        silent_1 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        silent_1.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        silent_1.bind(('127.0.0.1', 10003))
+        silent_1.listen(1)
+        silent_2 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        silent_2.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        silent_2.bind(('127.0.0.1', 10004))
+        silent_2.listen(1)
+
+        node_0.start()
+        node_1.start()
+        node_2.start()
+        time.sleep(1)
+
+        t = time.time()
+        results = node_0.connect_many([('127.0.0.1', 10001), ('127.0.0.1', 10002), ('127.0.0.1', 10003), ('127.0.0.1', 10004), ('127.0.0.1', 10001)], timeout=2.0)
+        seconds = time.time() - t
+        node_0_outbound = len(node_0.nodes_outbound)
+
+        node_0.stop()
+        node_1.stop()
+        node_2.stop()
+        node_0.join()
+        node_1.join()
+        node_2.join()
+        silent_1.close()
+        silent_2.close()
+
+        # Perform the asserts!
+        self.assertEqual(results, {('127.0.0.1', 10001): True, ('127.0.0.1', 10002): True, ('127.0.0.1', 10003): False, ('127.0.0.1', 10004): False}, "Node 0 should only be connected with node 1 and node 2.")
+        self.assertEqual(node_0_outbound, 2, "Node 0 should have two outbound connections.")
+        self.assertLess(seconds, 3.5, "The nodes that do not respond should time out at the same time.")
+        self.assertIn("node0:node1", message, "The event outbound_node_connected should be invoked for node 1.")
+        self.assertIn("node0:node2", message, "The event outbound_node_connected should be invoked for node 2.")
+
+    def test_node_accept(self):
+        """Testing whether a node that does not send its id does not stop other nodes from connecting and whether the maximum connections is never exceeded."""
+        node_0 = Node(host='127.0.0.1', port=10000, id="node0", max_connections=5)
+        node_0.handshake_timeout = 1.0
+        node_1 = Node(host='127.0.0.1', port=10001, id="node1")
+
+        node_0.start()
+        node_1.start()
+        time.sleep(1)
+
+        # This node connects, but does not send its id
+        silent = socket.create_connection(('127.0.0.1', 10000))
+        time.sleep(0.5)
+
+        t = time.time()
+        connected = node_1.connect_with_node('127.0.0.1', 10000, timeout=5.0)
+        seconds = time.time() - t
+
+        time.sleep(1)
+        silent_closed = silent.recv(4096) == b''
+
+        # Many nodes connect at the same time
+        def connect(i):
+            try:
+                sock = socket.create_connection(('127.0.0.1', 10000))
+                sock.send(("client" + str(i) + ":" + str(20000 + i) + protocol.encode_options({"version": 2})).encode('utf-8'))
+                sockets.append(sock)
+
+            except OSError:
+                pass
+
+        sockets = []
+        threads = [threading.Thread(target=connect, args=(i,)) for i in range(0, 20)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        time.sleep(0.5)
+        node_0_inbound = len(node_0.nodes_inbound)
+
+        node_0.stop()
+        node_1.stop()
+        node_0.join()
+        node_1.join()
+        silent.close()
+        for sock in sockets:
+            sock.close()
+
+        # Perform the asserts!
+        self.assertTrue(connected, "Node 1 should be connected with node 0.")
+        self.assertLess(seconds, 1.0, "Node 1 should not wait for the node that does not send its id.")
+        self.assertTrue(silent_closed, "The connection of the node that does not send its id should be closed.")
+        self.assertEqual(node_0_inbound, 5, "Node 0 should not accept more than 5 connections.")
+
+    def test_node_accept_silent_nodes(self):
+        """Testing whether more nodes that do not send their id than there are handshake threads do not stop other nodes from connecting."""
+        for reactor in [False, True]:
+            node_0 = Node(host='127.0.0.1', port=10000, id="node0", max_connections=20, reactor=reactor)
+            node_0.handshake_workers = 4
+            node_0.handshake_timeout = 5.0
+            node_1 = Node(host='127.0.0.1', port=10001, id="node1")
+
+            node_0.start()
+            node_1.start()
+            time.sleep(1)
+
+            silent = [socket.create_connection(('127.0.0.1', 10000)) for i in range(0, 3 * node_0.handshake_workers)]
+            time.sleep(0.5)
+
+            t = time.time()
+            connected = node_1.connect_with_node('127.0.0.1', 10000, timeout=5.0)
+            seconds = time.time() - t
+
+            node_0.stop()
+            node_1.stop()
+            node_0.join()
+            node_1.join()
+            for sock in silent:
+                sock.close()
+
+            self.assertTrue(connected, "Node 1 should be connected with node 0.")
+            self.assertLess(seconds, 1.0, "Node 1 should not wait for the nodes that do not send their id.")
+
+    def test_node_handshake_failure(self):
+        """Testing whether a connection is dropped when the handshake fails after the connection has been created."""
+        message = []
+
+        class FailingNode (Node):
+            def negotiate(self, node, options):
+                raise ValueError("Negotiation failed")
+
+            def inbound_node_connected(self, node):
+                message.append(node.id)
+
+        node_0 = FailingNode(host='127.0.0.1', port=10000, id="node0")
+        node_1 = Node(host='127.0.0.1', port=10001, id="node1")
+
+        node_0.start()
+        node_1.start()
+        time.sleep(1)
+
+        node_1.connect_with_node('127.0.0.1', 10000)
+        time.sleep(1)
+        node_0_inbound = len(node_0.nodes_inbound)
+        node_0_pending = node_0.inbound_pending
+
+        node_0.stop()
+        node_1.stop()
+        node_0.join()
+        node_1.join()
+
+        # Perform the asserts!
+        self.assertEqual(node_0_inbound, 0, "The connection of which the handshake failed should not be added.")
+        self.assertEqual(node_0_pending, 0, "The handshake should not be pending anymore.")
+        self.assertEqual(message, [], "The event inbound_node_connected should not be invoked.")
+
 if __name__ == '__main__':
     unittest.main()
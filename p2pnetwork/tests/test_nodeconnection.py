@@ -1,8 +1,14 @@
 import unittest
 import time
 import struct
+import socket
+import queue
+import threading
 
+from p2pnetwork import protocol
+from p2pnetwork import ringbuffer
 from p2pnetwork.node import Node
+from p2pnetwork.nodeconnection import NodeConnection, SendQueueFull
 
 """
 Author: Maurice Snoeren
@@ -143,3 +149,213 @@ class TestNode(unittest.TestCase):
         for i in range(0, 10, 2):
             self.assertEqual(str(messages[3+i]),  "<class 'dict'>")
             self.assertEqual(messages[4+i],  5000)
+
+    def test_node_shared_packets(self):
+        """Testing whether the connections share the packet when they use the same format."""
+        node = Node("127.0.0.1", 10001)
+        node.sock.close()
+
+        connections = [NodeConnection(node, socket.socket(), str(i), "127.0.0.1", 10002 + i) for i in range(4)]
+        connections[0].framing = 'length'
+        connections[1].framing = 'length'
+        connections[2].framing = 'eot'
+        connections[3].framing = 'length'
+
+        data = {"type": "My Dict", "values": ["i: " + str(i) for i in range(5000)]}
+        packets = {}
+        packet = [c.create_buffers(data, compression='lzma', packets=packets) for c in connections[0:3]]
+        stream = [connections[3].create_buffers(data, compression='zlib-stream', packets=packets) for i in range(2)]
+
+        for c in connections:
+            c.sock.close()
+
+        self.assertIs(packet[0][1], packet[1][1], "The connections with the same format should share the packet.")
+        self.assertIsNot(packet[0][0], packet[2][0], "The connections with a different framing should not share the packet.")
+        self.assertNotEqual(stream[0], stream[1], "The packets of zlib-stream should not be shared.")
+
+    def test_node_backpressure(self):
+        """Testing whether a stalled node does not block sending to the other nodes."""
+        messages = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                messages.append(data)
+
+        node1 = Node("127.0.0.1", 10001)
+        node2 = Node("127.0.0.1", 10002, callback=node_callback)
+        node1.send_queue_size = 5
+        node1.backpressure = 'drop'
+
+        node1.start()
+        node2.start()
+        node1.connect_with_node('127.0.0.1', 10002)
+
+        # The stalled node exchanges the id's like a legacy node and never reads the data
+        client = socket.create_connection(("127.0.0.1", 10001))
+        client.send("stalled:10003".encode('utf-8'))
+        client.recv(4096)
+        time.sleep(1)
+
+        stalled = [n for n in node1.all_nodes if n.id == "stalled"][0]
+        other = [n for n in node1.all_nodes if n.id != "stalled"][0]
+        data = b'x' * 1000000
+        start = time.time()
+        for i in range(20):
+            node1.send_to_nodes(data)
+        duration = time.time() - start
+
+        depths = node1.get_queue_depths()
+        node1.backpressure = 'raise'
+        self.assertRaises(queue.Full, stalled.send, data)
+        time.sleep(2)
+
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+        client.close()
+
+        self.assertLess(duration, 2.0, "Sending should not be blocked by the stalled node.")
+        self.assertEqual(depths["stalled"], 5, "The queue of the stalled node should be full.")
+        self.assertTrue(stalled.dropped_packets > 0, "Packets to the stalled node should have been dropped.")
+        self.assertEqual(len(messages) + other.dropped_packets, 20, "The other node should have received all the messages that are not dropped.")
+
+    def test_node_backpressure_raise(self):
+        """Testing whether a full send queue of a stalled node does not stop a broadcast to the other nodes."""
+        messages = {"node2": 0, "node3": 0}
+        gossip = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                messages[main_node.id] += 1
+
+            if event == "node_gossip_message":
+                gossip.append(main_node.id)
+
+        node1 = Node("127.0.0.1", 10001, id="node1", max_connections=2)
+        node2 = Node("127.0.0.1", 10002, id="node2", callback=node_callback)
+        node3 = Node("127.0.0.1", 10003, id="node3", callback=node_callback)
+        node1.send_queue_size = 5
+        node1.backpressure = 'raise'
+
+        node1.start()
+        node2.start()
+        node3.start()
+
+        # The stalled node connects with length framing, so it receives the gossip as well, and never reads the data
+        client = socket.create_connection(("127.0.0.1", 10001))
+        client.send(("stalled:10004" + protocol.OPTIONS_SEPARATOR + "version=2,framing=length" + protocol.HANDSHAKE_END).encode('utf-8'))
+        client.recv(4096)
+
+        node1.connect_with_node('127.0.0.1', 10002)
+        node1.connect_with_node('127.0.0.1', 10003)
+        time.sleep(0.5)
+
+        congested = []
+        data = b'x' * 1000000
+        for i in range(40):
+            try:
+                node1.send_to_nodes(data)
+
+            except SendQueueFull as e:
+                congested.append([n.id for n in e.nodes])
+
+            time.sleep(0.01)
+
+        try:
+            node1.gossip("Hi gossip!")
+
+        except SendQueueFull as e:
+            congested.append([n.id for n in e.nodes])
+
+        time.sleep(1)
+
+        node1.stop()
+        node2.stop()
+        node3.stop()
+        node1.join()
+        node2.join()
+        node3.join()
+        client.close()
+
+        self.assertTrue(len(congested) > 0, "The send queue of the stalled node should have been full.")
+        self.assertTrue(all(nodes == ["stalled"] for nodes in congested), "Only the stalled node should be congested.")
+        self.assertEqual(congested[-1], ["stalled"], "The gossip should report the stalled node.")
+        self.assertEqual(messages, {"node2": 40, "node3": 40}, "The other nodes should receive all the messages.")
+        self.assertEqual(sorted(gossip), ["node2", "node3"], "The other nodes should receive the gossip.")
+
+    def test_node_write_coalescing(self):
+        """Testing whether the queued packets are sent together with sendmsg and arrive correctly."""
+        class CountingSocket:
+            def __init__(self, sock):
+                self.sock = sock
+                self.calls = 0
+
+            def settimeout(self, timeout):
+                self.sock.settimeout(timeout)
+
+            def sendmsg(self, buffers):
+                self.calls += 1
+                return self.sock.sendmsg(buffers)
+
+        (sock, other) = socket.socketpair()
+        node = Node("127.0.0.1", 10001)
+        node.sock.close()
+
+        connection = NodeConnection(node, CountingSocket(sock), "other", "127.0.0.1", 10002)
+        connection.framing = 'length'
+
+        messages = ["message " + str(i) for i in range(100)]
+        for message in messages:
+            connection.send_queue.put(connection.create_buffers(message))
+        connection.send_queue.put(None) # The writer stops when the packets have been sent
+        connection.write_packets()
+        calls = connection.sock.calls
+
+        messages.append('x' * 1000000)
+        connection.send_queue.put(connection.create_buffers(messages[-1]))
+        connection.send_queue.put(None)
+        writer = threading.Thread(target=connection.write_packets)
+        writer.start()
+
+        received = []
+        decoder = protocol.FrameDecoder()
+        while len(received) < len(messages):
+            received.extend(str(payload, 'utf-8') for (flags, type, payload) in decoder.feed(other.recv(65536)))
+
+        writer.join()
+        sock.close()
+        other.close()
+
+        self.assertEqual(calls, 1, "The small messages should have been sent with one call.")
+        self.assertEqual(received, messages, "The messages are not correctly received.")
+
+    @unittest.skipUnless(ringbuffer.available(), "Shared memory is not supported by this python version")
+    def test_node_corrupt_ring_buffer(self):
+        """Testing whether a corrupt frame in shared memory closes the connection like a corrupt stream."""
+        disconnected = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "inbound_node_disconnected":
+                disconnected.append(connected_node.id)
+
+        (sock, other) = socket.socketpair()
+        node = Node("127.0.0.1", 10001, callback=node_callback)
+        node.sock.close()
+
+        connection = NodeConnection(node, sock, "other", "127.0.0.1", 10002)
+        connection.framing = 'length'
+        connection.ring_in = ringbuffer.RingBuffer(4096)
+        ringbuffer.RECORD.pack_into(connection.ring_in.buf, ringbuffer.HEADER.size, 100000) # Larger than the ring
+        node.nodes_inbound.add(connection)
+
+        connection.start()
+        other.sendall(protocol.create_frame(protocol.SHARED_COUNT.pack(1), protocol.FLAG_SHARED, protocol.TYPE_BYTES))
+        connection.join(5.0)
+        other.settimeout(5.0)
+        closed = other.recv(1) == b''
+        other.close()
+
+        self.assertFalse(connection.is_alive(), "The connection should stop.")
+        self.assertTrue(closed, "The socket of the connection should be closed.")
+        self.assertEqual(disconnected, ["other"], "The main node should be informed that the node disconnected.")
@@ -0,0 +1,84 @@
+import unittest
+import time
+
+from p2pnetwork.peers import PeerSet
+from p2pnetwork.node import Node
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the PeerSet that holds the connected nodes of a node.
+"""
+
+class Peer:
+    """Node connection with only the attributes that are used by the PeerSet."""
+
+    def __init__(self, id, host, port):
+        self.id = id
+        self.host = host
+        self.port = port
+
+
+class TestPeers(unittest.TestCase):
+    """Testing the peers module."""
+
+    def test_peer_set(self):
+        """Test whether the nodes are found by id and by host and port and whether iterating uses a snapshot."""
+        peer1 = Peer("node1", "127.0.0.1", 10001)
+        peer2 = Peer("node2", "127.0.0.1", "10002")
+        peer3 = Peer("node1", "127.0.0.2", 10003)
+        peers = PeerSet([peer1, peer2])
+        peers.add(peer3)
+        peers.add(peer1)
+
+        self.assertEqual(len(peers), 3, "The PeerSet should hold 3 nodes.")
+        self.assertEqual(peers[0], peer1, "The nodes should be kept in the order in which they have been added.")
+        self.assertEqual(list(peers), [peer1, peer2, peer3], "The nodes should be kept in the order in which they have been added.")
+        self.assertEqual(peers.get("node2"), peer2, "Node 2 should be found by its id.")
+        self.assertEqual(peers.get("node1", "127.0.0.2"), peer3, "Node 3 should be found by its id and host.")
+        self.assertEqual(peers.get("node4"), None, "Node 4 does not exist.")
+        self.assertEqual(peers.find("127.0.0.1", 10002), peer2, "Node 2 should be found by its host and port.")
+        self.assertEqual(peers.find("127.0.0.1", "10001"), peer1, "Node 1 should be found by its host and port.")
+
+        # Removing nodes while iterating does not change the iteration
+        iterated = []
+        for peer in peers:
+            peers.remove(peer)
+            iterated.append(peer)
+
+        self.assertEqual(iterated, [peer1, peer2, peer3], "All the nodes should have been iterated.")
+        self.assertEqual(len(peers), 0, "The PeerSet should be empty.")
+        self.assertEqual(peers.get("node1"), None, "Node 1 should have been removed from the index.")
+        self.assertEqual(peers.find("127.0.0.1", 10001), None, "Node 1 should have been removed from the index.")
+        self.assertRaises(KeyError, peers.remove, peer1)
+        peers.discard(peer1)
+
+    def test_node_peers(self):
+        """Test whether the node finds the connected nodes by id."""
+        node1 = Node(host="127.0.0.1", port=10001, id="node1")
+        node2 = Node(host="127.0.0.1", port=10002, id="node2", reactor=True)
+
+        node1.start()
+        node2.start()
+        node1.connect_with_node("127.0.0.1", 10002)
+        time.sleep(1)
+
+        connected = node1.connect_with_node("127.0.0.1", 10002) # Already connected
+        node1_outbound = len(node1.nodes_outbound)
+        node1_node2 = node1.get_node("node2")
+        node2_node1 = node2.get_node("node1")
+
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+
+        self.assertTrue(connected, "Node 1 should already be connected with node 2.")
+        self.assertEqual(node1_outbound, 1, "Node 1 should have one outbound connection.")
+        self.assertEqual(node1_node2.id, "node2", "Node 1 should find node 2 by its id.")
+        self.assertEqual(node2_node1.id, "node1", "Node 2 should find node 1 by its id.")
+        self.assertEqual(node1.get_node("node2"), None, "Node 2 should have been removed when the nodes stopped.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,372 @@
+import unittest
+import time
+import socket
+import threading
+import base64
+import zlib
+
+from p2pnetwork import protocol
+from p2pnetwork.node import Node
+from p2pnetwork.receivebuffer import ReceiveBuffer
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the length framing of the protocol and the negotiation of the framing between nodes.
+"""
+
+class TestProtocol(unittest.TestCase):
+    """Testing the protocol module."""
+
+    def test_frame_decoder(self):
+        """Test whether the frame decoder finds the frames in a stream that arrives in arbitrary chunks."""
+        payloads = [b'', b'\x04\x04\x02', b'a' * 100000, "Hi there!".encode('utf-8')]
+        stream = b''.join(protocol.create_frame(payload, 0, protocol.TYPE_BYTES) for payload in payloads)
+
+        for chunk_size in [1, 5, 4096, len(stream)]:
+            decoder = protocol.FrameDecoder()
+            frames = []
+            for i in range(0, len(stream), chunk_size):
+                frames.extend(bytes(payload) for (flags, type, payload) in decoder.feed(stream[i:i + chunk_size]))
+
+            self.assertEqual(frames, payloads, "The frames are not correctly decoded.")
+
+        decoder = protocol.FrameDecoder(max_frame_size=1000)
+        self.assertEqual(len(list(decoder.feed(protocol.create_frame(b'a' * 1000, 0, protocol.TYPE_BYTES)))), 1, "The frame should be accepted.")
+        self.assertRaises(protocol.FrameError, list, decoder.feed(protocol.create_frame(b'a' * 1001, 0, protocol.TYPE_BYTES)[0:10]))
+
+    def test_receive_buffer(self):
+        """Test whether the receive buffer reuses its space and finds the EOT characters in the stream."""
+        buffer = ReceiveBuffer(16)
+        packets = []
+        for chunk in [b'abc', b'\x04de', b'f\x04\x04', b'g' * 20, b'\x04']:
+            buffer.write(chunk)
+            pos = buffer.find(b'\x04')
+            while pos >= 0:
+                packets.append(bytes(buffer.consume(pos)))
+                buffer.consume(1)
+                pos = buffer.find(b'\x04')
+
+        self.assertEqual(packets, [b'abc', b'def', b'', b'g' * 20], "The packets are not correctly found.")
+        self.assertEqual(len(buffer), 0, "The buffer should be empty.")
+        self.assertEqual(buffer.bytes_copied, 0, "Consumed data should not be copied.")
+
+    def test_receive_buffer_growth(self):
+        """Test whether the buffer only grows with the data that arrives and shrinks again after a large frame."""
+        decoder = protocol.FrameDecoder(ReceiveBuffer(1024), protocol.MAX_FRAME_SIZE)
+        self.assertEqual(list(decoder.feed(protocol.HEADER.pack(1 << 30, 0, protocol.TYPE_BYTES))), [])
+        self.assertLessEqual(len(decoder.buffer.data), 2048, "The claimed length should not be allocated.")
+
+        frame = protocol.create_frame(b'a' * 100000, 0, protocol.TYPE_BYTES)
+        decoder = protocol.FrameDecoder(ReceiveBuffer(1024))
+        frames = []
+        for i in range(0, len(frame), 4096):
+            frames.extend(bytes(payload) for (flags, type, payload) in decoder.feed(frame[i:i + 4096]))
+            self.assertLessEqual(len(decoder.buffer.data), 4 * (i + 4096), "The buffer grows too fast.")
+
+        self.assertEqual(frames, [b'a' * 100000], "The frame is not correctly decoded.")
+        self.assertEqual(len(decoder.buffer.data), 1024, "The buffer should shrink when it is empty.")
+
+    def test_compress(self):
+        """Test whether the binary compressed payloads are decompressed and recognized next to the legacy base64 format."""
+        data = b'\x04binary data\x02' * 1000
+        for compression in ['zlib', 'bzip2', 'lzma']:
+            compressed = protocol.compress(data, compression)
+            self.assertEqual(compressed[0], protocol.CODECS[compression], "The codec byte is not correct.")
+            self.assertTrue(protocol.is_binary_compressed(compressed), "The binary format is not recognized.")
+            self.assertEqual(protocol.decompress(memoryview(compressed)), data, "The data is not correctly decompressed.")
+
+        legacy = base64.b64encode(zlib.compress(data, 6) + b'zlib')
+        self.assertFalse(protocol.is_binary_compressed(legacy), "The legacy format is recognized as binary format.")
+        self.assertLess(len(protocol.compress(data, 'zlib')), len(legacy), "The binary format should be smaller.")
+        self.assertRaises(ValueError, protocol.compress, data, 'unknown')
+
+    def test_options(self):
+        """Test whether the options that are exchanged when the nodes connect are correctly encoded and decoded."""
+        text = "node1:10001" + protocol.encode_options({"framing": "length"})
+        self.assertEqual(protocol.split_options(text), ("node1:10001", {"framing": "length"}))
+        self.assertEqual(protocol.split_options("node1:10001"), ("node1:10001", {}))
+
+        handshake = text.encode('utf-8')
+        self.assertEqual(protocol.handshake_length(b'node1:10001'), 11, "The handshake of a legacy node is all the data.")
+        self.assertEqual(protocol.handshake_length(handshake[0:-1]), None, "The handshake is not complete yet.")
+        self.assertEqual(protocol.handshake_length(handshake + b'\x00\x00'), len(handshake), "The data after the handshake is not part of it.")
+        self.assertRaises(protocol.FrameError, protocol.handshake_length, b'node1\x00' + b'a' * protocol.MAX_HANDSHAKE_SIZE)
+
+    def test_length_framing(self):
+        """Test whether nodes negotiate the framing and that any bytes are send correctly with length framing."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append((main_node.id, connected_node.id, data))
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback, reactor=True)
+        node2 = Node(host="127.0.0.1", port=10002, id="node2", callback=node_callback, reactor=True)
+        node3 = Node(host="127.0.0.1", port=10003, id="node3", callback=node_callback, reactor=True)
+        node3.framing = 'eot' # Behaves like a legacy node
+
+        node1.start()
+        node2.start()
+        node3.start()
+
+        node1.connect_with_node("127.0.0.1", 10002)
+        node3.connect_with_node("127.0.0.1", 10001)
+        time.sleep(0.5)
+
+        framing = {}
+        for n in node1.all_nodes:
+            framing[n.id] = n.framing
+
+        data = b'\x00\x04binary\x04\x02data' + bytes(range(256))
+        node1.send_to_node(list(node1.nodes_outbound)[0], data)
+        node1.send_to_node(list(node1.nodes_outbound)[0], "Hi node 2!", compression='zlib')
+        node1.send_to_node(list(node1.nodes_inbound)[0], "Hi node 3!")
+        node1.send_to_node(list(node1.nodes_inbound)[0], "Hi compressed node 3!", compression='lzma')
+        node3.send_to_nodes({"from": "node 3"})
+        time.sleep(0.5)
+
+        node1.stop()
+        node2.stop()
+        node3.stop()
+        node1.join()
+        node2.join()
+        node3.join()
+
+        self.assertEqual(framing, {"node2": "length", "node3": "eot"}, "The framing is not correctly negotiated.")
+        self.assertIn(("node2", "node1", data), message, "The bytes are not correctly received.")
+        self.assertIn(("node2", "node1", "Hi node 2!"), message, "The compressed message is not correctly received.")
+        self.assertIn(("node3", "node1", "Hi node 3!"), message, "The message is not correctly received with eot framing.")
+        self.assertIn(("node3", "node1", "Hi compressed node 3!"), message, "The compressed message is not correctly received with eot framing.")
+        self.assertIn(("node1", "node3", {"from": "node 3"}), message, "The message is not correctly received with eot framing.")
+
+    def test_handshake(self):
+        """Test whether nodes negotiate their capabilities and whether a handshake in more segments is received."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append((main_node.id, connected_node.id, data))
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback)
+        node2 = Node(host="127.0.0.1", port=10002, id="node2", callback=node_callback, max_connections=2)
+        node2.codecs = ['zlib']
+        node2.max_frame_size = 1000
+        node2.batching = False
+
+        node1.start()
+        node2.start()
+        node1.connect_with_node("127.0.0.1", 10002)
+
+        # A client that sends its handshake in two segments, directly followed by a message
+        client = socket.create_connection(("127.0.0.1", 10002))
+        client.sendall(("client:20000" + protocol.OPTIONS_SEPARATOR + "version=2,").encode('utf-8'))
+        time.sleep(0.2)
+        client.sendall(("framing=length" + protocol.HANDSHAKE_END).encode('utf-8') + protocol.create_frame("Hi from the client!".encode('utf-8'), 0, protocol.TYPE_STR))
+        reply = client.recv(4096).decode('utf-8')
+        time.sleep(0.5)
+
+        node2_connection = node1.get_node("node2")
+        capabilities = (node2_connection.version, node2_connection.codecs, node2_connection.max_frame_size, node2_connection.batching)
+        client_connection = node2.get_node("client")
+        client_capabilities = (client_connection.version, client_connection.framing, client_connection.codecs)
+
+        node1.send_to_node(node2_connection, "Hi zlib-stream!", compression='zlib-stream')
+        node1.send_to_node(node2_connection, "Hi lzma!", compression='lzma')
+        node1.send_to_node(node2_connection, b'a' * 1001)
+        node1.send_to_node(node2_connection, "Hi small!")
+        time.sleep(0.5)
+
+        client.close()
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+
+        self.assertEqual(capabilities, (2, ['zlib'], 1000, False), "The capabilities are not correctly negotiated.")
+        self.assertEqual(client_capabilities, (2, 'length', ['zlib']), "The codecs of node 2 that the client supports should be used.")
+        self.assertTrue(reply.startswith("node2" + protocol.OPTIONS_SEPARATOR), "The client should receive the id and options of node 2.")
+        self.assertIn(("node2", "client", "Hi from the client!"), message, "The message after the handshake is not received.")
+        self.assertIn(("node2", "node1", "Hi zlib-stream!"), message, "The message should fall back to zlib.")
+        self.assertIn(("node2", "node1", "Hi lzma!"), message, "The message should fall back to no compression.")
+        self.assertIn(("node2", "node1", "Hi small!"), message, "The message is not correctly received.")
+        self.assertNotIn(("node2", "node1", b'a' * 1001), message, "The frame larger than the maximum frame size should not be sent.")
+
+    def test_handshake_split_before_options(self):
+        """Test whether a handshake whose id arrives in an earlier segment than its options is received correctly."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append((connected_node.id, connected_node.port, data))
+
+        node = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback, max_connections=2)
+        self.assertEqual(node.max_frame_size, protocol.DEFAULT_MAX_FRAME_SIZE, "The maximum frame size should have a real default.")
+        node.start()
+
+        client = socket.create_connection(("127.0.0.1", 10001), timeout=5.0)
+        client.sendall("client:20000".encode('utf-8'))
+        time.sleep(0.05)
+        client.sendall((protocol.OPTIONS_SEPARATOR + "version=2,framing=length" + protocol.HANDSHAKE_END).encode('utf-8'))
+        reply = client.recv(4096).decode('utf-8')
+        client.sendall(protocol.create_frame("Hi from the client!".encode('utf-8'), 0, protocol.TYPE_STR))
+        time.sleep(0.5)
+
+        client_connection = node.get_node("client")
+        framing = client_connection.framing if client_connection is not None else None
+
+        # A legacy node only sends its id
+        legacy = socket.create_connection(("127.0.0.1", 10001), timeout=5.0)
+        legacy.sendall("legacy:20001".encode('utf-8'))
+        legacy_reply = legacy.recv(4096).decode('utf-8')
+        time.sleep(0.5)
+        legacy_connected = node.get_node("legacy") is not None
+
+        client.close()
+        legacy.close()
+        node.stop()
+        node.join()
+
+        self.assertTrue(reply.startswith("node1" + protocol.OPTIONS_SEPARATOR), "The client should receive the options of node 1.")
+        self.assertEqual(framing, 'length', "The options in the second segment should be used.")
+        self.assertIn(("client", "20000", "Hi from the client!"), message, "The message after the handshake is not received.")
+        self.assertEqual(legacy_reply, "node1", "The legacy node should only receive the id of node 1.")
+        self.assertTrue(legacy_connected, "The legacy node should be connected.")
+
+    def test_handshake_reader_split(self):
+        """Test whether the HandshakeReader collects a handshake that arrives in more than one chunk."""
+        reader = protocol.HandshakeReader()
+        self.assertIsNone(reader.feed(b'node1:10'), "The options of the node could still arrive.")
+        grace = reader.grace
+        self.assertIsNone(reader.feed(b'001'), "The rest of the id of a legacy node is not data after its id.")
+        self.assertEqual(reader.grace, grace, "The rest of the id should not extend the grace.")
+        self.assertIsNone(reader.expire(grace - 0.1), "The options are awaited until the grace has passed.")
+        self.assertEqual(reader.expire(grace), ("node1:10001", b''), "The id of the legacy node should be complete.")
+
+        reader = protocol.HandshakeReader()
+        self.assertIsNone(reader.feed(b'node1:10'))
+        self.assertIsNone(reader.feed(b'001'))
+        self.assertEqual(reader.close(), ("node1:10001", b''), "The legacy node may close the connection after its id.")
+
+        reader = protocol.HandshakeReader()
+        handshake = ("node1:10001" + protocol.encode_options({"version": 2})).encode('utf-8')
+        self.assertIsNone(reader.feed(handshake[0:8]))
+        self.assertIsNone(reader.feed(handshake[8:14]))
+        self.assertEqual(reader.feed(handshake[14:] + b'\x00'), (handshake.decode('utf-8'), b'\x00'), "The data after the handshake belongs to the stream.")
+        self.assertRaises(ConnectionError, protocol.HandshakeReader().close)
+
+    def test_handshake_legacy_clients(self):
+        """Test whether the legacy nodes that connect at the same time wait for their options together, without a handshake thread each."""
+        node = Node(host="127.0.0.1", port=10001, id="node1", max_connections=8)
+        node.handshake_workers = 1
+        node.start()
+
+        def legacy_client(i, replies):
+            sock = socket.create_connection(("127.0.0.1", 10001), timeout=10.0)
+            sock.sendall(("legacy" + str(i) + ":" + str(20000 + i)).encode('utf-8'))
+            replies.append(sock.recv(4096).decode('utf-8'))
+            sock.close()
+
+        replies = []
+        threads = [threading.Thread(target=legacy_client, args=(i, replies)) for i in range(0, 8)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+        seconds = time.monotonic() - start
+
+        node.stop()
+        node.join()
+
+        self.assertEqual(replies, ["node1"] * 8, "Each legacy node should only receive the id of node 1.")
+        self.assertLess(seconds, protocol.LEGACY_HANDSHAKE_GRACE + 1.0, "The legacy nodes should not wait for each other.")
+
+    def test_handshake_legacy_server(self):
+        """Test whether a node that connects with a legacy node only sends its id and port, like a legacy node."""
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("127.0.0.1", 10002))
+        server.listen(1)
+
+        def legacy_server(received):
+            # The legacy node reads the id and the port with one recv and replies directly with its id
+            (connection, address) = server.accept()
+            received.append(connection.recv(4096).decode('utf-8'))
+            connection.send("legacy".encode('utf-8'))
+            connection.settimeout(5.0)
+            received.append(connection.recv(4096))
+            connection.close()
+
+        received = []
+        thread = threading.Thread(target=legacy_server, args=(received,))
+        thread.start()
+
+        node = Node(host="127.0.0.1", port=10001, id="node1")
+        node.start()
+        connected = node.connect_with_node("127.0.0.1", 10002)
+        legacy_connection = node.get_node("legacy")
+        framing = legacy_connection.framing if legacy_connection is not None else None
+        node.send_to_nodes("Hi legacy!")
+        thread.join()
+
+        node.stop()
+        node.join()
+        server.close()
+
+        self.assertTrue(connected, "The node should be connected with the legacy node.")
+        self.assertEqual(received[0], "node1:10001", "The legacy node should only receive the id and the port.")
+        self.assertEqual(framing, 'eot', "EOT framing should be used with the legacy node.")
+        self.assertEqual(received[1], b'Hi legacy!\x04', "The message should be the first data after the handshake.")
+
+    def test_handshake_late_legacy_server(self):
+        """Test whether a node connects again without the options with a legacy node that replies late."""
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("127.0.0.1", 10002))
+        server.listen(2)
+
+        def legacy_server(received):
+            # The slow legacy node replies after the options have been sent, which end up in its stream
+            (connection, address) = server.accept()
+            connection.recv(4096)
+            time.sleep(0.3)
+            connection.send("legacy".encode('utf-8'))
+            connection.settimeout(5.0)
+            while connection.recv(4096) != b'':
+                pass
+            connection.close()
+
+            # The node connects again and only sends its id and port
+            (connection, address) = server.accept()
+            received.append(connection.recv(4096).decode('utf-8'))
+            connection.send("legacy".encode('utf-8'))
+            connection.settimeout(5.0)
+            received.append(connection.recv(4096))
+            connection.close()
+
+        received = []
+        thread = threading.Thread(target=legacy_server, args=(received,))
+        thread.start()
+
+        node = Node(host="127.0.0.1", port=10001, id="node1")
+        node.start()
+        connected = node.connect_with_node("127.0.0.1", 10002, timeout=5.0)
+        legacy_connection = node.get_node("legacy")
+        node.send_to_nodes("Hi legacy!")
+        thread.join()
+
+        node.stop()
+        node.join()
+        server.close()
+
+        self.assertTrue(connected, "The node should be connected with the legacy node.")
+        self.assertIsNotNone(legacy_connection, "The node should be connected with the id of the legacy node.")
+        self.assertEqual(received[0], "node1:10001", "The legacy node should only receive the id and the port.")
+        self.assertEqual(received[1], b'Hi legacy!\x04', "The message should be the first data after the handshake.")
+        self.assertIn(("127.0.0.1", "10002"), node.legacy_nodes, "The node should remember the legacy node.")
+
+if __name__ == '__main__':
+    unittest.main()
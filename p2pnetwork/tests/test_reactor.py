@@ -0,0 +1,165 @@
+import unittest
+import threading
+import time
+import socket
+
+from p2pnetwork import protocol
+from p2pnetwork.node import Node
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the node when the reactor is used to handle all the connections in one thread.
+"""
+
+class TestReactor(unittest.TestCase):
+    """Testing the Node class that uses a reactor."""
+
+    def test_reactor_communication(self):
+        """Test whether nodes using a reactor are able to connect and send messages, also with a threaded node."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event != "node_request_to_stop":
+                message.append(event + ":" + main_node.id + ":" + connected_node.id + ":" + str(data))
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback, reactor=True)
+        node2 = Node(host="127.0.0.1", port=10002, id="node2", callback=node_callback, reactor=True)
+        node3 = Node(host="127.0.0.1", port=10003, id="node3", callback=node_callback)
+
+        node1.start()
+        node2.start()
+        node3.start()
+
+        node1.connect_with_node("127.0.0.1", 10002)
+        node3.connect_with_node("127.0.0.1", 10001)
+        time.sleep(0.5)
+
+        node1_connections = len(node1.all_nodes)
+        node2_connections = len(node2.all_nodes)
+
+        node1.send_to_nodes("Hi from node 1!")
+        node2.send_to_nodes({"from": "node 2"}, compression='zlib')
+        node3.send_to_nodes("Hi from node 3!")
+        time.sleep(0.5)
+
+        node1.stop()
+        node2.stop()
+        node3.stop()
+        node1.join()
+        node2.join()
+        node3.join()
+
+        self.assertEqual(node1_connections, 2, "Node 1 should be connected with node 2 and node 3.")
+        self.assertEqual(node2_connections, 1, "Node 2 should be connected with node 1.")
+
+        self.assertIn("node_message:node2:node1:Hi from node 1!", message)
+        self.assertIn("node_message:node3:node1:Hi from node 1!", message)
+        self.assertIn("node_message:node1:node2:{'from': 'node 2'}", message)
+        self.assertIn("node_message:node1:node3:Hi from node 3!", message)
+        self.assertIn("outbound_node_disconnected:node1:node2:{}", message)
+        self.assertIn("inbound_node_disconnected:node2:node1:{}", message)
+
+    def test_reactor_latency(self):
+        """Test whether the reactor processes the messages without the polling delay of 10 ms."""
+        received = threading.Event()
+
+        class PingPongNode (Node):
+            def node_message(self, node, data):
+                if data == "ping":
+                    node.send("pong")
+                else:
+                    received.set()
+
+        node1 = PingPongNode(host="127.0.0.1", port=10001, reactor=True)
+        node2 = PingPongNode(host="127.0.0.1", port=10002, reactor=True)
+
+        node1.start()
+        node2.start()
+
+        node1.connect_with_node("127.0.0.1", 10002)
+        time.sleep(0.5)
+
+        node = list(node1.nodes_outbound)[0]
+        round_trips = 50
+        start = time.time()
+        for i in range(round_trips):
+            received.clear()
+            node.send("ping")
+            received.wait(1.0)
+        duration = time.time() - start
+
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+
+        # Polling every 10 ms would result in at least 20 ms for each round trip
+        self.assertLess(duration / round_trips, 0.01, "The round trip should not be limited by the 10 ms polling.")
+
+    def test_reactor_sends_queued_packets(self):
+        """Test whether the reactor sends the packets without writer threads, also the packets that are still queued
+           when the node stops."""
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append(data)
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", reactor=True)
+        node2 = Node(host="127.0.0.1", port=10002, id="node2", callback=node_callback)
+
+        node1.start()
+        node2.start()
+
+        node1.connect_with_node("127.0.0.1", 10002)
+        time.sleep(0.5)
+
+        data = b'x' * 10000000 # Does not fit in the socket buffers
+        node1.send_to_nodes("Hi from node 1!")
+        node1.send_to_nodes(data)
+        node = node1.nodes_outbound[0]
+        writer = node.writer
+
+        node1.stop()
+        node1.join()
+        time.sleep(0.5)
+        node2.stop()
+        node2.join()
+
+        self.assertIsNone(writer, "The reactor should send the packets itself.")
+        self.assertEqual(message, ["Hi from node 1!", data], "The queued packets should be sent before closing.")
+
+    def test_reactor_stalled_node(self):
+        """Test whether a handler that sends to a node that never reads does not block the reactor."""
+        handled = threading.Event()
+
+        class SendingNode (Node):
+            def node_message(self, node, data):
+                for i in range(0, 100):
+                    node.send(b'x' * 1000000)
+                handled.set()
+
+        node1 = SendingNode(host="127.0.0.1", port=10001, id="node1", reactor=True)
+        node1.send_queue_size = 10
+        node1.start()
+
+        # This node sends a message, but never reads
+        sock = socket.create_connection(("127.0.0.1", 10001))
+        sock.sendall(("stalled:10002" + protocol.encode_options({"version": 2, "framing": "length"})).encode('utf-8'))
+        protocol.read_handshake(sock, time.monotonic() + 5.0)
+        sock.sendall(protocol.create_frame(b'go', 0, protocol.TYPE_BYTES))
+
+        handled_in_time = handled.wait(5.0)
+        node1.stop()
+        node1.join(5.0)
+        stopped = not node1.is_alive()
+        sock.close()
+
+        self.assertTrue(handled_in_time, "The handler should not wait for the node that does not read.")
+        self.assertTrue(stopped, "The node should stop, also when a node does not read.")
+        self.assertGreater(node1.get_stats()["messages_dropped"], 0, "The messages that do not fit should be dropped.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import time
+
+from p2pnetwork.reconnect import backoff
+from p2pnetwork.node import Node
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the reconnection of the nodes with exponential backoff.
+"""
+
+class TestReconnect(unittest.TestCase):
+    """Testing the reconnect module."""
+
+    def test_backoff(self):
+        """Test whether the delay doubles after each failed trial up to the maximum delay."""
+        self.assertEqual(backoff(1, 1.0, 60.0, 0.0), 1.0, "The first delay should be the delay.")
+        self.assertEqual(backoff(4, 1.0, 60.0, 0.0), 8.0, "The delay should double after each trial.")
+        self.assertEqual(backoff(10, 1.0, 60.0, 0.0), 60.0, "The delay should not exceed the maximum delay.")
+        self.assertEqual(backoff(10000, 1.0, 60.0, 0.0), 60.0, "The delay should not exceed the maximum delay.")
+
+        for i in range(0, 100):
+            delay = backoff(3, 1.0, 60.0, 0.5)
+            self.assertTrue(2.0 <= delay <= 4.0, "The jitter should only take a part of the delay.")
+
+    def test_reconnect(self):
+        """Test whether the node reconnects in the background and stops when node_reconnection_error returns False."""
+        self.check_reconnect(False)
+
+    def test_reconnect_reactor(self):
+        """Test whether the node that uses a reactor reconnects in the background."""
+        self.check_reconnect(True)
+
+    def check_reconnect(self, reactor):
+        trials = []
+
+        class ReconnectNode(Node):
+            def node_reconnection_error(self, host, port, trial):
+                trials.append((port, trial))
+                return port == 10002 or trial < 3
+
+        node1 = ReconnectNode(host="127.0.0.1", port=10001, id="node1", reactor=reactor)
+        node1.reconnect_scheduler.check_interval = 0.1
+        node1.reconnect_scheduler.delay = 0.1
+        node1.reconnect_scheduler.max_delay = 0.5 # Node 1 retries soon after node 2 comes back
+        node1.reconnect_scheduler.jitter = 0.0 # The number of trials is known, the jitter is tested by test_backoff
+        node2 = Node(host="127.0.0.1", port=10002, id="node2")
+        node3 = Node(host="127.0.0.1", port=10003, id="node3")
+
+        node1.start()
+        node2.start()
+        node3.start()
+        node1.connect_with_node("127.0.0.1", 10002, reconnect=True)
+        node1.connect_with_node("127.0.0.1", 10003, reconnect=True)
+        node1.connect_with_node("127.0.0.1", 10002, reconnect=True) # Already connected
+        time.sleep(1)
+
+        entries = len(node1.reconnect_to_nodes)
+        node2.stop()
+        node3.stop()
+        node2.join()
+        node3.join()
+        time.sleep(2)
+
+        # Node 2 comes back and node 1 should reconnect
+        node2 = Node(host="127.0.0.1", port=10002, id="node2")
+        node2.start()
+
+        deadline = time.monotonic() + 10.0
+        while node1.nodes_outbound.find("127.0.0.1", 10002) is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        reconnected = node1.nodes_outbound.find("127.0.0.1", 10002) is not None
+        remaining = [(n["host"], n["port"]) for n in node1.reconnect_to_nodes]
+        node1_node2_trials = [trial for (port, trial) in trials if port == 10002]
+
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+
+        self.assertEqual(entries, 2, "Node 1 should reconnect with two nodes.")
+        self.assertTrue(reconnected, "Node 1 should have reconnected with node 2.")
+        self.assertEqual(remaining, [("127.0.0.1", 10002)], "Node 3 should have been removed from the reconnection list.")
+        self.assertIn((10003, 3), trials, "Node 1 should have tried to reconnect with node 3 three times.")
+        self.assertNotIn((10003, 4), trials, "Node 1 should have stopped reconnecting with node 3.")
+        self.assertGreater(len(node1_node2_trials), 1, "Node 1 should have tried to reconnect with node 2 more than once.")
+        self.assertLess(len(node1_node2_trials), 10, "Node 1 should back off between the trials.")
+
+if __name__ == '__main__':
+    unittest.main()
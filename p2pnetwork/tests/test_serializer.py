@@ -0,0 +1,95 @@
+import unittest
+import time
+import json
+
+from p2pnetwork import serializer
+from p2pnetwork.node import Node
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the serializers and the negotiation of the serializers between the nodes.
+"""
+
+class SetSerializer(serializer.Serializer):
+    """Own serializer that sends a set as json list."""
+    name = 'set'
+    type = 0x80
+    accepted_types = (set,)
+
+    def encode(self, data, encoding_type='utf-8'):
+        return json.dumps(sorted(data)).encode(encoding_type)
+
+    def decode(self, payload):
+        return set(json.loads(str(payload, 'utf-8')))
+
+
+class TestSerializer(unittest.TestCase):
+    """Testing the serializer module."""
+
+    def test_serializers(self):
+        """Test whether the data is encoded and decoded by the serializer of its type."""
+        for data in [b'\x00\x04bytes', "Hi there!", {"message": "Hi there!", "number": 1}]:
+            for name in serializer.names():
+                encoder = serializer.get(name)
+                if encoder.accepts(data):
+                    payload = memoryview(encoder.encode(data))
+                    self.assertEqual(serializer.get_type(encoder.type).decode(payload), data, "The data is not correctly decoded by " + name + ".")
+
+        self.assertEqual(serializer.get_type(0x7f), None, "The type should not exist.")
+
+    @unittest.skipIf(serializer.msgpack == None, "msgpack is not installed")
+    def test_msgpack(self):
+        """Test whether msgpack is supported, but json stays the preferred serializer of a dict."""
+        self.assertIn('msgpack', serializer.names(), "msgpack should be supported.")
+        self.assertLess(serializer.names().index('json'), serializer.names().index('msgpack'), "msgpack should be opt-in.")
+        encoder = serializer.get('msgpack')
+        data = {"message": "Hi there!", "data": b'\x00\x04', "list": [1, 2.5, None]}
+        self.assertEqual(encoder.decode(memoryview(encoder.encode(data))), data, "The data is not correctly decoded.")
+
+    def test_negotiation(self):
+        """Test whether the nodes only use the serializers that both nodes support."""
+        serializer.register(SetSerializer())
+        message = []
+
+        def node_callback(event, main_node, connected_node, data):
+            if event == "node_message":
+                message.append((main_node.id, data))
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1", callback=node_callback, reactor=True)
+        node2 = Node(host="127.0.0.1", port=10002, id="node2", callback=node_callback)
+        node3 = Node(host="127.0.0.1", port=10003, id="node3", callback=node_callback)
+        node3.serializers = ['json', 'str', 'bytes'] # Does not know the set serializer
+
+        node1.start()
+        node2.start()
+        node3.start()
+        node1.connect_with_node("127.0.0.1", 10002)
+        node1.connect_with_node("127.0.0.1", 10003)
+        time.sleep(1)
+
+        serializers = {}
+        for n in node1.all_nodes:
+            serializers[n.id] = n.serializers
+
+        node1.send_to_nodes({1, 2, 3})
+        node1.send_to_nodes({"message": "Hi there!"})
+        time.sleep(1)
+
+        node1.stop()
+        node2.stop()
+        node3.stop()
+        node1.join()
+        node2.join()
+        node3.join()
+
+        self.assertIn('set', serializers["node2"], "The set serializer should be used with node 2.")
+        self.assertNotIn('set', serializers["node3"], "The set serializer should not be used with node 3.")
+        self.assertIn(("node2", {1, 2, 3}), message, "The set is not correctly received.")
+        self.assertNotIn(("node3", {1, 2, 3}), message, "The set should not be sent to node 3.")
+        self.assertIn(("node2", {"message": "Hi there!"}), message, "The dict is not correctly received.")
+        self.assertIn(("node3", {"message": "Hi there!"}), message, "The dict is not correctly received.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import time
+import socket
+import threading
+
+from p2pnetwork import protocol
+from p2pnetwork.stats import Stats
+from p2pnetwork.node import Node
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the statistics of the nodes and the node connections.
+"""
+
+class TestStats(unittest.TestCase):
+    """Testing the stats module."""
+
+    def test_stats(self):
+        """Test whether the counters are added to the parent and whether they are thread-safe."""
+        total = Stats()
+        stats = [Stats(total), Stats(total)]
+
+        def count(s):
+            for i in range(10000):
+                s.update({"messages_sent": 1, "bytes_sent": 10})
+
+        threads = [threading.Thread(target=count, args=(stats[i % 2],)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(stats[0].get("messages_sent"), 20000, "The counter is not thread-safe.")
+        self.assertEqual(total.snapshot()["messages_sent"], 40000, "The parent should hold the totals.")
+        self.assertEqual(total.snapshot()["bytes_sent"], 400000, "The parent should hold the totals.")
+        self.assertRaises(KeyError, total.add, "unknown")
+
+    def test_node_stats(self):
+        """Test whether the nodes count the messages and the bytes that are sent and received."""
+        node1 = Node(host="127.0.0.1", port=10001, id="node1")
+        node2 = Node(host="127.0.0.1", port=10002, id="node2", max_connections=2)
+
+        node1.start()
+        node2.start()
+        node1.connect_with_node("127.0.0.1", 10002)
+        time.sleep(0.5)
+
+        for i in range(10):
+            node1.send_to_nodes({"i": i})
+        node1.send_to_nodes("Hi there! " * 100, compression='zlib')
+
+        # A client that sends a message that cannot be decompressed
+        client = socket.create_connection(("127.0.0.1", 10002))
+        client.sendall(("client:20000" + protocol.encode_options({"framing": "length"})).encode('utf-8'))
+        client.recv(4096)
+        client.sendall(protocol.create_frame(b'\x01invalid', protocol.FLAG_COMPRESSED, protocol.TYPE_STR))
+        time.sleep(0.5)
+
+        stats1 = node1.get_stats()
+        stats2 = node2.get_stats()
+        client.close()
+
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+
+        node1_stats = node1.get_stats()
+
+        self.assertEqual(stats1["messages_sent"], 11, "Each message should be counted once.")
+        self.assertEqual(node1.message_count_send, 11, "Each message should be counted once.")
+        self.assertEqual(stats1["nodes"][("node2", "outbound")]["messages_sent"], 11, "The connection should count its messages.")
+        self.assertEqual(stats1["bytes_sent"], stats2["nodes"][("node1", "inbound")]["bytes_received"], "The bytes sent should be received.")
+        self.assertGreater(stats1["bytes_raw"], stats1["bytes_compressed"], "The compressed message should be smaller.")
+        self.assertEqual(stats1["connects"], 1, "Node 1 should have connected with one node.")
+        self.assertEqual(stats1["connections"], 1, "Node 1 should be connected with one node.")
+        self.assertEqual(stats2["messages_received"], 12, "Node 2 should have received all the messages.")
+        self.assertEqual(stats2["receive_errors"], 1, "The invalid message should be counted.")
+        self.assertEqual(node2.message_count_rerr, 1, "The invalid message should be counted.")
+        self.assertEqual(stats2["nodes"][("client", "inbound")]["receive_errors"], 1, "The connection should count the invalid message.")
+        self.assertEqual(node1_stats["disconnects"], 1, "Node 1 should have disconnected from one node.")
+        self.assertEqual(node1_stats["messages_sent"], 11, "The totals should remain after the connection has been closed.")
+        self.assertEqual(node1_stats["nodes"], {}, "Node 1 should not be connected anymore.")
+
+        node1.message_count_send = 0
+        node2.message_count_rerr = 0
+        self.assertEqual(node1.get_stats()["messages_sent"], 0, "Assigning the message count should reset the counter.")
+        self.assertEqual(node2.message_count_rerr, 0, "Assigning the message count should reset the counter.")
+
+    def test_node_stats_both_directions(self):
+        """Test whether a node that is connected inbound and outbound with the same id is reported for each connection."""
+        node1 = Node(host="127.0.0.1", port=10001, id="node1")
+        node2 = Node(host="127.0.0.1", port=10002, id="node2")
+        node3 = Node(host="127.0.0.1", port=10003, id="node2") # Uses the id of node 2
+
+        for node in [node1, node2, node3]:
+            node.start()
+        node1.connect_with_node("127.0.0.1", 10002)
+        node3.connect_with_node("127.0.0.1", 10001)
+        time.sleep(0.5)
+
+        node1.send_to_nodes("Hi there!")
+        time.sleep(0.5)
+
+        stats1 = node1.get_stats()
+
+        for node in [node1, node2, node3]:
+            node.stop()
+        for node in [node1, node2, node3]:
+            node.join()
+
+        self.assertEqual(stats1["connections"], 2, "Node 1 should count both connections.")
+        self.assertEqual(set(stats1["nodes"]), {("node2", "inbound"), ("node2", "outbound")}, "Each connection should be reported.")
+        self.assertEqual(stats1["nodes"][("node2", "inbound")]["messages_sent"], 1, "The inbound connection should count its message.")
+        self.assertEqual(stats1["nodes"][("node2", "outbound")]["messages_sent"], 1, "The outbound connection should count its message.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import time
+
+from p2pnetwork.tracing import Histogram, Tracer
+from p2pnetwork.node import Node
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the tracing of the latency of the stages of sending and receiving messages.
+"""
+
+class TestTracing(unittest.TestCase):
+    """Testing the tracing module."""
+
+    def test_histogram(self):
+        """Test whether the percentiles of the histogram are within the precision of the buckets."""
+        histogram = Histogram()
+        values = list(range(1, 1000001, 7))
+        for value in values:
+            histogram.record(value)
+
+        for percentile in [50, 90, 99, 99.9]:
+            exact = values[int(percentile * len(values) / 100) - 1]
+            value = histogram.percentile(percentile)
+            self.assertTrue(exact <= value <= exact * (1 + 1 / 16), "The percentile is not within the precision.")
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], len(values), "All the values should be counted.")
+        self.assertEqual(snapshot["min"], 1 / 1e9, "The minimum is not correct.")
+        self.assertEqual(snapshot["max"], values[-1] / 1e9, "The maximum is not correct.")
+
+        for value in [0, 15, 16, 31, 32, 1000, 2 ** 40, 2 ** 64 - 1]:
+            index = histogram.index(value)
+            self.assertTrue(histogram.lowest_value(index) <= value < histogram.lowest_value(index + 1), "The value is not in its bucket.")
+
+        histogram.reset()
+        self.assertEqual(histogram.snapshot()["count"], 0, "The histogram should be empty.")
+        self.assertEqual(histogram.percentile(99), 0, "The percentile of an empty histogram should be zero.")
+
+    def test_tracer(self):
+        """Test whether the tracer records the stages and invokes the hooks."""
+        durations = []
+        tracer = Tracer(["handler"])
+        tracer.add_hook("handler", lambda stage, connection, seconds: durations.append((stage, connection, seconds)))
+
+        start = tracer.now()
+        time.sleep(0.01)
+        tracer.record("handler", "connection", start)
+        tracer.record("decode", "connection", tracer.now())
+
+        self.assertEqual(list(tracer.snapshot().keys()), ["handler"], "Only the given stages should be recorded.")
+        self.assertEqual(tracer.snapshot()["handler"]["count"], 1, "The stage should be recorded.")
+        self.assertEqual(len(durations), 1, "The hook should be invoked once.")
+        self.assertGreaterEqual(durations[0][2], 0.01, "The duration is not correct.")
+
+    def test_node_tracing(self):
+        """Test whether the nodes measure the stages and whether a slow handler shows up."""
+        slow = []
+
+        class SlowNode(Node):
+            def node_message(self, node, data):
+                if data == "slow":
+                    time.sleep(0.05)
+
+        node1 = Node(host="127.0.0.1", port=10001, id="node1")
+        node2 = SlowNode(host="127.0.0.1", port=10002, id="node2")
+
+        tracer = node2.enable_tracing()
+        tracer.add_hook("handler", lambda stage, connection, seconds: slow.append(connection.id) if seconds > 0.04 else None)
+        node1.enable_tracing(["compress", "send"])
+
+        node1.start()
+        node2.start()
+        node1.connect_with_node("127.0.0.1", 10002)
+        time.sleep(0.5)
+
+        for i in range(10):
+            node1.send_to_nodes({"i": i}, compression='zlib')
+        node1.send_to_nodes("slow")
+        time.sleep(0.5)
+
+        latencies1 = node1.get_latencies()
+        latencies2 = node2.get_latencies()
+        node2.disable_tracing()
+        disabled = node2.get_latencies()
+
+        node1.stop()
+        node2.stop()
+        node1.join()
+        node2.join()
+
+        self.assertEqual(sorted(latencies1.keys()), ["compress", "send"], "Node 1 should only trace the given stages.")
+        self.assertEqual(latencies1["compress"]["count"], 10, "Each compression should be measured.")
+        self.assertGreater(latencies1["send"]["count"], 0, "Sending should be measured.")
+        self.assertEqual(latencies2["frame"]["count"], 11, "Each message should be found.")
+        self.assertEqual(latencies2["decompress"]["count"], 10, "Each decompression should be measured.")
+        self.assertEqual(latencies2["decode"]["count"], 11, "Each message should be decoded.")
+        self.assertEqual(latencies2["handler"]["count"], 11, "Each message should be handled.")
+        self.assertGreaterEqual(latencies2["handler"]["max"], 0.05, "The slow handler should show up.")
+        self.assertEqual(slow, ["node1"], "The hook should report the slow handler.")
+        self.assertEqual(disabled, {}, "No latencies should be returned when tracing is disabled.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+import os
+import socket
+import tempfile
+import unittest
+
+from p2pnetwork import ringbuffer
+from p2pnetwork.node import Node
+from p2pnetwork.tests.helpers import EventNode
+from p2pnetwork.transport import InProcessTransport
+
+"""
+Author: Maurice Snoeren
+Version: 0.1 beta (use at your own risk)
+
+Testing the nodes that use the in-process transport, which does not need network ports, the nodes that use Unix
+domain sockets and the nodes that send their frames through ring buffers in shared memory.
+"""
+
+class TestInProcessTransport(unittest.TestCase):
+    """Testing the Node class with the in-process transport."""
+
+    def setUp(self):
+        self.transport = InProcessTransport()
+        self.nodes = []
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.stop()
+
+        for node in self.nodes:
+            if node.is_alive():
+                node.join()
+
+    def create_node(self, port):
+        node = EventNode("inprocess", port, "node" + str(port), transport=self.transport)
+        node.sock.settimeout(0.1) # Stop fast
+        node.start()
+        self.nodes.append(node)
+
+        return node
+
+    def test_message_object_is_handed_over(self):
+        """Test whether the data is received as the same object that has been sent, without serialization."""
+        node1 = self.create_node(1)
+        node2 = self.create_node(2)
+
+        self.assertTrue(node1.connect_with_node("inprocess", 2))
+        self.assertTrue(node2.connected.wait(5.0))
+
+        data = {"set": {1, 2, 3}, "object": object()} # Not possible with json
+        node1.send_to_nodes(data)
+        self.assertTrue(node2.received.wait(5.0))
+
+        self.assertEqual(node2.messages[0][0], "node1")
+        self.assertIs(node2.messages[0][1], data)
+
+        node2.received.clear()
+        node2.send_to_nodes("Hi from node 2!", compression='zlib') # Nothing to compress
+        self.assertTrue(node1.received.wait(5.0))
+        self.assertEqual(node1.messages, [("node2", "Hi from node 2!")])
+
+        stats = node1.get_stats()
+        self.assertEqual(stats["messages_sent"], 1)
+        self.assertEqual(stats["messages_received"], 1)
+
+    def test_connect_without_node(self):
+        """Test whether connecting with an address without a node fails and that the address is not reused."""
+        node1 = self.create_node(1)
+
+        self.assertFalse(node1.connect_with_node("inprocess", 2))
+        self.assertEqual(len(node1.all_nodes), 0)
+
+        with self.assertRaises(OSError):
+            Node("inprocess", 1, transport=self.transport)
+
+        with self.assertRaises(ValueError):
+            Node("inprocess", 3, transport=self.transport, reactor=True)
+
+    def test_disconnect(self):
+        """Test whether the other node is informed directly when the connection is closed."""
+        node1 = self.create_node(1)
+        node2 = self.create_node(2)
+
+        self.assertTrue(node1.connect_with_node("inprocess", 2))
+        self.assertTrue(node2.connected.wait(5.0))
+
+        node1.disconnect_with_node(node1.nodes_outbound[0])
+        self.assertTrue(node1.disconnected.wait(5.0))
+        self.assertTrue(node2.disconnected.wait(5.0))
+
+        stats = node2.get_stats()
+        self.assertEqual(stats["connects"], 1)
+        self.assertEqual(stats["disconnects"], 1)
+
+    def test_gossip(self):
+        """Test whether gossip reaches the nodes that are not connected with the sending node."""
+        node1 = self.create_node(1)
+        node2 = self.create_node(2)
+        node3 = self.create_node(3)
+
+        self.assertTrue(node1.connect_with_node("inprocess", 2))
+        self.assertTrue(node2.connect_with_node("inprocess", 3))
+        self.assertTrue(node2.connected.wait(5.0))
+        self.assertTrue(node3.connected.wait(5.0))
+
+        node1.gossip({"hello": "everyone"})
+        self.assertTrue(node3.received.wait(5.0))
+
+        self.assertEqual(node2.gossip_messages, [{"hello": "everyone"}])
+        self.assertEqual(node3.gossip_messages, [{"hello": "everyone"}])
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix domain sockets are not supported on this platform")
+class TestUnixTransport(unittest.TestCase):
+    """Testing the Node class with Unix domain sockets."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.nodes = []
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.stop()
+
+        for node in self.nodes:
+            node.join()
+
+        self.directory.cleanup()
+
+    def create_node(self, port, unix=True, shm_size=0):
+        path = os.path.join(self.directory.name, "node" + str(port) + ".sock") if unix else None
+        node = EventNode("127.0.0.1", port, "node" + str(port), reactor=True, unix_path=path)
+        node.shm_size = shm_size
+        node.start()
+        self.nodes.append(node)
+
+        return node
+
+    def test_unix_communication(self):
+        """Test whether a node is able to connect with the Unix domain socket of another node."""
+        node1 = self.create_node(10001)
+        node2 = self.create_node(10002, unix=False)
+
+        self.assertTrue(node2.connect_with_node(node1.unix_path))
+        self.assertEqual(node2.nodes_outbound[0].sock.family, socket.AF_UNIX)
+
+        node2.send_to_nodes({"via": "unix"})
+        self.assertTrue(node1.received.wait(5.0))
+        self.assertEqual(node1.messages, [("node10002", {"via": "unix"})])
+
+        # The inbound node runs on the same host, with the port of its server
+        node = node1.nodes_inbound[0]
+        self.assertEqual((node.host, str(node.port)), ("127.0.0.1", "10002"))
+
+        node1.send_to_nodes("Hi node 2")
+        self.assertTrue(node2.received.wait(5.0))
+        self.assertEqual(node2.messages, [("node10001", "Hi node 2")])
+
+        self.assertFalse(node2.connect_with_node(os.path.join(self.directory.name, "missing.sock")))
+
+    def test_prefer_unix(self):
+        """Test whether the node uses the Unix domain socket of a node on the same host once its path is known."""
+        node1 = self.create_node(10001)
+        node2 = self.create_node(10002, unix=False)
+
+        self.assertTrue(node2.connect_with_node("127.0.0.1", 10001))
+        self.assertEqual(node2.nodes_outbound[0].sock.family, socket.AF_INET)
+        self.assertEqual(node2.unix_paths, {("127.0.0.1", "10001"): node1.unix_path})
+
+        node2.disconnect_with_node(node2.nodes_outbound[0])
+        self.assertTrue(node1.disconnected.wait(5.0))
+        self.assertTrue(node2.disconnected.wait(5.0))
+        node1.disconnected.clear()
+        node2.disconnected.clear()
+
+        self.assertTrue(node2.connect_with_node("127.0.0.1", 10001))
+        node = node2.nodes_outbound.find("127.0.0.1", 10001)
+        self.assertEqual(node.sock.family, socket.AF_UNIX)
+
+        node2.prefer_unix = False
+        node2.disconnect_with_node(node)
+        self.assertTrue(node1.disconnected.wait(5.0))
+        self.assertTrue(node2.disconnected.wait(5.0))
+        node1.disconnected.clear()
+        node2.disconnected.clear()
+
+        self.assertTrue(node2.connect_with_node("127.0.0.1", 10001))
+        self.assertEqual(node2.nodes_outbound[0].sock.family, socket.AF_INET)
+
+    @unittest.skipUnless(ringbuffer.available(), "Shared memory is not supported by this python version")
+    def test_shared_memory(self):
+        """Test whether the large frames go through the ring buffers in shared memory, in the order in which they
+           have been sent, also when they do not fit in the ring buffer."""
+        node1 = self.create_node(10001, shm_size=1048576)
+        node2 = self.create_node(10002, unix=False, shm_size=1048576)
+
+        self.assertTrue(node2.connect_with_node(node1.unix_path))
+        self.assertTrue(node1.connected.wait(5.0))
+
+        connection = node2.nodes_outbound[0]
+        self.assertIsNotNone(connection.ring_out)
+        self.assertIsNotNone(connection.ring_in)
+        self.assertEqual(connection.ring_out.name, node1.nodes_inbound[0].ring_in.name)
+
+        sizes = [10, 100000, 2000000, 300000, 20] # 2000000 does not fit in the ring buffer
+        for size in sizes:
+            node2.send_to_nodes(b'x' * size)
+
+        self.assertTrue(node1.wait_messages(len(sizes)))
+        self.assertEqual([len(data) for (id, data) in node1.messages], sizes)
+
+        node1.send_to_nodes(b'y' * 200000)
+        self.assertTrue(node2.received.wait(5.0))
+        self.assertEqual(node2.messages, [("node10001", b'y' * 200000)])
+
+        name = connection.ring_out.name
+        node2.disconnect_with_node(connection)
+        self.assertTrue(node1.disconnected.wait(5.0))
+        with self.assertRaises(FileNotFoundError): # Removed by the node that created it
+            ringbuffer.RingBuffer(name=name)
+
+    @unittest.skipUnless(ringbuffer.available(), "Shared memory is not supported by this python version")
+    def test_shared_memory_names(self):
+        """Test whether only the shared memory of a ring buffer with the offered capacity is attached."""
+        ring = ringbuffer.RingBuffer(4096)
+        other = ringbuffer.shared_memory.SharedMemory(create=True, size=4096)
+        try:
+            self.assertTrue(ring.name.startswith(ringbuffer.PREFIX))
+            attached = ringbuffer.RingBuffer(name=ring.name, capacity=4096)
+            attached.close()
+            self.assertRaises(ValueError, ringbuffer.RingBuffer, name=ring.name, capacity=8192)
+            self.assertRaises(ValueError, ringbuffer.RingBuffer, name=other.name)
+            self.assertRaises(ValueError, ringbuffer.RingBuffer, name=ringbuffer.PREFIX + "../" + ring.nonce[3:])
+
+        finally:
+            ring.close()
+            other.close()
+            other.unlink()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import threading
+import time
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The tracing of a node measures the time that each stage of sending and receiving a message takes, like splitting
+the stream into frames, decompressing, decoding and the node_message handler of the application. The durations are
+recorded in latency histograms with HDR-style buckets, so the percentiles are known without storing each duration.
+Tracing is disabled by default and then it costs nothing more than checking whether the tracer of the node is set.
+"""
+
+# The stages that are measured by the tracer
+STAGES = [
+    "recv",       # Receiving the data from the socket, only measured by the reactor, because threads wait for the data
+    "frame",      # Finding the next message in the stream
+    "decompress", # Decompressing a message
+    "decode",     # Decoding a message by the serializer
+    "handler",    # The node_message or node_gossip_message handler of the application
+    "compress",   # Compressing a message
+    "send"        # Writing the messages to the socket
+]
+
+
+class Histogram:
+    """Latency histogram with HDR-style buckets. The values (nanoseconds) are counted in buckets that grow
+       exponentially, where each power of two is split into sub_buckets linear buckets. The relative error of the
+       percentiles is therefore at most 1 / sub_buckets, for any value, while the histogram has a fixed size. The
+       histogram is thread-safe.
+        sub_bucket_bits: (optional) The number of linear buckets of each power of two is 2 ** sub_bucket_bits."""
+
+    def __init__(self, sub_bucket_bits=4):
+        """Creates an empty histogram.
+            sub_bucket_bits: (optional) The number of linear buckets of each power of two is 2 ** sub_bucket_bits."""
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Removes all the recorded values."""
+        with self.lock:
+            self.counts = [0] * ((65 - self.sub_bucket_bits) * self.sub_buckets) # Values up to 2 ** 64
+            self.count = 0
+            self.total = 0
+            self.min = 0
+            self.max = 0
+
+    def index(self, value):
+        """Returns the index of the bucket of the value. Values below 2 * sub_buckets have their own bucket."""
+        shift = max(0, value.bit_length() - self.sub_bucket_bits - 1)
+        return shift * self.sub_buckets + (value >> shift)
+
+    def lowest_value(self, index):
+        """Returns the lowest value that is counted in the bucket with the index."""
+        shift = max(0, index // self.sub_buckets - 1)
+        return (index - shift * self.sub_buckets) << shift
+
+    def record(self, value):
+        """Records the value (nanoseconds, int)."""
+        value = max(0, value)
+        index = self.index(value)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += value
+            if self.count == 0 or value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+            self.count += 1
+
+    def percentiles(self, percentiles):
+        """Returns for each of the percentiles (0 - 100, ascending) the value (nanoseconds) below which that
+           percentage of the recorded values are. The highest value of the bucket is returned, so the value is never
+           underestimated."""
+        with self.lock:
+            (counts, count, highest) = (list(self.counts), self.count, self.max)
+
+        return self.values_at(counts, count, highest, percentiles)
+
+    def values_at(self, counts, count, highest, percentiles):
+        """Returns the values of the percentiles (ascending) of the counts of the buckets, see percentiles."""
+        values = []
+        index = 0
+        seen = counts[0]
+        for percentile in percentiles:
+            rank = max(1, percentile * count / 100.0) if count > 0 else 0
+            while seen < rank:
+                index += 1
+                seen += counts[index]
+
+            values.append(min(highest, self.lowest_value(index + 1) - 1))
+
+        return values
+
+    def percentile(self, percentile):
+        """Returns the value (nanoseconds) below which the given percentile (0 - 100) of the recorded values are."""
+        return self.percentiles([percentile])[0]
+
+    def snapshot(self):
+        """Returns a dict with the number of values, the minimum, mean, maximum and the percentiles p50, p90, p99
+           and p999 in seconds, which are all taken at the same moment."""
+        with self.lock:
+            (counts, count, total, lowest, highest) = (list(self.counts), self.count, self.total, self.min, self.max)
+
+        (p50, p90, p99, p999) = self.values_at(counts, count, highest, [50, 90, 99, 99.9])
+
+        return {
+            "count": count,
+            "min": lowest / 1e9,
+            "mean": total / count / 1e9 if count > 0 else 0.0,
+            "max": highest / 1e9,
+            "p50": p50 / 1e9,
+            "p90": p90 / 1e9,
+            "p99": p99 / 1e9,
+            "p999": p999 / 1e9
+        }
+
+
+class Tracer:
+    """Records the duration of the stages of sending and receiving messages in a Histogram for each stage. The node
+       connections measure a stage by taking the time with now before the stage and calling record after the stage.
+       Hooks are invoked with each duration of their stage, for example to log slow handlers. The tracer is used by
+       a node when tracing is enabled, see Node.enable_tracing.
+        stages: (optional) The stages that are recorded in a histogram, all the STAGES when not given."""
+
+    def __init__(self, stages=None):
+        """Creates a tracer with empty histograms.
+            stages: (optional) The stages that are recorded in a histogram, all the STAGES when not given."""
+        if stages == None:
+            stages = STAGES
+
+        self.histograms = {}
+        for stage in stages:
+            self.histograms[stage] = Histogram()
+
+        # The hooks (callbacks) of each stage
+        self.hooks = {}
+
+    def add_hook(self, stage, callback):
+        """Adds the callback to the stage. It is invoked with (stage, connection, seconds) after each measurement of the
+           stage, on the thread that has executed the stage, so keep it short."""
+        self.hooks.setdefault(stage, []).append(callback)
+
+    def remove_hook(self, stage, callback):
+        """Removes the callback from the stage."""
+        self.hooks.get(stage, []).remove(callback)
+
+    def now(self):
+        """Returns the current time (nanoseconds) to measure a stage, see record."""
+        return int(time.perf_counter() * 1000000000) # time.perf_counter_ns requires Python 3.7
+
+    def record(self, stage, connection, start):
+        """Records the duration of the stage, which started at start (see now), of the connection and invokes the hooks
+           of the stage. Returns the current time, so the next stage is measured from this moment."""
+        end = self.now()
+        histogram = self.histograms.get(stage)
+        if histogram is not None:
+            histogram.record(end - start)
+
+        for callback in self.hooks.get(stage, []):
+            callback(stage, connection, (end - start) / 1e9)
+
+        return end
+
+    def snapshot(self):
+        """Returns a dict with the snapshot of the histogram of each stage, see Histogram.snapshot."""
+        snapshot = {}
+        for (stage, histogram) in self.histograms.items():
+            snapshot[stage] = histogram.snapshot()
+
+        return snapshot
+
+    def reset(self):
+        """Removes all the recorded durations."""
+        for histogram in self.histograms.values():
+            histogram.reset()
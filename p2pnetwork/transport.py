@@ -0,0 +1,393 @@
+import os
+import stat
+import socket
+import queue
+import threading
+
+from p2pnetwork import protocol
+from p2pnetwork.nodeconnection import NodeConnection
+from p2pnetwork.peers import PeerSet
+
+"""
+Author: Maurice Snoeren <macsnoeren(at)gmail.com>
+Version: 0.1 beta (use at your own risk)
+
+Python package p2pnet for implementing decentralized peer-to-peer network applications
+
+The transport determines how a Node listens for other nodes, how it connects with other nodes and which node
+connection is used. By default the nodes use TCP/IP. Nodes that run on the same host are able to use Unix domain
+sockets as well, which skip the TCP/IP stack of the kernel. Nodes that run in the same python process are able to use
+the in-process transport, which hands the messages over through queues. The messages are not serialized, not
+compressed and do not go through the kernel, so sending a message costs about as much as putting it in a queue.
+"""
+
+# The kinds of the items that are handed over by an in-process channel, besides the bytes of the handshake
+MESSAGE = 0
+GOSSIP = 1
+
+
+class Transport:
+    """Base class of a transport. A transport creates the server of a node, connects with the server of another
+       node and creates the node connections. The server and the connections are socket-like objects: the server is
+       used with accept, settimeout and close and the connections with send, sendall, recv, settimeout and close,
+       so the id's of the nodes are exchanged in the same way for each transport. Extend this class to create your
+       own transport and give it to the Node."""
+
+    # Whether the server and the connections are sockets that can be used by the reactor of the node
+    selectable = True
+
+    def listen(self, main_node):
+        """Creates the server of the main node, which accepts the nodes that connect with the host and port of the
+           main node. Returns the server."""
+        raise NotImplementedError
+
+    def connect(self, main_node, host, port, timeout=None):
+        """Connects the main node with the server of the node at host and port and returns the connection. Raises
+           OSError when the connection cannot be made and socket.timeout when it takes longer than timeout seconds."""
+        raise NotImplementedError
+
+    def create_connection(self, main_node, connection, id, host, port):
+        """Returns the node connection that handles the connection with the node with the given id, see
+           Node.create_new_connection."""
+        return NodeConnection(main_node, connection, id, host, port)
+
+
+class TcpTransport(Transport):
+    """The default transport of a node, which uses TCP/IP sockets."""
+
+    def listen(self, main_node):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((main_node.host, main_node.port))
+        sock.settimeout(10.0)
+        sock.listen(main_node.backlog)
+
+        return sock
+
+    def connect(self, main_node, host, port, timeout=None):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if timeout is not None:
+            sock.settimeout(timeout)
+
+        try:
+            sock.connect((host, port))
+
+        except Exception:
+            sock.close()
+            raise
+
+        return sock
+
+
+class UnixTransport(Transport):
+    """Transport that uses Unix domain sockets, so nodes on the same host do not use the TCP/IP stack. The server
+       listens on the unix_path of the main node and the host of connect is the path of the socket of the other node,
+       the port is not used. The stream is the same as with TCP/IP, so the connections are NodeConnections."""
+
+    def listen(self, main_node):
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix domain sockets are not supported on this platform")
+
+        path = main_node.unix_path
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            try: # A socket file that is left behind by a node that has not been stopped is removed
+                self.connect(main_node, path, None, 1.0).close()
+
+            except OSError:
+                os.unlink(path)
+
+            else:
+                raise OSError("Address already in use: " + path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.settimeout(10.0)
+        sock.listen(main_node.backlog)
+
+        return sock
+
+    def connect(self, main_node, host, port=None, timeout=None):
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix domain sockets are not supported on this platform")
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if timeout is not None:
+            sock.settimeout(timeout)
+
+        try:
+            sock.connect(host)
+
+        except Exception:
+            sock.close()
+            raise
+
+        return sock
+
+
+class InProcessTransport(Transport):
+    """Transport between nodes that run in the same python process. The nodes that use the same InProcessTransport
+       are able to connect with each other by their host and port, without using a network port. After the id's have
+       been exchanged, the messages themselves are handed over to the other node, so the other node receives the same
+       python object that has been sent. Do not change the data after it has been sent. The reactor of the node cannot
+       be used with this transport."""
+
+    selectable = False
+
+    def __init__(self):
+        """Creates the transport. Give the same transport to all the nodes that need to connect with each other."""
+        self.servers = {} # (host, port) -> InProcessServer
+        self.lock = threading.Lock()
+
+    def listen(self, main_node):
+        address = PeerSet.address(main_node.host, main_node.port)
+        with self.lock:
+            if address in self.servers:
+                raise OSError("Address already in use: " + main_node.host + ":" + str(main_node.port))
+
+            server = InProcessServer(self, address, main_node.backlog)
+            self.servers[address] = server
+
+        server.settimeout(10.0)
+        return server
+
+    def connect(self, main_node, host, port, timeout=None):
+        with self.lock:
+            server = self.servers.get(PeerSet.address(host, port))
+
+        if server is None:
+            raise ConnectionRefusedError("No node is listening on " + str(host) + ":" + str(port))
+
+        (connection, other) = InProcessChannel.pair()
+        connection.settimeout(timeout)
+        server.queue_connection(other, (main_node.host, main_node.port))
+
+        return connection
+
+    def create_connection(self, main_node, connection, id, host, port):
+        return InProcessNodeConnection(main_node, connection, id, host, port)
+
+    def remove_server(self, server):
+        """Removes the server, so other nodes are not able to connect with it anymore."""
+        with self.lock:
+            if self.servers.get(server.address) is server:
+                del self.servers[server.address]
+
+
+class InProcessServer:
+    """The server of a node that uses the InProcessTransport. It behaves like a listening socket: accept returns the
+       connections of the nodes that connect, in the order in which they connected.
+        transport: The InProcessTransport of the node.
+        address: The address (host, port) of the node.
+        backlog: The number of connections that wait to be accepted before new connections are refused."""
+
+    def __init__(self, transport, address, backlog):
+        self.transport = transport
+        self.address = address
+        self.pending = queue.Queue(max(1, backlog))
+        self.timeout = None
+        self.closed = False
+
+    def queue_connection(self, connection, address):
+        """Adds the connection of the node with the given address to the connections that wait to be accepted."""
+        if self.closed:
+            raise ConnectionRefusedError("The node is not listening anymore")
+
+        try:
+            self.pending.put_nowait((connection, address))
+
+        except queue.Full:
+            raise ConnectionRefusedError("The backlog of the node is full")
+
+    def accept(self):
+        """Returns the tuple (connection, address) of the next node that connects. Raises socket.timeout when no
+           node connects within the timeout."""
+        if self.closed:
+            raise OSError("The server has been closed")
+
+        try:
+            return self.pending.get(timeout=self.timeout)
+
+        except queue.Empty:
+            raise socket.timeout("timed out")
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def close(self):
+        """Closes the server and the connections that have not been accepted."""
+        self.closed = True
+        self.transport.remove_server(self)
+
+        while True:
+            try:
+                (connection, address) = self.pending.get_nowait()
+
+            except queue.Empty:
+                break
+
+            connection.close()
+
+
+class InProcessChannel:
+    """One end of a connection between two nodes of the InProcessTransport. It behaves like a socket for the bytes of
+       the handshake. After the handshake the ends hand over python objects with send_object and receive. Closing one
+       end closes the connection for the other end as well, which receives b'' like a socket."""
+
+    def __init__(self):
+        self.other = None
+        self.inbox = queue.Queue()
+        self.timeout = None
+        self.closed = False
+        self.remainder = b'' # The part of the received bytes that has not been read by recv
+
+    @staticmethod
+    def pair():
+        """Returns the two ends of a new connection."""
+        a = InProcessChannel()
+        b = InProcessChannel()
+        a.other = b
+        b.other = a
+
+        return (a, b)
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def send_object(self, item):
+        """Hands the item over to the other end. Raises BrokenPipeError when the connection has been closed."""
+        if self.closed or self.other.closed:
+            raise BrokenPipeError("The connection has been closed")
+
+        self.other.inbox.put(item)
+
+    def receive(self, timeout=None):
+        """Returns the next item that has been handed over by the other end or None when the connection has been
+           closed. Raises socket.timeout when nothing has been received within the timeout."""
+        try:
+            item = self.inbox.get(timeout=timeout)
+
+        except queue.Empty:
+            raise socket.timeout("timed out")
+
+        if item is None:
+            self.inbox.put(None) # Each later receive returns None as well
+
+        return item
+
+    def sendall(self, data):
+        self.send_object(bytes(data))
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def recv(self, size):
+        """Returns at most size bytes that have been received, like socket.recv."""
+        if len(self.remainder) == 0:
+            item = self.receive(self.timeout)
+            if item is None:
+                return b''
+
+            if not isinstance(item, bytes):
+                raise ConnectionError("A message has been received instead of bytes")
+
+            self.remainder = item
+
+        data = self.remainder[0:size]
+        self.remainder = self.remainder[size:]
+
+        return data
+
+    def close(self):
+        """Closes the connection for both ends."""
+        if not self.closed:
+            self.closed = True
+            self.inbox.put(None)
+            self.other.inbox.put(None)
+
+    def shutdown(self, how=None):
+        self.close()
+
+
+class InProcessNodeConnection(NodeConnection):
+    """The node connection of the InProcessTransport. The data is handed over to the other node as it is: it is not
+       serialized and not compressed, so the compression argument of send is ignored. The payloads of gossip messages
+       are serialized, because they are forwarded as they are, also to nodes of other transports. Each connection
+       has a thread that delivers the messages that have been received to the main node."""
+
+    def __init__(self, main_node, sock, id, host, port):
+        super(InProcessNodeConnection, self).__init__(main_node, sock, id, host, port)
+        self.framing = 'length' # The messages are complete objects, so gossip is supported
+
+    def send(self, data, encoding_type='utf-8', compression='none', packets=None):
+        """Hands the data over to the connected node. When the connection has been closed, the connection is
+           stopped."""
+        try:
+            self.sock.send_object((MESSAGE, data))
+            self.stats.add("messages_sent")
+
+        except Exception as e:
+            self.main_node.debug_print("nodeconnection send: Error sending data to node: " + str(e))
+            self.stats.add("send_errors")
+            self.stop()
+
+    def send_gossip(self, message_id, ttl, flags, type, payload):
+        """Hands the payload of a gossip message, see create_payload, over to the connected node."""
+        try:
+            self.sock.send_object((GOSSIP, flags, type, protocol.GOSSIP_HEADER.pack(message_id, ttl) + bytes(payload)))
+            self.stats.add("messages_sent")
+
+        except Exception as e:
+            self.main_node.debug_print("nodeconnection send_gossip: Error sending data to node: " + str(e))
+            self.stats.add("send_errors")
+            self.stop()
+
+    def get_queue_depth(self):
+        """Returns the number of messages that have been handed over and have not been delivered yet."""
+        return self.sock.other.inbox.qsize()
+
+    def stop(self):
+        """Terminates the connection, the other node is informed directly."""
+        super(InProcessNodeConnection, self).stop()
+        self.sock.close()
+
+    def deliver(self, item):
+        """Delivers the item that has been received to the main node."""
+        tracer = self.main_node.tracer
+        start = tracer.now() if tracer is not None else 0
+
+        self.stats.add("messages_received")
+        if item[0] == GOSSIP:
+            self.main_node.gossip_received(self, item[1], item[2], item[3])
+
+        elif item[0] == MESSAGE:
+            self.main_node.node_message(self, item[1])
+
+        if tracer is not None:
+            tracer.record("handler", self, start)
+
+    def run(self):
+        """The main loop of the thread that delivers the messages that have been received, until the connection is
+           closed."""
+        while not self.terminate_flag.is_set():
+            try:
+                item = self.sock.receive(10.0)
+
+            except socket.timeout:
+                continue
+
+            if item is None:
+                break
+
+            try:
+                self.deliver(item)
+
+            except Exception as e:
+                self.main_node.debug_print("NodeConnection: Exception while delivering the message: " + str(e))
+                self.stats.add("receive_errors")
+
+        self.terminate_flag.set()
+        self.close()